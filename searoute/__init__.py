@@ -1,5 +1,31 @@
 __version__ = "1.6.0"
 
-from .searoute import from_nodes_edges_set, searoute, setup_P, setup_M, marnet, ports, get_graphs
+from .searoute import from_nodes_edges_set, searoute, searoute_many, k_shortest_routes, reachable_within, searoute_matrix, setup_P, setup_M, marnet, ports, get_graphs
 from .classes.marnet import Marnet
 from .classes.ports import Ports
+
+# names resolved on first access, so that `import searoute` stays light (numpy is imported on demand)
+_LAZY = {
+    "to_compiled": ".compiled",
+    "from_compiled": ".compiled",
+    "read_compiled": ".compiled",
+    "searoute_parallel": ".parallel",
+    "searoute_async": ".aio",
+    "searoute_async_many": ".aio",
+    "AsyncRouter": ".aio",
+    "PortTable": ".port_table",
+    "build_port_table": ".port_table",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
@@ -0,0 +1,220 @@
+"""
+asyncio front-end of `searoute()`.
+
+Searches run on an executor (a thread pool by default) so that they do not block
+the event loop:
+
+- at most `max_pending` searches are submitted at once, callers beyond that wait
+  for a slot (backpressure) ;
+- identical requests in flight, same snapped origin and destination nodes and
+  same parameters, are computed once and the other callers get a copy of its result (single-flight).
+  Points are snapped for that on the executor too, where the default network is
+  loaded on first use, or on the event loop when the network is given (one KD-tree query each).
+"""
+import asyncio
+import os
+import threading
+import weakref
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_PENDING = 64
+
+_load_lock = threading.Lock()
+
+# parameters of `searoute()` set by the router, every other one is part of the single-flight key
+_ROUTER_PARAMS = ('M', 'P', 'backend')
+
+
+def _route(origin, destination, params):
+    from .searoute import searoute
+    return searoute(origin, destination, **params)
+
+
+def _snap(origin, destination, backend):
+    """nodes of the default Marnet the points snap to"""
+    from .searoute import setup_M
+    # the first requests wait for the network to be loaded once
+    with _load_lock:
+        M = setup_M(backend)
+    return M.snap(origin), M.snap(destination)
+
+
+def _freeze(value):
+    """hashable version of a parameter value, TypeError when it can not be"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    hash(value)
+    return value
+
+
+class AsyncRouter:
+    """
+    Routes `searoute()` requests from coroutines on an executor.
+
+    Parameters
+    ----------
+    executor : `concurrent.futures.Executor`, default None which means a thread pool owned by the router ;
+        with a process pool, workers route on their default networks unless `M`/`P` are given (then pickled
+        with every request)
+    max_pending : int, default 64 ; maximum number of searches submitted at once
+    M, P, backend : networks to route on, see `searoute()`
+
+    Examples
+    --------
+    >>> router = AsyncRouter(max_pending=16)
+    >>> route = await router.route([0.35, 50.06], [117.42, 39.36], units='naut')
+    >>> async for i, route in router.route_many(pairs):
+    ...     print(i, route.properties['length'])
+    """
+
+    def __init__(self, executor=None, max_pending=DEFAULT_MAX_PENDING, M=None, P=None, backend="networkx"):
+        self._own_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(min(32, (os.cpu_count() or 1) + 4))
+        self.max_pending = max_pending
+        self.backend = backend
+        self._given = {'M': M, 'P': P}
+        # semaphore and requests in flight, by event loop
+        self._loops = weakref.WeakKeyDictionary()
+        self.searches = 0
+        self.coalesced = 0
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = (asyncio.Semaphore(self.max_pending), {})
+        return state
+
+    async def _nodes(self, origin, destination):
+        M = self._given['M']
+        if M is not None:
+            return M.snap(origin), M.snap(destination)
+        semaphore, _ = self._state()
+        async with semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, _snap, origin, destination, self.backend)
+
+    async def _key(self, origin, destination, params):
+        """single-flight key of a request, None when its parameters can not be compared"""
+        try:
+            frozen = tuple(sorted((name, _freeze(value)) for name, value in params.items()
+                                  if name not in _ROUTER_PARAMS))
+        except TypeError:
+            return None
+
+        if params.get('include_ports') or params.get('append_orig_dest'):
+            # ports are chosen and routes extended from the points themselves
+            return (_freeze(origin), _freeze(destination)) + frozen
+        return await self._nodes(origin, destination) + frozen
+
+    def _job_params(self, params):
+        params = dict(params, backend=self.backend)
+        # the default networks are loaded by the workers
+        params.update((name, G) for name, G in self._given.items() if G is not None)
+        return params
+
+    async def _search(self, origin, destination, params):
+        semaphore, _ = self._state()
+        async with semaphore:
+            self.searches += 1
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, _route, origin, destination, self._job_params(params))
+
+    async def route(self, origin, destination, **params):
+        """
+        `searoute(origin, destination, **params)` computed on the executor.
+        Requests identical to one in flight wait for it and get a copy of its Feature.
+        """
+        from .utils import validate_lon_lat
+
+        validate_lon_lat(origin)
+        validate_lon_lat(destination)
+        _, inflight = self._state()
+        key = await self._key(origin, destination, params)
+        if key is None:
+            return await self._search(origin, destination, params)
+
+        # a cancelled caller does not cancel the search of the others
+        task = inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # the callers can change their results independently
+            return deepcopy(await asyncio.shield(task))
+
+        task = asyncio.ensure_future(self._search(origin, destination, params))
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def route_many(self, pairs, **params):
+        """
+        Routes of (origin, destination) or (origin, destination, restrictions) pairs,
+        yields (index, result) as they complete. Pairs are read lazily, at most about
+        twice `max_pending` requests are pending at once.
+        """
+        limit = 2 * self.max_pending
+        pending = set()
+        pairs = iter(enumerate(pairs))
+
+        async def indexed(i, pair):
+            pair_params = params
+            if len(pair) > 2 and pair[2] is not None:
+                pair_params = dict(params, restrictions=pair[2])
+            return i, await self.route(pair[0], pair[1], **pair_params)
+
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < limit:
+                item = next(pairs, None)
+                if item is None:
+                    exhausted = True
+                else:
+                    pending.add(asyncio.ensure_future(indexed(*item)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+    def close(self):
+        """shuts down the executor when the router created it"""
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+
+_default_router = None
+
+
+def default_router():
+    """the router used by `searoute_async` and `searoute_async_many`"""
+    global _default_router
+    if _default_router is None:
+        _default_router = AsyncRouter()
+    return _default_router
+
+
+async def searoute_async(origin, destination, **params):
+    """
+    `searoute()` that does not block the event loop, see `AsyncRouter.route` (default router).
+
+    Examples
+    --------
+    >>> route = await sr.searoute_async([0.35, 50.06], [117.42, 39.36], units='naut')
+    """
+    return await default_router().route(origin, destination, **params)
+
+
+async def searoute_async_many(pairs, **params):
+    """
+    Yields (index, result) of the routes of many pairs as they complete, see `AsyncRouter.route_many` (default router).
+
+    Examples
+    --------
+    >>> async for i, route in sr.searoute_async_many(pairs, units='naut'):
+    ...     results[i] = route
+    """
+    async for item in default_router().route_many(pairs, **params):
+        yield item
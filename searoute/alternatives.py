@@ -0,0 +1,116 @@
+"""
+Alternative sea routes between two points (plateau method).
+
+Two shortest path trees are searched on the compiled arrays of the network
+(`searoute.compiled.compiled_image`): one from the origin and one from the
+destination. A node `v` gives the via route origin -> v -> destination, made
+of the two tree paths. Routes through every node of a plateau, a run of edges
+found in both trees, are the same route. Long plateaus give the routes that
+are locally shortest, such as Suez, Cape of Good Hope or Panama.
+
+Candidates are taken by increasing length, and a route is kept when it is
+diverse enough from the routes kept before. Building the routes only walks
+the two trees, so one call costs two single-source searches.
+"""
+import numpy as np
+
+from .matrix import shortest_path_trees
+
+
+_inf = float('inf')
+# plateaus shorter than this share of their route are detours off a better route
+MIN_PLATEAU = 0.1
+
+
+def _plateaus(preds_o, preds_d):
+    """
+    plateau root (node closest to the origin) of every node, and whether the node continues
+    the plateau of its predecessor: the edge from its origin tree predecessor is in both trees
+    """
+    nodes = np.arange(len(preds_o))
+    continues = (preds_o >= 0) & (preds_d[np.maximum(preds_o, 0)] == nodes)
+    root = np.where(continues, preds_o, nodes)
+    while True:
+        jumped = root[root]
+        if np.array_equal(jumped, root):
+            return root, continues
+        root = jumped
+
+
+def _tree_path(preds, node):
+    """nodes from `node` to the root of the tree `preds`"""
+    path = []
+    while node >= 0:
+        path.append(node)
+        node = preds[node]
+    return path
+
+
+def alternative_paths(cg, source, target, k=3, diversity=0.5, max_stretch=2.0, restrictions=None, use_scipy=None):
+    """
+    Up to `k` diverse routes between two node indexes, the shortest first.
+
+    Parameters
+    ----------
+    cg : `searoute.compiled.CompiledGraph` of a Marnet
+    source, target : node indexes
+    k : int, maximum number of routes
+    diversity : float between 0 and 1, default 0.5 ; minimum share of the length of a route
+        that is not shared with any shorter route kept
+    max_stretch : float, default 2.0 ; routes longer than `max_stretch` times the shortest one are ignored
+    restrictions : list of passages to avoid
+    use_scipy : boolean, default None which means when installed
+
+    Returns
+    -------
+    list of (length, path of node indexes), length in the weights of the network ; empty when there is no route
+    """
+    if source == target:
+        return [(0.0, [source])]
+
+    (dist_o, dist_d), (preds_o, preds_d) = shortest_path_trees(cg, [source, target], restrictions, use_scipy)
+    shortest = dist_o[target]
+    if shortest == _inf:
+        return []
+
+    via = dist_o + dist_d
+    reachable = np.isfinite(via)
+    root, continues = _plateaus(preds_o, preds_d)
+    # plateau lengths, measured from the root along the origin tree
+    plateau = np.zeros(len(via))
+    np.maximum.at(plateau, root[reachable], dist_o[reachable] - dist_o[root[reachable]])
+
+    candidates = np.flatnonzero(reachable & ~continues & (via <= max_stretch * shortest)
+                                & (plateau >= MIN_PLATEAU * via))
+    candidates = candidates[np.argsort(via[candidates], kind='stable')]
+
+    preds_o, preds_d = preds_o.tolist(), preds_d.tolist()
+    dist_o, dist_d = dist_o.tolist(), dist_d.tolist()
+    routes, kept_edges, on_route = [], [], set()
+    for v in candidates.tolist():
+        if len(routes) >= k:
+            break
+        if v in on_route:
+            continue
+
+        head = _tree_path(preds_o, v)[::-1]
+        tail = _tree_path(preds_d, v)
+        path = head + tail[1:]
+        if len(set(path)) != len(path):
+            # the trees meet after a u-turn
+            continue
+
+        # edge weights from the trees the edges are taken from
+        edges = {}
+        for a, b in zip(head, head[1:]):
+            edges[(a, b) if a < b else (b, a)] = dist_o[b] - dist_o[a]
+        for a, b in zip(tail, tail[1:]):
+            edges[(a, b) if a < b else (b, a)] = dist_d[a] - dist_d[b]
+        length = via[v]
+        if any(sum(w for e, w in edges.items() if e in kept) > (1 - diversity) * length for kept in kept_edges):
+            continue
+
+        routes.append((float(length), path))
+        kept_edges.append(edges)
+        on_route.update(path)
+    return routes
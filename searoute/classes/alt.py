@@ -0,0 +1,201 @@
+"""
+Landmark (ALT) lower bounds for A* on Marnet.
+
+The distances from a few landmarks to every node give a lower bound of the
+distance between two nodes by the triangle inequality:
+``d(v, t) >= |d(L, t) - d(L, v)|``. Landmarks are chosen far apart from each
+other (farthest point selection), so they end up spread across ocean basins
+and the bound follows the continents that routes have to go around.
+
+Restricting passages only makes distances longer, so a table computed with the
+restriction set R' stays a valid (and consistent) bound for any R containing R':
+the unrestricted table is always valid, tables for common restriction sets are
+tighter. They are stored next to the graph in its compiled image (``alt/*``
+arrays, see `searoute.compiled`):
+
+- ``alt/landmarks`` : int32 (L,) landmark node indexes
+- ``alt/distances`` : float64 (S, L, n) distances of every node to every landmark,
+  for each of the S restriction sets listed in the ``alt`` entry of the header
+"""
+from heapq import heappush, heappop
+
+import numpy as np
+
+from .passages import Passage
+
+
+ALT_PREFIX = 'alt/'
+
+LANDMARK_COUNT = 16
+# restriction sets with their own table, the unrestricted one is always built
+DEFAULT_RESTRICTION_SETS = ([], [Passage.northwest])
+
+_inf = float('inf')
+# distance of the nodes a landmark can not reach: the bound between nodes that are not
+# connected does not matter, both ends of an edge are reached (or not) alike
+_UNREACHABLE = 1e12
+
+
+class Landmarks:
+    """
+    Landmark distance tables of a Marnet, see `build_landmarks`.
+
+    Parameters
+    ----------
+    landmarks : list of landmark node indexes
+    distances : numpy.ndarray (S, L, n), `inf` where a node can not be reached
+    restriction_sets : list of S lists of passages the tables were computed with
+    names : list of node ids in node index order, (lon, lat) tuples
+    """
+
+    def __init__(self, landmarks, distances, restriction_sets, names):
+        self.landmarks = list(landmarks)
+        self.distances = distances
+        self.restriction_sets = [frozenset(r) for r in restriction_sets]
+        self.names = names
+        self._name_to_idx = None
+        # tables with unreachable nodes at `_UNREACHABLE`, by table index
+        self._tables = {}
+
+    @classmethod
+    def from_compiled(cls, cg, names=None):
+        """
+        Returns the landmarks stored in a `CompiledGraph`, or None if it has none
+        """
+        alt = cg.header.get('alt')
+        if alt is None:
+            return None
+        return cls(cg[ALT_PREFIX + 'landmarks'].tolist(), cg[ALT_PREFIX + 'distances'],
+                   alt['restrictions'], names if names is not None else cg.node_names())
+
+    def to_compiled(self, cg):
+        """stores the tables in a `CompiledGraph` (arrays and header)"""
+        cg.arrays[ALT_PREFIX + 'landmarks'] = np.array(self.landmarks, dtype=np.int32)
+        cg.arrays[ALT_PREFIX + 'distances'] = np.asarray(self.distances, dtype=np.float64)
+        cg.header['alt'] = {'restrictions': [sorted(r) for r in self.restriction_sets]}
+        return cg
+
+    @property
+    def name_to_idx(self):
+        if self._name_to_idx is None:
+            self._name_to_idx = {name: i for i, name in enumerate(self.names)}
+        return self._name_to_idx
+
+    def table_index(self, restrictions=None):
+        """
+        Index of the tightest table valid with `restrictions`: computed with the
+        most passages, all of them in `restrictions`
+        """
+        restrictions = set(restrictions or ())
+        valid = [(len(r), i) for i, r in enumerate(self.restriction_sets) if r <= restrictions]
+        return max(valid)[1]
+
+    def _table(self, index):
+        table = self._tables.get(index)
+        if table is None:
+            table = np.array(self.distances[index], dtype=np.float64)
+            table[np.isinf(table)] = _UNREACHABLE
+            self._tables[index] = table
+        return table
+
+    def bounds_to(self, target, restrictions=None):
+        """
+        Lower bound of the distance of every node to `target` (numpy array in node index order)
+        """
+        table = self._table(self.table_index(restrictions))
+        t = self.name_to_idx[target]
+        bounds = table - table[:, t:t + 1]
+        np.abs(bounds, out=bounds)
+        return np.maximum.reduce(bounds, axis=0)
+
+    def heuristic(self, target, restrictions=None):
+        """
+        A* heuristic `heuristic(u, v)` on node ids towards `target`, `v` is ignored
+        """
+        bounds = self.bounds_to(target, restrictions).tolist()
+        name_to_idx = self.name_to_idx
+        return lambda u, v: bounds[name_to_idx[u]]
+
+
+def _dijkstra(lists, blocked, source):
+    """distances (list) of every node to `source`, skipping the blocked passage codes"""
+    indptr, indices, weights, codes = lists
+    dist = [_inf] * (len(indptr) - 1)
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, v = heappop(heap)
+        if d > dist[v]:
+            continue
+        for eid in range(indptr[v], indptr[v + 1]):
+            if codes[eid] in blocked:
+                continue
+            w = indices[eid]
+            dw = d + weights[eid]
+            if dw < dist[w]:
+                dist[w] = dw
+                heappush(heap, (dw, w))
+    return dist
+
+
+def build_landmarks(cg, count=LANDMARK_COUNT, restriction_sets=DEFAULT_RESTRICTION_SETS, names=None):
+    """
+    Chooses landmarks and computes their distance tables.
+
+    The first landmark is the node farthest from node 0, each next one the node
+    farthest from the landmarks already chosen, on the unrestricted network.
+
+    Parameters
+    ----------
+    cg : `searoute.compiled.CompiledGraph` of a Marnet
+    count : int, number of landmarks
+    restriction_sets : list of lists of passages, a table is computed for each
+        (and for the unrestricted network)
+    names : list of node ids in node index order, defaults to the coordinates of the image
+
+    Returns
+    -------
+    Landmarks
+    """
+    n = cg.node_count
+    lists = (cg['indptr'].tolist(), cg['indices'].tolist(), cg['weights'].tolist(), cg['passages'].tolist())
+    codes = {p: i for i, p in enumerate(cg.passages)}
+
+    sets = [frozenset()] + [frozenset(r) for r in restriction_sets if r]
+    sets = sorted(set(sets), key=lambda r: (len(r), sorted(r)))
+
+    landmarks, unrestricted = [], []
+    closest = _dijkstra(lists, set(), 0) if n else []
+    for _ in range(min(count, n)):
+        reachable = [(d, i) for i, d in enumerate(closest) if d != _inf and i not in landmarks]
+        if not reachable:
+            break
+        landmark = max(reachable)[1]
+        dist = _dijkstra(lists, set(), landmark)
+        landmarks.append(landmark)
+        unrestricted.append(dist)
+        closest = dist if len(landmarks) == 1 else [min(a, b) for a, b in zip(closest, dist)]
+
+    distances = np.empty((len(sets), len(landmarks), n), dtype=np.float64)
+    for s, restrictions in enumerate(sets):
+        blocked = {codes[p] for p in restrictions if p in codes}
+        for i, landmark in enumerate(landmarks):
+            distances[s, i] = unrestricted[i] if not restrictions else _dijkstra(lists, blocked, landmark)
+
+    return Landmarks(landmarks, distances, [sorted(r) for r in sets],
+                     names if names is not None else cg.node_names())
+
+
+def landmarks_graph(G, count=LANDMARK_COUNT, restriction_sets=DEFAULT_RESTRICTION_SETS):
+    """
+    Landmarks of a Marnet network (any backend), see `build_landmarks`.
+
+    Examples
+    --------
+    >>> landmarks = landmarks_graph(sr.setup_M())
+    >>> landmarks.heuristic(destination_node, restrictions=['northwest', 'suez'])
+    """
+    from ..compiled import compile_graph
+
+    cg = compile_graph(G)
+    return build_landmarks(cg, count, restriction_sets, names=list(G.nodes()))
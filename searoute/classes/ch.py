@@ -0,0 +1,500 @@
+"""
+Contraction Hierarchies (CH) for Marnet.
+
+Marnet is static between releases, so it is contracted once offline and the
+hierarchy is stored next to the graph in its compiled image (``ch/*`` arrays,
+see `searoute.compiled`). A query is then a bidirectional Dijkstra going only
+"up" the hierarchy, which settles a few hundred nodes at most: both upward
+searches are run by scipy.sparse.csgraph on the upward edges when it is
+installed, otherwise by a python Dijkstra.
+
+Passages stay usable as restrictions: every edge carries the bitmask of the
+passages it goes through (a shortcut, the union of the masks of its two
+halves). A shortcut is skipped during contraction only when a witness path
+exists whose mask is a subset of the shortcut mask, so that whatever passages
+are restricted, the witness can be used whenever the shortcut can. Between
+two nodes several edges are kept as long as none is both shorter and using
+fewer passages (pareto set).
+
+Arrays of the hierarchy (E edges, original ones first):
+
+- ``rank``        : int32 (n,) contraction order of the nodes
+- ``edge_u``, ``edge_v`` : int32 (E,) ends of the edges
+- ``edge_weight`` : float64 (E,)
+- ``edge_mask``   : int64 (E,) passages bitmask, bit i is the passage i of the image
+- ``edge_middle`` : int32 (E,) contracted node of a shortcut, -1 for original edges
+- ``edge_children`` : int32 (E, 2) halves of a shortcut (touching ``edge_u`` first)
+- ``up_indptr``, ``up_edges`` : CSR of the edges going up from each node
+"""
+from heapq import heappush, heappop
+import threading
+
+import numpy as np
+
+from ..matrix import _csgraph
+
+CH_PREFIX = 'ch/'
+
+# nodes settled at most by a witness search, a shortcut is added when no witness is found
+_SETTLE_LIMIT = 100
+# a witness may be longer than the shortcut by floating point errors
+_EPS = 1e-9
+
+# number of restriction sets whose upward edges are kept
+_UP_CACHE_SIZE = 8
+_up_cache_lock = threading.Lock()
+
+_ARRAYS = ('rank', 'edge_u', 'edge_v', 'edge_weight', 'edge_mask', 'edge_middle',
+           'edge_children', 'up_indptr', 'up_edges')
+
+_inf = float('inf')
+
+
+class ContractionHierarchy:
+    """
+    A contracted Marnet, see `contract`.
+
+    Parameters
+    ----------
+    arrays : dict of str -> numpy.ndarray, the arrays listed in the module doc
+    passages : list of passage names, indexed by the bits of ``edge_mask``
+    names : list of node ids in node index order, (lon, lat) tuples
+    """
+
+    def __init__(self, arrays, passages, names):
+        self.arrays = arrays
+        self.passages = list(passages)
+        self.names = names
+        self.name_to_idx = {name: i for i, name in enumerate(names)}
+        self._bits = {p: 1 << i for i, p in enumerate(self.passages)}
+
+        self._edge_u = arrays['edge_u'].tolist()
+        self._edge_v = arrays['edge_v'].tolist()
+        self._edge_middle = arrays['edge_middle'].tolist()
+        self._edge_children = arrays['edge_children'].tolist()
+
+        # (neighbour, weight, mask, edge id) going up from each node
+        indptr = arrays['up_indptr'].tolist()
+        up_edges = arrays['up_edges'].tolist()
+        weights = arrays['edge_weight'].tolist()
+        masks = arrays['edge_mask'].tolist()
+        self._up = [
+            [(self._edge_v[e] if self._edge_u[e] == x else self._edge_u[e], weights[e], masks[e], e)
+             for e in up_edges[indptr[x]:indptr[x + 1]]]
+            for x in range(len(names))
+        ]
+        # (neighbour, weight, edge id) going up without the restricted edges, by restriction mask
+        self._up_cache = {}
+        # (sparse matrix of the shortest edges going up, their edge ids) by restriction mask, see `_up_matrix`
+        self._matrix_cache = {}
+
+    @property
+    def node_count(self):
+        return len(self.names)
+
+    @property
+    def edge_count(self):
+        """number of edges, original and shortcuts"""
+        return len(self._edge_u)
+
+    @classmethod
+    def from_compiled(cls, cg, names=None):
+        """
+        Returns the hierarchy stored in a `CompiledGraph`, or None if it has none
+        """
+        if CH_PREFIX + 'rank' not in cg:
+            return None
+        arrays = {name: cg[CH_PREFIX + name] for name in _ARRAYS}
+        return cls(arrays, cg.passages, names if names is not None else cg.node_names())
+
+    def to_arrays(self):
+        """arrays to be stored in a compiled image"""
+        return {CH_PREFIX + name: self.arrays[name] for name in _ARRAYS}
+
+    def restriction_mask(self, restrictions):
+        """bitmask of the restricted passages, unknown passages are ignored"""
+        mask = 0
+        for p in restrictions or ():
+            mask |= self._bits.get(p, 0)
+        return mask
+
+    def shortest_path(self, source, target, restrictions=None):
+        """
+        Shortest path between two nodes of the graph.
+
+        Parameters
+        ----------
+        source, target : node ids
+        restrictions : list of passages to avoid
+
+        Returns
+        -------
+        length, path : the length (`inf` when there is no path) and the list of nodes
+        """
+        s = self.name_to_idx[source]
+        t = self.name_to_idx[target]
+        if s == t:
+            return 0, [source]
+
+        csgraph = _csgraph()
+        query = self._query_scipy if csgraph is not None else self._query
+        length, path_ix = query(s, t, self.restriction_mask(restrictions))
+        if not path_ix:
+            return _inf, []
+        names = self.names
+        return length, [names[ix] for ix in path_ix]
+
+    def _up_edges(self, blocked):
+        up = self._up_cache.get(blocked)
+        if up is None:
+            up = [[(y, w, e) for y, w, m, e in edges if not m & blocked] for edges in self._up]
+            with _up_cache_lock:
+                if len(self._up_cache) >= _UP_CACHE_SIZE:
+                    self._up_cache.pop(next(iter(self._up_cache)))
+                self._up_cache[blocked] = up
+        return up
+
+    def _up_matrix(self, blocked):
+        """
+        CSR matrix of the edges going up without the restricted ones, the shortest of the parallel ones,
+        and the id of these edges in the order of the matrix
+        """
+        found = self._matrix_cache.get(blocked)
+        if found is not None:
+            return found
+        from scipy.sparse import csr_matrix
+
+        arrays = self.arrays
+        n = self.node_count
+        edges = np.asarray(arrays['up_edges'], dtype=np.int64)
+        rows = np.repeat(np.arange(n), np.diff(arrays['up_indptr']))
+        keep = (np.asarray(arrays['edge_mask'])[edges] & blocked) == 0
+        edges, rows = edges[keep], rows[keep]
+        u, v = np.asarray(arrays['edge_u'])[edges], np.asarray(arrays['edge_v'])[edges]
+        cols = np.where(u == rows, v, u)
+        weights = np.asarray(arrays['edge_weight'], dtype=np.float64)[edges]
+
+        order = np.lexsort((weights, cols, rows))
+        rows, cols, weights, edges = rows[order], cols[order], weights[order], edges[order]
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        rows, cols, weights, edges = rows[first], cols[first], weights[first], edges[first]
+
+        indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        found = csr_matrix((weights, cols.astype(np.int32), indptr), shape=(n, n)), edges
+        with _up_cache_lock:
+            if len(self._matrix_cache) >= _UP_CACHE_SIZE:
+                self._matrix_cache.pop(next(iter(self._matrix_cache)))
+            self._matrix_cache[blocked] = found
+        return found
+
+    def _query_scipy(self, s, t, blocked):
+        """`_query` with both upward searches run at once by scipy, to the end of the upward search spaces"""
+        mat, edges = self._up_matrix(blocked)
+        dist, preds = _csgraph().dijkstra(mat, directed=True, indices=[s, t], return_predecessors=True)
+        total = dist[0] + dist[1]
+        meet = int(total.argmin())
+        best = float(total[meet])
+        if best == _inf:
+            return _inf, []
+
+        indptr, indices = mat.indptr, mat.indices
+
+        def edge(a, b):
+            """id of the edge going up from `a` to `b`"""
+            start, end = indptr[a], indptr[a + 1]
+            return int(edges[start + np.searchsorted(indices[start:end], b)])
+
+        forward = []
+        x = meet
+        while x != s:
+            a = int(preds[0, x])
+            forward.append((edge(a, x), a))
+            x = a
+        forward.reverse()
+
+        path = [s]
+        for e, a in forward:
+            self._unpack(e, a, path)
+        x = meet
+        while x != t:
+            self._unpack(edge(int(preds[1, x]), x), x, path)
+            x = path[-1]
+        return best, path
+
+    def _query(self, s, t, blocked):
+        up = self._up_edges(blocked)
+        n = len(up)
+        dist = ([_inf] * n, [_inf] * n)
+        pred = ([-1] * n, [-1] * n)
+        dist[0][s] = dist[1][t] = 0.0
+        heaps = ([(0.0, s)], [(0.0, t)])
+        best, meet = _inf, -1
+
+        while heaps[0] or heaps[1]:
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            heap, dist_side, pred_side = heaps[side], dist[side], pred[side]
+            d, x = heappop(heap)
+
+            if d >= best:
+                # nothing shorter can be found from this side
+                heap.clear()
+                continue
+            if d > dist_side[x]:
+                continue
+
+            other = dist[1 - side][x]
+            if d + other < best:
+                best, meet = d + other, x
+
+            for y, w, e in up[x]:
+                nd = d + w
+                if nd < dist_side[y]:
+                    dist_side[y] = nd
+                    pred_side[y] = e
+                    heappush(heap, (nd, y))
+
+        if meet < 0:
+            return _inf, []
+
+        # edges from s to the meeting node, then from the meeting node to t
+        forward = []
+        x = meet
+        while x != s:
+            e = pred[0][x]
+            x = self._other_end(e, x)
+            forward.append((e, x))
+        forward.reverse()
+
+        path = [s]
+        for e, a in forward:
+            self._unpack(e, a, path)
+        x = meet
+        while x != t:
+            e = pred[1][x]
+            self._unpack(e, x, path)
+            x = path[-1]
+        return best, path
+
+    def _other_end(self, e, x):
+        return self._edge_v[e] if self._edge_u[e] == x else self._edge_u[e]
+
+    def _unpack(self, e, a, path):
+        """appends to `path` the nodes of edge `e` walked from its end `a` (excluded)"""
+        edge_u, edge_v, edge_middle, edge_children = self._edge_u, self._edge_v, self._edge_middle, self._edge_children
+        stack = [(e, a)]
+        while stack:
+            e, a = stack.pop()
+            # down the first halves, the second ones are walked afterwards
+            middle = edge_middle[e]
+            while middle >= 0:
+                first, second = edge_children[e]
+                if a != edge_u[e]:
+                    first, second = second, first
+                stack.append((second, middle))
+                e, middle = first, edge_middle[first]
+            path.append(edge_v[e] if edge_u[e] == a else edge_u[e])
+
+
+def _add_pareto(entries, weight, mask, eid):
+    """
+    Adds an edge to the edges between two nodes unless one of them is as short
+    with a subset of its passages, removes the ones it makes useless
+    """
+    for w, m, _ in entries:
+        if w <= weight and not m & ~mask:
+            return False
+    entries[:] = [(w, m, e) for w, m, e in entries if not (weight <= w and not mask & ~m)]
+    entries.append((weight, mask, eid))
+    return True
+
+
+def _witness_dists(adj, source, skip, mask, max_dist, settle_limit):
+    """
+    Distances from `source` not going through `skip`, using only edges whose
+    passages are within `mask`
+    """
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    settled = 0
+    while heap:
+        d, x = heappop(heap)
+        if d > dist[x]:
+            continue
+        if d > max_dist or settled >= settle_limit:
+            break
+        settled += 1
+        for y, entries in adj[x].items():
+            if y == skip:
+                continue
+            for w, m, _ in entries:
+                if m & ~mask:
+                    continue
+                nd = d + w
+                if nd < dist.get(y, _inf):
+                    dist[y] = nd
+                    heappush(heap, (nd, y))
+    return dist
+
+
+def _shortcuts(adj, v, settle_limit):
+    """shortcuts needed to contract `v`: list of (u, w, weight, mask, edge u-v, edge v-w)"""
+    neighbours = list(adj[v].items())
+    shortcuts = []
+    for i, (u, entries_u) in enumerate(neighbours):
+        candidates = [(w, w1 + w2, m1 | m2, e1, e2)
+                      for w, entries_w in neighbours[i + 1:]
+                      for w1, m1, e1 in entries_u
+                      for w2, m2, e2 in entries_w]
+        if not candidates:
+            continue
+
+        by_mask = {}
+        for c in candidates:
+            by_mask[c[2]] = max(by_mask.get(c[2], 0.0), c[1])
+        witness = {mask: _witness_dists(adj, u, v, mask, max_dist, settle_limit)
+                   for mask, max_dist in by_mask.items()}
+
+        for w, weight, mask, e1, e2 in candidates:
+            if witness[mask].get(w, _inf) > weight + _EPS:
+                shortcuts.append((u, w, weight, mask, e1, e2))
+    return shortcuts
+
+
+def contract(cg, names=None, settle_limit=_SETTLE_LIMIT):
+    """
+    Contracts a compiled Marnet.
+
+    Nodes are contracted by increasing edge difference (shortcuts added minus
+    edges removed) plus number of contracted neighbours and depth, updated lazily.
+
+    Parameters
+    ----------
+    cg : `searoute.compiled.CompiledGraph` of a Marnet
+    names : list of node ids in node index order, defaults to the coordinates of the image
+    settle_limit : int, nodes settled at most by a witness search
+
+    Returns
+    -------
+    ContractionHierarchy
+    """
+    n = cg.node_count
+    if len(cg.passages) > 63:
+        raise ValueError('Contraction hierarchies support at most 63 distinct passages')
+
+    indptr = cg['indptr'].tolist()
+    indices = cg['indices'].tolist()
+    weights = cg['weights'].tolist()
+    codes = cg['passages'].tolist()
+
+    edge_u, edge_v, edge_weight, edge_mask, edge_middle, edge_children = [], [], [], [], [], []
+
+    def new_edge(u, v, weight, mask, middle=-1, children=(-1, -1)):
+        edge_u.append(u)
+        edge_v.append(v)
+        edge_weight.append(weight)
+        edge_mask.append(mask)
+        edge_middle.append(middle)
+        edge_children.append(children)
+        return len(edge_u) - 1
+
+    # both ends share the same list of (weight, mask, edge id)
+    adj = [dict() for _ in range(n)]
+    for u in range(n):
+        for k in range(indptr[u], indptr[u + 1]):
+            v = indices[k]
+            if v <= u:
+                continue
+            mask = 1 << codes[k] if codes[k] >= 0 else 0
+            entries = adj[u].get(v)
+            if entries is None:
+                entries = adj[u][v] = adj[v][u] = []
+            _add_pareto(entries, weights[k], mask, new_edge(u, v, weights[k], mask))
+
+    deleted_neighbours = [0] * n
+    # depth of the contracted nodes below a node
+    level = [0] * n
+
+    def priority(v):
+        degree = sum(len(entries) for entries in adj[v].values())
+        return len(_shortcuts(adj, v, settle_limit)) - degree + deleted_neighbours[v] + level[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heap.sort()
+    rank = [0] * n
+    up = [None] * n
+
+    for r in range(n):
+        while True:
+            _, v = heappop(heap)
+            p = priority(v)
+            if not heap or p <= heap[0][0]:
+                break
+            heappush(heap, (p, v))
+
+        rank[v] = r
+        shortcuts = _shortcuts(adj, v, settle_limit)
+        # every edge left at `v` goes up the hierarchy
+        up[v] = [e for entries in adj[v].values() for _, _, e in entries]
+
+        for u in adj[v]:
+            del adj[u][v]
+            deleted_neighbours[u] += 1
+            level[u] = max(level[u], level[v] + 1)
+        adj[v] = {}
+
+        for u, w, weight, mask, e1, e2 in shortcuts:
+            entries = adj[u].get(w)
+            if entries is None:
+                entries = adj[u][w] = adj[w][u] = []
+            # e1 joins u to v, e2 joins v to w
+            _add_pareto(entries, weight, mask, new_edge(u, w, weight, mask, v, (e1, e2)))
+
+    # only the edges going up and the ones they are made of are kept, renumbered
+    keep = [False] * len(edge_u)
+    stack = [e for edges in up for e in edges]
+    while stack:
+        e = stack.pop()
+        if keep[e]:
+            continue
+        keep[e] = True
+        if edge_middle[e] >= 0:
+            stack.extend(edge_children[e])
+    new_id = np.cumsum(keep).tolist()
+    new_id = [i - 1 if k else -1 for i, k in zip(new_id, keep)]
+
+    kept = [e for e in range(len(edge_u)) if keep[e]]
+    children = [[new_id[c] if c >= 0 else -1 for c in edge_children[e]] for e in kept]
+    up_edges = [sorted(new_id[e] for e in edges) for edges in up]
+
+    up_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(edges) for edges in up_edges], out=up_indptr[1:])
+
+    arrays = {
+        'rank': np.array(rank, dtype=np.int32),
+        'edge_u': np.array([edge_u[e] for e in kept], dtype=np.int32),
+        'edge_v': np.array([edge_v[e] for e in kept], dtype=np.int32),
+        'edge_weight': np.array([edge_weight[e] for e in kept], dtype=np.float64),
+        'edge_mask': np.array([edge_mask[e] for e in kept], dtype=np.int64),
+        'edge_middle': np.array([edge_middle[e] for e in kept], dtype=np.int32),
+        'edge_children': np.array(children, dtype=np.int32).reshape(len(kept), 2),
+        'up_indptr': up_indptr,
+        'up_edges': np.array([e for edges in up_edges for e in edges], dtype=np.int32),
+    }
+    return ContractionHierarchy(arrays, cg.passages, names if names is not None else cg.node_names())
+
+
+def contract_graph(G, settle_limit=_SETTLE_LIMIT):
+    """
+    Contracts a Marnet network (any backend), see `contract`.
+
+    Examples
+    --------
+    >>> ch = contract_graph(sr.setup_M())
+    >>> ch.shortest_path(origin_node, destination_node, restrictions=['northwest'])
+    """
+    from ..compiled import compile_graph
+
+    cg = compile_graph(G)
+    return contract(cg, names=list(G.nodes()), settle_limit=settle_limit)
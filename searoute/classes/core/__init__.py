@@ -1,67 +1,120 @@
-
-from .graph_nx import GraphNx, bidirectional_dijkstra as nx_dijkstra, astar_path as nx_astar
-
-# Optional igraph backend
-try:
-    from .graph_ig import GraphIG, bidirectional_dijkstra as ig_dijkstra, astar_path as ig_astar
-except ImportError:
-    GraphIG = None
-    ig_dijkstra = None
-    ig_astar = None
+import importlib
 
 # default binding at module level so import works immediately
 _DEFAULT = "networkx"
-bidirectional_dijkstra = nx_dijkstra
-astar_path = nx_astar
+
+# backends are imported only when chosen, see `_load_backend`
+_BACKEND_MODULES = {
+    "networkx": ".graph_nx",
+    "igraph": ".graph_ig",
+    "csr": ".graph_csr",
+}
+
+_INSTALL_HINTS = {
+    "igraph": "igraph backend is not installed. Run: pip install searoute[igraph] or pip install igraph",
+}
+
+
+def _load_backend(backend):
+    """
+    Import a backend module and returns its config:
+    {"class": ..., "bidirectional_dijkstra": ..., "astar_path": ...}
+    """
+    cfg = Graph._BACKENDS.get(backend)
+    if cfg is not None:
+        return cfg
+
+    try:
+        module = importlib.import_module(_BACKEND_MODULES[backend], __name__)
+    except ImportError as e:
+        raise ImportError(_INSTALL_HINTS.get(backend, str(e))) from e
+
+    cfg = {
+        "class": module.GRAPH_CLASS,
+        "bidirectional_dijkstra": module.bidirectional_dijkstra,
+        "astar_path": module.astar_path,
+    }
+    Graph._BACKENDS[backend] = cfg
+    return cfg
+
+
+def backend_functions(G):
+    """
+    Returns the config of the backend `G` was created with (algorithms by name)
+    """
+    return _load_backend(getattr(G, "_backend", None) or _DEFAULT)
+
+
+def bidirectional_dijkstra(G, source, target, weight="weight", restrictions=None):
+    return backend_functions(G)["bidirectional_dijkstra"](G, source, target, weight, restrictions=restrictions)
+
+
+def astar_path(G, source, target, heuristic=None, weight="weight", restrictions=None):
+    return backend_functions(G)["astar_path"](G, source, target, heuristic=heuristic, weight=weight,
+                                              restrictions=restrictions)
+
+
+def _rebuild_graph(cls, backend, node_set, edge_set, state):
+    """unpickles a network, see `Graph.__reduce__`"""
+    from ...utils import from_nodes_edges_set
+
+    G = from_nodes_edges_set(cls(backend=backend), node_set, edge_set)
+    G.__dict__.update(state)
+    return G
+
 
 class GraphBaseMeta(type):
     def __instancecheck__(cls, instance):
-        return any(isinstance(instance, b) for b in cls._BACKENDS.values())
-    
+        return any(isinstance(instance, b["class"]) for b in cls._BACKENDS.values())
+
 class Graph(metaclass=GraphBaseMeta):
-    _BACKENDS = {
-        "networkx": {"class": GraphNx, "bidirectional_dijkstra": nx_dijkstra, "astar_path": nx_astar},
-        "igraph": {"class": GraphIG, "bidirectional_dijkstra": ig_dijkstra, "astar_path": ig_astar},
-    }
+    # loaded backends only, filled by `_load_backend`
+    _BACKENDS = {}
 
     def __new__(cls, backend=None, **kwargs):
 
         if backend is None:
             backend = _DEFAULT
         else:
-            if backend not in cls._BACKENDS:
-                raise ValueError(f"Unknown backend '{backend}'. Choose from: {list(cls._BACKENDS.keys())}")
-
-        cfg = cls._BACKENDS[backend]
-        Base = cfg["class"]
-
-        if Base is None:
-            raise ImportError(
-                "igraph backend is not installed. Run: pip install searoute[igraph] or pip install igraph"
-            )
-
-        # Inject algorithms as module-level names dynamically
-        import sys
-        module = sys.modules[cls.__module__]
-        for name, fn in cfg.items():
-            if name != "class":
-                setattr(module, name, fn)  # rebind at module level 
-        
+            if backend not in _BACKEND_MODULES:
+                raise ValueError(f"Unknown backend '{backend}'. Choose from: {list(_BACKEND_MODULES.keys())}")
+
+        Base = _load_backend(backend)["class"]
+
         # Skip if already a resolved dynamic class (avoid infinite recursion)
         if Base in cls.__bases__:
             return Base.__new__(cls)
-        
+
         # DynamicClass inherits from Marnet + Base, so super() works correctly
-        DynamicClass = type(cls.__name__, (cls, Base), {"__new__": Base.__new__})
+        DynamicClass = type(cls.__name__, (cls, Base), {"__new__": Base.__new__, "_backend": backend})
         instance = Base.__new__(DynamicClass)
         return instance
 
     def __init__(self, backend="graph_ig", *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+    # attributes kept by pickling, next to the nodes and edges (see `__reduce__`)
+    _PICKLED = ("graph",)
+
+    def __reduce__(self):
+        """
+        Networks are pickled as their class (e.g. Marnet), backend, nodes and edges and
+        rebuilt with `from_nodes_edges_set`: the class built by `__new__` for the backend
+        can not be pickled, neither can the graph of some backends (igraph). Caches and
+        precomputed tables are built again when used.
+        """
+        node_set = dict(self.nodes(data=True))
+        edge_set = {}
+        for u, v, data in self.edges(data=True):
+            edge_set.setdefault(u, {}).setdefault(v, data)
+            edge_set.setdefault(v, {}).setdefault(u, data)
+        state = {name: getattr(self, name) for name in self._PICKLED if hasattr(self, name)}
+        return _rebuild_graph, (type(self).__bases__[0], self._backend, node_set, edge_set, state)
+
 
 __all__ = [
     "Graph",
+    "backend_functions",
     "bidirectional_dijkstra",
     "astar_path"
-]
\ No newline at end of file
+]
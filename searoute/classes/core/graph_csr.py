@@ -0,0 +1,553 @@
+"""
+Array backed graph (CSR) with integer node ids.
+
+Edges are kept as CSR arrays:
+- ``indptr``  : int64 offsets, edges of node i are ``indptr[i]:indptr[i+1]``
+- ``indices`` : int32 targets
+- ``weights`` : float64 weights
+- ``passages``: int8 passage codes, -1 when no passage (names in ``passage_names``)
+
+Both directions of every edge are stored, the graph is undirected.
+Mutations (``add_edge``...) are buffered and merged into the arrays on the next read.
+
+Shortest paths run on integer ids over python lists of the arrays (pure python heapq),
+or on scipy.sparse.csgraph when scipy is installed.
+"""
+from heapq import heappush, heappop
+import numpy as np
+
+from ...utils import distance, distance_many
+
+
+INF = float("inf")
+
+# scipy.sparse.csgraph, optional and imported on first search, see `_csgraph_module`
+_CSGRAPH = []
+
+
+def _csgraph_module():
+    """
+    Returns scipy.sparse.csgraph, or None when scipy is not installed
+    """
+    if not _CSGRAPH:
+        try:
+            from scipy.sparse import csgraph
+        except ImportError:
+            csgraph = None
+        _CSGRAPH.append(csgraph)
+    return _CSGRAPH[0]
+
+
+class NodeAccessor:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __getitem__(self, key):
+        return self.graph._attrs[self.graph.name_to_idx[key]]
+
+    def __iter__(self):
+        return iter(self.graph._names)
+
+    def __len__(self):
+        return len(self.graph._names)
+
+    def __call__(self, data=False):
+        if data:
+            return list(zip(self.graph._names, self.graph._attrs))
+        return list(self.graph._names)
+
+
+class GraphCSR:
+    def __init__(self, *args, **kwargs):
+        """
+        Array backed graph, nodes are any hashable (a (lon, lat) tuple for searoute)
+        """
+        self.graph = {}
+
+        self._names = []
+        self._attrs = []
+        self.name_to_idx = {}
+
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.weights = np.zeros(0, dtype=np.float64)
+        self.passages = np.zeros(0, dtype=np.int8)
+        self.passage_names = []
+
+        # attributes other than weight and passage, {(u_ix, v_ix): {...}}
+        self._edge_extra = {}
+        # buffered edges {(u_ix, v_ix): attr}, merged by `_freeze`
+        self._pending = {}
+        # caches derived from the arrays, cleared on change
+        self._cache = {}
+
+    # ---------------------------
+    # NODE CREATION
+    # ---------------------------
+    def _add_node_ix(self, node):
+        ix = self.name_to_idx.get(node)
+        if ix is None:
+            ix = len(self._names)
+            self.name_to_idx[node] = ix
+            self._names.append(node)
+            self._attrs.append({})
+            self._cache.clear()
+        return ix
+
+    def add_node(self, node, **attr):
+        ix = self._add_node_ix(node)
+        self._attrs[ix].update(attr)
+
+    @property
+    def _node(self):
+        raise NotImplementedError("This is a setter-only property.")
+
+    @_node.setter
+    def _node(self, nodes: dict):
+        """
+        Bulk insert nodes {node: {attr...}}
+        """
+        for node, attr in nodes.items():
+            ix = self._add_node_ix(node)
+            self._attrs[ix] = attr
+
+    # ---------------------------
+    # EDGE CREATION
+    # ---------------------------
+    def add_edge(self, u, v, **attr):
+        u_ix = self._add_node_ix(u)
+        v_ix = self._add_node_ix(v)
+        current = self._pending.get((u_ix, v_ix)) or self._get_edge_attr(u_ix, v_ix) or {}
+        current = dict(current, **attr)
+        self._pending[(u_ix, v_ix)] = current
+        self._pending[(v_ix, u_ix)] = current
+        self._cache.clear()
+
+    @property
+    def _adj(self):
+        raise NotImplementedError("This is a setter-only property.")
+
+    @_adj.setter
+    def _adj(self, edges_set: dict):
+        """
+        Bulk insert edges {u: {v: {attr...}}}
+        """
+        for u, targets in edges_set.items():
+            u_ix = self._add_node_ix(u)
+            for v, attr in targets.items():
+                self._pending[(u_ix, self._add_node_ix(v))] = attr
+        self._cache.clear()
+        self._freeze()
+
+    def _freeze(self):
+        """
+        Merges buffered edges into the CSR arrays
+        """
+        n = len(self._names)
+        if not self._pending and len(self.indptr) == n + 1:
+            return
+
+        edges = {}
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        weights, codes = self.weights.tolist(), self.passages.tolist()
+        for u_ix in range(len(indptr) - 1):
+            for eid in range(indptr[u_ix], indptr[u_ix + 1]):
+                key = (u_ix, indices[eid])
+                attr = {'weight': weights[eid]}
+                if codes[eid] >= 0:
+                    attr['passage'] = self.passage_names[codes[eid]]
+                attr.update(self._edge_extra.get(key, {}))
+                edges[key] = attr
+        edges.update(self._pending)
+
+        # undirected: make sure both directions exist
+        for (u_ix, v_ix), attr in list(edges.items()):
+            edges.setdefault((v_ix, u_ix), attr)
+
+        keys = sorted(edges)
+        passage_names = sorted({a['passage'] for a in edges.values() if a.get('passage') is not None})
+        passage_code = {p: i for i, p in enumerate(passage_names)}
+        if len(passage_names) > 127:
+            raise ValueError('The csr backend supports at most 127 distinct passages')
+
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(np.array([u for u, _ in keys], dtype=np.int64), minlength=n), out=self.indptr[1:])
+        self.indices = np.array([v for _, v in keys], dtype=np.int32)
+        self.weights = np.array([edges[k].get('weight', 1) for k in keys], dtype=np.float64)
+        self.passages = np.array([passage_code.get(edges[k].get('passage'), -1) for k in keys], dtype=np.int8)
+        self.passage_names = passage_names
+        self._edge_extra = {
+            k: extra for k in keys
+            for extra in [{a: b for a, b in edges[k].items() if a not in ('weight', 'passage')}] if extra
+        }
+        self._pending = {}
+        self._cache.clear()
+
+    def _attach_compiled(self, cg):
+        """
+        Uses the arrays of a `searoute.compiled.CompiledGraph` in place (no copy)
+        """
+        self._names = cg.node_names()
+        self._attrs = cg.node_attrs()
+        self.name_to_idx = {name: i for i, name in enumerate(self._names)}
+
+        self.indptr = cg['indptr']
+        self.indices = cg['indices']
+        self.weights = cg['weights']
+        self.passages = cg['passages']
+        self.passage_names = list(cg.passages)
+
+        self._edge_extra = {}
+        columns = [(col, cg.edge_column(col)) for col in cg.header['edge_columns']]
+        if columns:
+            sources = np.repeat(np.arange(len(self._names)), np.diff(self.indptr)).tolist()
+            targets = self.indices.tolist()
+            for eid, (u_ix, v_ix) in enumerate(zip(sources, targets)):
+                extra = {col: values[eid][1] for col, values in columns if values[eid][0]}
+                if extra:
+                    self._edge_extra[(u_ix, v_ix)] = extra
+
+        self._pending = {}
+        self._cache.clear()
+
+    # ---------------------------
+    # ACCESS
+    # ---------------------------
+    @property
+    def nodes(self):
+        return NodeAccessor(self)
+
+    def __contains__(self, node):
+        try:
+            return node in self.name_to_idx
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def number_of_nodes(self):
+        return len(self._names)
+
+    def number_of_edges(self):
+        self._freeze()
+        return len(self.edges())
+
+    def _get_edge_attr(self, u_ix, v_ix):
+        if (u_ix, v_ix) in self._pending:
+            return self._pending[(u_ix, v_ix)]
+        if u_ix >= len(self.indptr) - 1:
+            return None
+        start, end = int(self.indptr[u_ix]), int(self.indptr[u_ix + 1])
+        for eid in range(start, end):
+            if self.indices[eid] == v_ix:
+                attr = {'weight': float(self.weights[eid])}
+                code = int(self.passages[eid])
+                if code >= 0:
+                    attr['passage'] = self.passage_names[code]
+                attr.update(self._edge_extra.get((u_ix, v_ix), {}))
+                return attr
+        return None
+
+    def get_edge_data(self, u, v, default=None):
+        """
+        Same behavior as NetworkX:
+        G.get_edge_data(u, v, default=None)
+        """
+        u_ix = self.name_to_idx.get(u) if u in self else None
+        v_ix = self.name_to_idx.get(v) if v in self else None
+        if u_ix is None or v_ix is None:
+            return default
+        attr = self._get_edge_attr(u_ix, v_ix)
+        return default if attr is None else attr
+
+    def has_edge(self, u, v):
+        return self.get_edge_data(u, v) is not None
+
+    def neighbors(self, node):
+        self._freeze()
+        ix = self.name_to_idx[node]
+        return [self._names[v] for v in self.indices[self.indptr[ix]:self.indptr[ix + 1]].tolist()]
+
+    def edges(self, data=False):
+        """
+        graph.edges() -> [(u, v), ...], each undirected edge once
+        graph.edges(data=True) -> [(u, v, attrs), ...]
+        """
+        self._freeze()
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        result = []
+        for u_ix in range(len(self._names)):
+            for eid in range(indptr[u_ix], indptr[u_ix + 1]):
+                v_ix = indices[eid]
+                if v_ix < u_ix:
+                    continue
+                u, v = self._names[u_ix], self._names[v_ix]
+                result.append((u, v, self._get_edge_attr(u_ix, v_ix)) if data else (u, v))
+        return result
+
+    # ---------------------------
+    # SUBGRAPH
+    # ---------------------------
+    def subgraph(self, node_names):
+        """
+        Induced subgraph, a new graph of the same class
+        """
+        self._freeze()
+        keep = [self.name_to_idx[n] for n in dict.fromkeys(node_names) if n in self]
+        kept = set(keep)
+
+        subg = type(self)()
+        subg._node = {self._names[ix]: self._attrs[ix] for ix in keep}
+        subg._adj = {
+            self._names[u_ix]: {
+                self._names[v_ix]: self._get_edge_attr(u_ix, v_ix)
+                for v_ix in self.indices[self.indptr[u_ix]:self.indptr[u_ix + 1]].tolist() if v_ix in kept
+            }
+            for u_ix in keep
+        }
+        return subg
+
+    # ---------------------------
+    # SEARCH HELPERS
+    # ---------------------------
+    def _lists(self):
+        """
+        CSR arrays as python lists, faster for scalar access in the search loops
+        """
+        lists = self._cache.get('lists')
+        if lists is None:
+            self._freeze()
+            lists = (self.indptr.tolist(), self.indices.tolist(), self.weights.tolist(), self.passages.tolist())
+            self._cache['lists'] = lists
+        return lists
+
+    def _blocked(self, restrictions):
+        """
+        list of booleans per passage code, True when the passage is restricted
+        """
+        restrictions = restrictions or ()
+        return [p in restrictions for p in self.passage_names]
+
+    def _coords(self):
+        coords = self._cache.get('coords')
+        if coords is None:
+            coords = np.array(self._names, dtype=np.float64).reshape(len(self._names), -1)
+            self._cache['coords'] = coords
+        return coords
+
+    def _csgraph(self, restrictions):
+        """
+        scipy csr_matrix without the restricted edges, cached per restriction set
+        """
+        key = ('csgraph', frozenset(restrictions or ()))
+        mat = self._cache.get(key)
+        if mat is None:
+            self._freeze()
+            n = len(self._names)
+            blocked = np.array(self._blocked(restrictions) + [False], dtype=bool)
+            keep = ~blocked[self.passages.astype(np.intp)]  # code -1 -> last (False)
+            sources = np.repeat(np.arange(n), np.diff(self.indptr))
+            indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(sources[keep], minlength=n), out=indptr[1:])
+            from scipy.sparse import csr_matrix
+            mat = csr_matrix((self.weights[keep], self.indices[keep], indptr), shape=(n, n))
+            self._cache[key] = mat
+        return mat
+
+    def _use_scipy(self):
+        # `use_scipy` None (default) means when installed
+        if getattr(self, 'use_scipy', None) is False:
+            return False
+        return _csgraph_module() is not None
+
+
+GRAPH_CLASS = GraphCSR
+
+
+class _LazyBound(dict):
+    """
+    heuristic values per node id, `heuristic(u, target)` is called on first access only
+    """
+    def __init__(self, heuristic, names, target):
+        super().__init__()
+        self.heuristic = heuristic
+        self.names = names
+        self.target = target
+
+    def __missing__(self, ix):
+        value = self[ix] = self.heuristic(self.names[ix], self.target)
+        return value
+
+
+def _path_from_preds(preds, target):
+    path = []
+    v = target
+    while v >= 0:
+        path.append(v)
+        v = preds[v]
+    path.reverse()
+    return path
+
+
+def _bidirectional(lists, blocked, source, target):
+    """
+    Bidirectional dijkstra over integer ids, returns (length, path of ids)
+    """
+    if source == target:
+        return 0.0, [source]
+
+    indptr, indices, weights, codes = lists
+    n = len(indptr) - 1
+    dist = ([INF] * n, [INF] * n)
+    settled = (bytearray(n), bytearray(n))
+    preds = ([-1] * n, [-1] * n)
+    fringe = ([(0.0, source)], [(0.0, target)])
+    dist[0][source] = 0.0
+    dist[1][target] = 0.0
+
+    best, meet = INF, -1
+    d = 1
+    while fringe[0] and fringe[1]:
+        # stop when no shorter connection can be found
+        if fringe[0][0][0] + fringe[1][0][0] >= best:
+            break
+        d = 1 - d
+        dv, v = heappop(fringe[d])
+        if settled[d][v]:
+            continue
+        settled[d][v] = 1
+
+        dist_d, dist_o, preds_d, fringe_d = dist[d], dist[1 - d], preds[d], fringe[d]
+        for eid in range(indptr[v], indptr[v + 1]):
+            code = codes[eid]
+            if code >= 0 and blocked[code]:
+                continue
+            w = indices[eid]
+            vw = dv + weights[eid]
+            if vw < dist_d[w]:
+                dist_d[w] = vw
+                preds_d[w] = v
+                heappush(fringe_d, (vw, w))
+            total = dist_d[w] + dist_o[w]
+            if total < best:
+                best, meet = total, w
+
+    if meet < 0:
+        return INF, []
+
+    forward = _path_from_preds(preds[0], meet)
+    backward = _path_from_preds(preds[1], meet)
+    backward.reverse()
+    return best, forward + backward[1:]
+
+
+def _astar(lists, blocked, source, target, h):
+    """
+    A* over integer ids with a heuristic list `h` (lower bound to target), returns (length, path of ids)
+    """
+    indptr, indices, weights, codes = lists
+    n = len(indptr) - 1
+    dist = [INF] * n
+    preds = [-1] * n
+    closed = bytearray(n)
+    dist[source] = 0.0
+    heap = [(h[source], 0.0, source)]
+
+    while heap:
+        _, dv, v = heappop(heap)
+        if v == target:
+            return dv, _path_from_preds(preds, target)
+        if closed[v]:
+            continue
+        closed[v] = 1
+
+        for eid in range(indptr[v], indptr[v + 1]):
+            code = codes[eid]
+            if code >= 0 and blocked[code]:
+                continue
+            w = indices[eid]
+            vw = dv + weights[eid]
+            if vw < dist[w]:
+                dist[w] = vw
+                preds[w] = v
+                heappush(heap, (vw + h[w], vw, w))
+
+    return INF, []
+
+
+def _scipy_path(G, source, target, restrictions):
+    dist, preds = _csgraph_module().dijkstra(G._csgraph(restrictions), directed=True, indices=source,
+                                             return_predecessors=True)
+    length = float(dist[target])
+    if length == INF:
+        return INF, []
+    return length, _path_from_preds(preds.tolist(), target)
+
+
+def distances_to(G, target_ix, units='km'):
+    """
+    Great circle distance of every node to the node `target_ix` (vectorized `searoute.utils.distance`)
+    """
+    coords = G._coords()
+    return distance_many(coords, coords[target_ix], units)
+
+
+# -----------------------------------
+# SHORTEST PATH
+# -----------------------------------
+def bidirectional_dijkstra(G:GraphCSR, source, target, weight="weight", restrictions=None):
+    """
+    Shortest path on integer ids, passages of `restrictions` (default None which means `G.restrictions`) are skipped.
+    Uses scipy.sparse.csgraph when installed (`G.use_scipy` to force on/off).
+    `weight` is ignored, the weights of the arrays are used.
+
+    Returns
+    -------
+    length, path : (inf, []) when there is no path
+    """
+    source_ix = G.name_to_idx[source]
+    target_ix = G.name_to_idx[target]
+    if restrictions is None:
+        restrictions = getattr(G, 'restrictions', None)
+
+    if G._use_scipy() and source_ix != target_ix:
+        length, path_ix = _scipy_path(G, source_ix, target_ix, restrictions)
+    else:
+        length, path_ix = _bidirectional(G._lists(), G._blocked(restrictions), source_ix, target_ix)
+
+    names = G._names
+    return length, [names[ix] for ix in path_ix]
+
+
+# -----------------------------------
+# A*
+# -----------------------------------
+def astar_path(G:GraphCSR, source, target, heuristic=None, weight="weight", restrictions=None):
+    """
+    A* on integer ids, passages of `restrictions` (default None which means `G.restrictions`) are skipped.
+    When `heuristic` is `searoute.utils.distance` the bound is computed once for all nodes with numpy,
+    otherwise `heuristic(u, target)` is called on node names.
+
+    Returns
+    -------
+    length, path : (inf, []) when there is no path
+    """
+    source_ix = G.name_to_idx[source]
+    target_ix = G.name_to_idx[target]
+    names = G._names
+
+    if heuristic is None:
+        h = [0.0] * len(names)
+    elif heuristic is distance:
+        h = distances_to(G, target_ix).tolist()
+    else:
+        h = _LazyBound(heuristic, names, target)
+
+    if restrictions is None:
+        restrictions = getattr(G, 'restrictions', None)
+    length, path_ix = _astar(G._lists(), G._blocked(restrictions), source_ix, target_ix, h)
+    return length, [names[ix] for ix in path_ix]
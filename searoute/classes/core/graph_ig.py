@@ -1,6 +1,10 @@
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+import threading
+import numpy as np
 from igraph import Graph as IGraph
 
+from ...utils import distance, distance_many, avg_earth_radius_km, conversions
+
 
 def path_ix_to_name(g, path):
     """
@@ -110,8 +114,28 @@ class GraphIG(IGraph):
         #cache weights for fast access during pathfinding
         self.passage_to_edges = defaultdict(list)
 
+        # weight vectors by frozen restriction set, see `weights_for`
+        self._weights_cache = OrderedDict()
+
         super().__init__(*args, **kwargs)
 
+    def clear_weights_cache(self):
+        """
+        Drops the cached weight vectors, call it after changing edge
+        `weight` or `passage` attributes in place (`G.es[...] = ...`)
+        """
+        self._weights_cache = OrderedDict()
+        # the weights searched by A* depend on the edges
+        self._coords_cache = None
+
+    def add_edges(self, *args, **kwargs):
+        self.clear_weights_cache()
+        return super().add_edges(*args, **kwargs)
+
+    def delete_edges(self, *args, **kwargs):
+        self.clear_weights_cache()
+        return super().delete_edges(*args, **kwargs)
+
     # ---------------------------
     # NODE CREATION (optimized)
     # ---------------------------
@@ -202,6 +226,8 @@ class GraphIG(IGraph):
 
             self.es[key] = atrs
 
+        self.clear_weights_cache()
+
 
             #self.es[key] = [attr.get(key, None) for attr in attrs_list]
 
@@ -251,102 +277,248 @@ class GraphIG(IGraph):
 
 
 
-def avoid_passages0(g, avoid=None):
-    if not avoid:
-        return g.es["weight"]  # no copy needed — read only
+GRAPH_CLASS = GraphIG
+
+
+# number of restriction sets whose weights are kept
+WEIGHTS_CACHE_SIZE = 8
+# guards the LRU updates of the weight caches between threads
+_weights_lock = threading.Lock()
+
 
-    avoid_set = set(avoid)  # O(1) lookup, already a set but safety
-    return [
-        float("inf") if p in avoid_set else w
-        for p, w in zip(g.es["passage"], g.es["weight"])
-    ]
+def weights_for(G:IGraph, restrictions=None, tie_break=False):
+    """
+    Weights of the edges as an immutable tuple, `inf` for the passages in `restrictions`.
 
-def avoid_passages(g, avoid=None):
-    base_wights = g.es["weight"]
-    if not avoid:
-        return base_wights  # no copy needed — read only
+    Vectors are kept in a LRU cache keyed by the frozen restriction set (most queries
+    share a handful of sets), with their copy searched by A* (tie-broken, and a few rounded
+    weights raised to the great circle length, see `vertex_coords`) and the connected components
+    (`components_for`) built on demand.
+    The cache is cleared when edges are added or deleted.
+    """
+    entry = _weights_entry(G, restrictions)
+    if not tie_break:
+        return entry[0]
 
-    avoid_set = set(avoid)  # O(1) lookup, already a set but safety
+    if entry[1] is None:
+        # not below the smallest weight searched, see `vertex_coords`
+        floors = vertex_coords(G)[3]
+        entry[1] = tuple(max(w, floor) + _TIE_BREAK_KM for w, floor in zip(entry[0], floors))
+    return entry[1]
 
-    weights = base_wights.copy()
 
-    for restricted_passage in avoid_set:
-        for eid in g.passage_to_edges.get(restricted_passage, []):
-            weights[eid] = float("inf")
+def components_for(G:IGraph, restrictions=None):
+    """
+    Connected component of every vertex without the edges of the passages in `restrictions`,
+    as a list indexed by vertex id, cached with the weights (see `weights_for`)
+    """
+    entry = _weights_entry(G, restrictions)
+    if entry[2] is None or len(entry[2]) != G.vcount():
+        edges = G.get_edgelist()
+        kept = [edges[eid] for eid, w in enumerate(entry[0]) if w != float("inf")]
+        entry[2] = IGraph(n=G.vcount(), edges=kept).connected_components().membership
+    return entry[2]
+
+
+def _weights_entry(G:IGraph, restrictions):
+    """[weights, tie-broken weights, components] of a restriction set, see `weights_for`"""
+    key = frozenset(restrictions or ())
+    with _weights_lock:
+        cache = getattr(G, "_weights_cache", None)
+        if cache is None:
+            cache = G._weights_cache = OrderedDict()
+        entry = cache.get(key)
+        if entry is not None:
+            cache.move_to_end(key)
+
+    if entry is None:
+        base_weights = G.es["weight"] if G.ecount() else []
+        if key:
+            passages = G.es["passage"] if "passage" in G.es.attributes() else [None] * len(base_weights)
+            weights = tuple(float("inf") if p in key else w for p, w in zip(passages, base_weights))
+        else:
+            weights = tuple(base_weights)
+
+        entry = [weights, None, None]
+        with _weights_lock:
+            cache[key] = entry
+            if len(cache) > WEIGHTS_CACHE_SIZE:
+                cache.popitem(last=False)
+    return entry
+
+
+def _epath_to_path(G:IGraph, source_idx, epath, weights):
+    """
+    Length and vertex names of a path given by its edge ids, from the weights searched
+    """
+    total_distance = sum(weights[eid] for eid in epath)
+    if total_distance == float("inf"):
+        return float("inf"), []
+
+    # walk the edges from the source to get the vertices
+    path_idx = [source_idx]
+    for eid in epath:
+        u, v = G.es[eid].tuple
+        path_idx.append(v if u == path_idx[-1] else u)
+
+    return total_distance, path_ix_to_name(G, path_idx)
 
-    return weights
 
 # -----------------------------------
 # SHORTEST PATH
 # -----------------------------------
-def bidirectional_dijkstra(G:IGraph, source, target, weight="weight"):
+def bidirectional_dijkstra(G:IGraph, source, target, weight="weight", restrictions=None):
     """
-    Optimized shortest path:
+    Optimized shortest path, `restrictions` default None which means `G.restrictions`:
     - only runs Dijkstra once
     - uses cached weights
+    - the length is summed from the edges of the path found
     """
 
     source_idx = G.name_to_idx[source]
     target_idx = G.name_to_idx[target]
 
-    path_idx = G.get_shortest_paths(
+    if source_idx == target_idx:
+        return 0, [source]
+
+    if restrictions is None:
+        restrictions = G.restrictions
+    weights = weights_for(G, restrictions)
+    epath = G.get_shortest_paths(
         source_idx,
         target_idx,
-        algorithm="dijkstra", 
-        weights = avoid_passages(G, G.restrictions)
+        algorithm="dijkstra",
+        weights=weights,
+        output="epath",
     )[0]
 
-    if not path_idx:
+    if not epath:
         return float("inf"), []
 
-    # Compute total distance without running Dijkstra again
-    total_distance = sum(
-        float("inf") if edge["passage"] in G.restrictions else edge["weight"]
-        for u, v in zip(path_idx, path_idx[1:])
-        for edge in [G.es[G.get_eid(u, v)]]
-    )
-
-    return total_distance, path_ix_to_name(G, path_idx)
+    return _epath_to_path(G, source_idx, epath, weights)
 
 # -----------------------------------
 # A*
 # -----------------------------------
-def astar_path(G:IGraph, source, target, heuristic=None, weight="weight"):
+# both ends of edges shorter than this (km) or with 0 weight (antimeridian links)
+# share the coordinates of one of them in the A* bound
+_MERGE_KM = 0.2
+
+# edges whose weight is below the great circle length of the A* bound by at most this (km),
+# from rounded weights and merged ends, are searched with the length
+_ROUNDING_KM = 0.5
+
+# added to every weight searched by A*, so that no vertex can be reached again with a
+# (floating point) shorter path once closed, which igraph does not support
+_TIE_BREAK_KM = 1e-6
+
+
+def vertex_coords(G:IGraph):
     """
-    Optimized shortest path:
-    - only runs A* once
-    - uses cached weights
+    Cached per-vertex coordinates for the A* bound, as arrays indexed by vertex id:
+    (lon, lat, cos(lat)) in radians, the smallest weight searched for every edge and the
+    scale factor of the bound.
+
+    igraph's A* requires a consistent heuristic (h(u) <= w(u, v) + h(v)) but weights
+    are rounded and some links have 0 weight, so the great circle distance is made consistent by:
+    - merging the ends of very short edges (`_MERGE_KM`) into one point
+    - searching the edges whose weight is a bit below the great circle length left
+      (`_ROUNDING_KM`) with the length instead (see `weights_for`)
+    - scaling the distance by the smallest weight / great circle length ratio of the other
+      edges, 1 for the default Marnet whose weights are great circle lengths
+    """
+    cached = getattr(G, "_coords_cache", None)
+    if cached is not None and cached[-1] == (G.vcount(), G.ecount()):
+        return cached
+
+    names = G.vs["name"] if G.vcount() else []
+    coords = np.array([n[:2] for n in names], dtype=np.float64).reshape(len(names), 2)
+    edges = np.array(G.get_edgelist(), dtype=np.intp).reshape(-1, 2)
+    weights = np.array(G.es["weight"] if G.ecount() else [], dtype=np.float64)
+    u, v = edges[:, 0], edges[:, 1]
+
+    parent = list(range(len(names)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    merged = (weights == 0) | (distance_many(coords[u], coords[v], 'km') < _MERGE_KM)
+    for a, b in edges[merged].tolist():
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[rb] = ra
+
+    coords = coords[[find(x) for x in range(len(names))]].reshape(len(names), 2)
+
+    d = distance_many(coords[u], coords[v], 'km')
+    rounded = (weights < d) & (d - weights <= _ROUNDING_KM)
+    floors = np.where(rounded, d, 0.0).tolist()
+    other = (d > 0) & ~rounded
+    scale = min(1.0, float((weights[other] / d[other]).min(initial=1.0)))
+    # margin for floating point errors
+    scale *= 1 - 1e-9
+
+    lon, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    cached = (lon, lat, np.cos(lat), floors, scale, (G.vcount(), G.ecount()))
+    G._coords_cache = cached
+    return cached
+
+
+def _great_circle_bound(G:IGraph, target_idx):
     """
+    Heuristic of `searoute.utils.distance` (km) to the target, computed once for all vertices
+    """
+    lon, lat, cos_lat, _, scale, _ = vertex_coords(G)
+    a = np.sin((lat[target_idx] - lat) / 2) ** 2 + np.sin((lon[target_idx] - lon) / 2) ** 2 * cos_lat * cos_lat[target_idx]
+    h = (2 * avg_earth_radius_km * conversions["km"] * scale * np.arcsin(np.sqrt(np.minimum(a, 1.0)))).tolist()
+
+    return lambda graph, u, v: h[u]
 
-    return bidirectional_dijkstra(G, source, target, weight)
+
+def astar_path(G:IGraph, source, target, heuristic=None, weight="weight", restrictions=None):
+    """
+    A* shortest path (igraph ``get_shortest_path_astar``), `restrictions` default None which means `G.restrictions`:
+    - uses cached weights
+    - when `heuristic` is `searoute.utils.distance`, the bound is computed from
+      cached per-vertex coordinates instead of vertex names
+    - targets in another connected component (`components_for`) are not searched
+    - the length is summed from the edges of the path found
+    """
 
     source_idx = G.name_to_idx[source]
     target_idx = G.name_to_idx[target]
 
-    def custom_heuristic(graph, u, v):
-        if heuristic is None:
-            return 1
-        return heuristic(
-            graph.vs[u]["name"],
-            graph.vs[v]["name"]
-        )
+    if source_idx == target_idx:
+        return 0, [source]
+
+    if restrictions is None:
+        restrictions = G.restrictions
+
+    if heuristic is None:
+        custom_heuristic = lambda graph, u, v: 0
+    elif heuristic is distance:
+        custom_heuristic = _great_circle_bound(G, target_idx)
+    else:
+        names = G.vs["name"]
+        custom_heuristic = lambda graph, u, v: heuristic(names[u], names[v])
 
-    path_idx = G.get_shortest_path_astar(
+    # igraph warns when the target can not be reached, the other backends only return no path
+    components = components_for(G, restrictions)
+    if components[source_idx] != components[target_idx]:
+        return float("inf"), []
+
+    epath = G.get_shortest_path_astar(
         source_idx,
         target_idx,
-        heuristics=custom_heuristic, 
-        weights = avoid_passages(G, G.restrictions),
+        heuristics=custom_heuristic,
+        weights=weights_for(G, restrictions, tie_break=True),
+        output="epath",
     )
 
-    if not path_idx:
+    if not epath:
         return float("inf"), []
-    
-
-    # Compute total distance without running Dijkstra again
-    total_distance = sum(
-        float("inf") if edge["passage"] in G.restrictions else edge["weight"]
-        for u, v in zip(path_idx, path_idx[1:])
-        for edge in [G.es[G.get_eid(u, v)]]
-    )
 
-    return total_distance, path_ix_to_name(G, path_idx)
\ No newline at end of file
+    return _epath_to_path(G, source_idx, epath, weights_for(G, restrictions))
@@ -3,10 +3,13 @@ import networkx as nx
 class GraphNx(nx.Graph):
     pass
 
-def bidirectional_dijkstra(G:nx.Graph, source, target, weight="weight"):
+GRAPH_CLASS = GraphNx
+
+# restrictions are applied by the `weight` function (see `Marnet.shortest_path`)
+def bidirectional_dijkstra(G:nx.Graph, source, target, weight="weight", restrictions=None):
     return nx.bidirectional_dijkstra(G, source, target, weight)
 
-def astar_path(G:nx.Graph, source, target, heuristic=None, weight="weight"):
+def astar_path(G:nx.Graph, source, target, heuristic=None, weight="weight", restrictions=None):
     # get path from astar function
     g_path = nx.astar_path(G, source, target, heuristic=heuristic, weight=weight)
     
@@ -1,99 +1,380 @@
-class KDNode:
+"""
+Nearest point index of the (lon, lat) nodes of a network.
+
+Points are indexed as 3D unit vectors: the nearest point by straight line
+distance between unit vectors (the chord) is the nearest by great circle
+distance. Snapping is then right near the poles and across the antimeridian,
+where (179.9, y) is next to (-179.9, y).
+
+The tree is flat: nodes are rows of index arrays over the points sorted so that
+every node covers a contiguous range of them. Leaves hold up to `LEAF_SIZE`
+points. Queries walk the tree with an explicit stack and compare squared
+chords. `query_many` snaps a batch of points with numpy, all the points
+descending the tree together. Of points at the same distance, the first added
+is returned.
+
+Points added after the tree is built (`add_point`) are scanned until there are
+more than `PENDING_SIZE` of them, then the tree is rebuilt on the next query.
+numpy is imported when the first tree is built, not with searoute.
+"""
+from heapq import heappush, heappushpop
+from math import asin, cos, pi, radians, sin
+
+from ..utils import avg_earth_radius_km, conversions
+
+LEAF_SIZE = 12
+PENDING_SIZE = 32
+
+_inf = float('inf')
+
+
+def _unit(point):
+    """3D unit vector of a (lon, lat) point"""
+    lon, lat = radians(point[0]), radians(point[1])
+    return (cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat))
+
+
+def _units(lon_lat):
+    """3D unit vectors (n, 3) of an array (n, 2) of (lon, lat) points"""
+    import numpy as np
+
+    lon, lat = np.radians(lon_lat[:, 0]), np.radians(lon_lat[:, 1])
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=1)
+
+
+def _squared(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+def _to_distance(squared_chord, units):
+    """great circle distance in `units` of a squared chord"""
+    return 2 * asin(min(squared_chord ** 0.5 / 2, 1.0)) * avg_earth_radius_km * conversions[units]
+
+
+def _to_squared_chord(distance, units):
+    """squared chord of a great circle distance in `units`"""
+    angle = distance / (avg_earth_radius_km * conversions[units])
+    return 4.0 if angle >= pi else (2 * sin(angle / 2)) ** 2
+
+
+class _Tree:
     """
-    A KDNode
+    Flat KD-tree over the unit vectors of the first `count` points.
+
+    Attributes
+    ----------
+    perm : int array, the points in tree order ; node `i` covers ``perm[lo[i]:hi[i]]``
+    coords : float64 array (count, 3) of the unit vectors in tree order
+    lo, hi, left, right, axis, split : int / float arrays by node, `left` is -1 for leaves
+    block : int array, the block of each leaf node, -1 for the other nodes
+    blocks, block_perm : float64 array (leaves, LEAF_SIZE, 3) of the unit vectors of each leaf
+        and int array (leaves, LEAF_SIZE) of their point indexes, `count` for padding
     """
-    def __init__(self, point, left=None, right=None):
-        self.point = point
-        self.left = left
-        self.right = right
 
+    def __init__(self, points, count):
+        import numpy as np
 
-class KDTree:
-    """
-    A KDTree
+        coords = _units(np.array([p[:2] for p in points[:count]], dtype=np.float64).reshape(count, 2))
+        perm = np.arange(count)
+        lo, hi, left, right, axis, split = [], [], [], [], [], []
 
+        stack = [(0, count, -1, False)]
+        while stack:
+            start, end, parent, is_right = stack.pop()
+            node = len(lo)
+            if parent >= 0:
+                (right if is_right else left)[parent] = node
+            lo.append(start)
+            hi.append(end)
+            left.append(-1)
+            right.append(-1)
+            axis.append(0)
+            split.append(0.0)
+            if end - start <= LEAF_SIZE:
+                continue
 
-    """
-    def __init__(self, points=None):
-        self.k = 2
-        self.root = None
-        if points:
-            self.root = self._build_tree(points)
+            # split the widest side at the median
+            part = coords[perm[start:end]]
+            ax = int(np.argmax(part.max(axis=0) - part.min(axis=0)))
+            middle = (end - start) // 2
+            order = np.argpartition(part[:, ax], middle)
+            perm[start:end] = perm[start:end][order]
+            axis[node] = ax
+            split[node] = float(coords[perm[start + middle], ax])
+            stack.append((start + middle, end, node, True))
+            stack.append((start, start + middle, node, False))
 
-    def add_point(self, point):
-        if self.root is None:
-            # self.k = len(point)
-            self.root = KDNode(point)
-        else:
-            self._add_point(point, self.root, depth=0)
+        self.count = count
+        self.lo, self.hi = np.array(lo, dtype=np.intp), np.array(hi, dtype=np.intp)
+        self.left, self.right = np.array(left, dtype=np.intp), np.array(right, dtype=np.intp)
+        self.axis, self.split = np.array(axis, dtype=np.intp), np.array(split, dtype=np.float64)
 
-    def _add_point(self, point, node, depth):
-        axis = depth % self.k
+        # leaves as blocks of LEAF_SIZE points, the first added first, padded with points out of the sphere
+        leaves = np.flatnonzero(self.left < 0)
+        leaves = leaves[np.argsort(self.lo[leaves])]
+        sizes = self.hi[leaves] - self.lo[leaves]
+        perm = perm[np.lexsort((perm, np.repeat(np.arange(len(leaves)), sizes)))]
+        slots = self.lo[leaves, None] + np.arange(LEAF_SIZE)
+        slots[slots >= self.hi[leaves, None]] = count
+        self.block = np.full(len(lo), -1, dtype=np.intp)
+        self.block[leaves] = np.arange(len(leaves))
+        self.block_perm = np.append(perm, count)[slots]
+        self.blocks = np.append(coords, [[9.0, 9.0, 9.0]], axis=0)[self.block_perm]
 
-        if point[axis] < node.point[axis]:
-            if node.left is None:
-                node.left = KDNode(point)
-            else:
-                self._add_point(point, node.left, depth + 1)
-        else:
-            if node.right is None:
-                node.right = KDNode(point)
+        self.perm = perm
+        self.coords = coords[perm]
+        # python lists for single queries
+        self._lists = (lo, hi, left, right, axis, split, perm.tolist())
+        self._axes = tuple(self.coords.T.tolist())
+
+    def _leaves(self, p, within):
+        """
+        (start, end) of the leaves that may hold a point closer to `p` (unit vector)
+        than the squared chord `within()`, read again at every node
+        """
+        lo, hi, left, right, axis, split, _ = self._lists
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound > within():
+                continue
+            if left[node] < 0:
+                yield lo[node], hi[node]
+                continue
+
+            diff = p[axis[node]] - split[node]
+            if diff < 0:
+                near, far = left[node], right[node]
             else:
-                self._add_point(point, node.right, depth + 1)
+                near, far = right[node], left[node]
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
 
-    def _build_tree(self, points, depth=0):
-        if not points:
-            return None
+    def nearest(self, p):
+        """(point index, squared chord) of the nearest point to `p` (unit vector)"""
+        lo, hi, left, right, axis, split, perm = self._lists
+        xs, ys, zs = self._axes
+        x, y, z = p
+        best, best_d = -1, _inf
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound > best_d:
+                continue
+            # down to the leaf on the side of `p`, keeping the other sides for later
+            while left[node] >= 0:
+                diff = p[axis[node]] - split[node]
+                if diff < 0:
+                    far, node = right[node], left[node]
+                else:
+                    far, node = left[node], right[node]
+                diff *= diff
+                if diff <= best_d:
+                    stack.append((far, diff if diff > bound else bound))
 
-        axis = depth % self.k
-        sorted_points = sorted(points, key=lambda x: x[axis])
-        median = len(sorted_points) // 2
+            for j in range(lo[node], hi[node]):
+                dx, dy, dz = xs[j] - x, ys[j] - y, zs[j] - z
+                d = dx * dx + dy * dy + dz * dz
+                if d < best_d or (d == best_d and perm[j] < perm[best]):
+                    best, best_d = j, d
+        return perm[best], best_d
 
-        return KDNode(
-            sorted_points[median],
-            self._build_tree(sorted_points[:median], depth + 1),
-            self._build_tree(sorted_points[median + 1:], depth + 1),
-        )
+    def nearest_k(self, p, k):
+        """[(squared chord, point index)] of the `k` nearest points to `p` (unit vector), nearest first"""
+        xs, ys, zs, perm = self._axes + self._lists[-1:]
+        x, y, z = p
+        # max-heap of the k nearest so far
+        heap = []
+        for start, end in self._leaves(p, lambda: -heap[0][0] if len(heap) == k else _inf):
+            for j in range(start, end):
+                item = (-((xs[j] - x) ** 2 + (ys[j] - y) ** 2 + (zs[j] - z) ** 2), -perm[j])
+                if len(heap) < k:
+                    heappush(heap, item)
+                elif item > heap[0]:
+                    heappushpop(heap, item)
+        return sorted((-d, -i) for d, i in heap)
 
-    def _query(self, point, node, depth=0, best=None):
-        if node is None:
-            return best
+    def within(self, p, squared_chord):
+        """[(squared chord, point index)] of the points within `squared_chord` of `p` (unit vector)"""
+        xs, ys, zs, perm = self._axes + self._lists[-1:]
+        x, y, z = p
+        found = []
+        for start, end in self._leaves(p, lambda: squared_chord):
+            for j in range(start, end):
+                d = (xs[j] - x) ** 2 + (ys[j] - y) ** 2 + (zs[j] - z) ** 2
+                if d <= squared_chord:
+                    found.append((d, perm[j]))
+        return found
 
-        current_best = best
-        current_node = node
+    def nearest_many(self, xyz, exclude=None):
+        """
+        point indexes and squared chords of the nearest points to the rows of `xyz` (m, 3) unit vectors,
+        not counting the point `exclude[i]` (point indexes, optional) for the row `i`
+        """
+        import numpy as np
 
-        axis = depth % self.k
-        next_best = None
-        next_branch = None
+        m = len(xyz)
+        queries = np.arange(m)
 
-        if point[axis] < node.point[axis]:
-            next_node = node.left
-            opposite_node = node.right
-        else:
-            next_node = node.right
-            opposite_node = node.left
+        # first bound: the leaf each point falls in
+        node = np.zeros(m, dtype=np.intp)
+        inner = self.left[node] >= 0
+        while inner.any():
+            ix = np.flatnonzero(inner)
+            n = node[ix]
+            go_left = xyz[ix, self.axis[n]] < self.split[n]
+            node[ix] = np.where(go_left, self.left[n], self.right[n])
+            inner[ix] = self.left[node[ix]] >= 0
+        best_d = np.full(m, _inf)
+        best = np.full(m, self.count, dtype=np.intp)
+        self._scan(xyz, queries, node, best, best_d, exclude)
 
-        next_best = self._query(point, next_node, depth + 1, current_best)
+        # then every node that may hold a nearer point, or one as near added before
+        q, node, bound = queries, np.zeros(m, dtype=np.intp), np.zeros(m)
+        while len(q):
+            keep = bound <= best_d[q]
+            q, node, bound = q[keep], node[keep], bound[keep]
+            leaf = self.left[node] < 0
+            self._scan(xyz, q[leaf], node[leaf], best, best_d, exclude)
 
-        if self._distance(point, current_node.point) < self._distance(point, next_best):
-            next_best = current_node.point
+            q, node, bound = q[~leaf], node[~leaf], bound[~leaf]
+            diff = xyz[q, self.axis[node]] - self.split[node]
+            near = np.where(diff < 0, self.left[node], self.right[node])
+            far = np.where(diff < 0, self.right[node], self.left[node])
+            q = np.concatenate([q, q])
+            node = np.concatenate([near, far])
+            bound = np.concatenate([bound, np.maximum(bound, diff * diff)])
+        return best, best_d
 
-        if abs(point[axis] - node.point[axis]) < self._distance(point, next_best):
-            opposite_best = self._query(
-                point, opposite_node, depth + 1, next_best)
-            if self._distance(point, opposite_best) < self._distance(point, next_best):
-                next_best = opposite_best
+    def _scan(self, xyz, q, leaves, best, best_d, exclude=None):
+        """updates `best` (point indexes) and `best_d` of the points `q` with the points of their `leaves`"""
+        import numpy as np
 
-        return next_best
+        if not len(q):
+            return
+        block = self.block[leaves]
+        diff = self.blocks[block]
+        diff -= xyz[q, None, :]
+        d = np.einsum('ijk,ijk->ij', diff, diff)
+        if exclude is not None:
+            d[self.block_perm[block] == exclude[q, None]] = _inf
+        # the first added of the nearest points of each leaf
+        at = d.argmin(axis=1)
+        d = d[np.arange(len(q)), at]
 
-    def query(self, point):
+        before = best_d[q]
+        np.minimum.at(best_d, q, d)
+        # a strictly nearer point resets the best, then the first added of the nearest wins
+        best[q[d < before]] = self.count
+        won = (d == best_d[q]) & (d < _inf)
+        np.minimum.at(best, q[won], self.block_perm[block[won], at[won]])
+
+
+class KDTree:
+    """
+    Great circle nearest point index of (lon, lat) points, see the module notes.
+
+    Parameters
+    ----------
+    points : list of points (lon, lat), default None
+    """
+    def __init__(self, points=None):
+        self.k = 3
+        self._points = list(points) if points else []
+        self._tree = None
+
+    def __len__(self):
+        return len(self._points)
+
+    @property
+    def points(self):
+        """the points of the index, in the order they were added"""
+        return list(self._points)
+
+    def add_point(self, point):
+        self._points.append(point)
+
+    def _current(self):
+        """the tree, rebuilt when too many points were added since it was built"""
+        tree = self._tree
+        if tree is None or len(self._points) - tree.count > PENDING_SIZE:
+            # built aside and swapped at once, concurrent queries see the old or the new tree
+            tree = _Tree(self._points, len(self._points))
+            self._tree = tree
+        return tree
+
+    def _check(self, point):
         if point is None:
             raise Exception('There is no nodes in the Graph')
-        try:
-            best = self.root.point
-        except:
+        if not self._points:
             raise Exception('Ports/Marnet network was not initiated, initiate using searoute.utils.from_nodes_edges_set function')
-        return self._query(point, self.root, 0, best)
 
-    def _distance(self, p1, p2):
-        return sum((x - y) ** 2 for x, y in zip(p1, p2)) ** 0.5
+    def _pending(self, tree, p):
+        """[(squared chord, point index)] to `p` (unit vector) of the points added since `tree` was built"""
+        points = self._points
+        return [(_squared(_unit(points[i]), p), i) for i in range(tree.count, len(points))]
+
+    def query(self, point):
+        """the nearest point to `point` (lon, lat)"""
+        self._check(point)
+        tree = self._current()
+        p = _unit(point)
+        best, best_d = tree.nearest(p) if tree.count else (-1, _inf)
+
+        for d, i in self._pending(tree, p):
+            if d < best_d:
+                best, best_d = i, d
+        return self._points[best]
+
+    def query_k(self, point, k=1, units='km'):
+        """
+        the `k` nearest points to `point` (lon, lat), the nearest first,
+        as a list of (point, great circle distance in `units`)
+        """
+        self._check(point)
+        tree = self._current()
+        p = _unit(point)
+        found = tree.nearest_k(p, k) if tree.count and k > 0 else []
+        found = sorted(found + self._pending(tree, p))[:max(k, 0)]
+        return [(self._points[i], _to_distance(d, units)) for d, i in found]
+
+    def query_radius(self, point, radius, units='km'):
+        """
+        the points within `radius` (great circle distance in `units`) of `point` (lon, lat),
+        the nearest first, as a list of (point, distance)
+        """
+        self._check(point)
+        tree = self._current()
+        p = _unit(point)
+        squared_chord = _to_squared_chord(radius, units)
+        found = tree.within(p, squared_chord) if tree.count else []
+        found += [(d, i) for d, i in self._pending(tree, p) if d <= squared_chord]
+        return [(self._points[i], _to_distance(d, units)) for d, i in sorted(found)]
+
+    def query_many(self, points):
+        """
+        the nearest point to each of `points` (sequence or array (m, 2) of lon, lat),
+        as a list ; vectorized, for snapping many points at once
+        """
+        import numpy as np
+
+        lon_lat = np.asarray(points, dtype=np.float64).reshape(-1, 2) if len(points) else np.zeros((0, 2))
+        if not len(lon_lat):
+            return []
+        self._check(lon_lat)
+        tree = self._current()
+        xyz = _units(lon_lat)
+        if tree.count:
+            best, best_d = tree.nearest_many(xyz)
+        else:
+            best, best_d = np.full(len(xyz), -1), np.full(len(xyz), _inf)
+
+        if len(self._points) > tree.count:
+            pending = _units(np.array([p[:2] for p in self._points[tree.count:]], dtype=np.float64))
+            d = ((xyz[:, None, :] - pending[None, :, :]) ** 2).sum(axis=2)
+            nearest = d.argmin(axis=1)
+            closer = d[np.arange(len(xyz)), nearest] < best_d
+            best = np.where(closer, nearest + tree.count, best)
+
+        points = self._points
+        return [points[i] for i in best.tolist()]
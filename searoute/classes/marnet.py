@@ -1,7 +1,7 @@
 from .passages import Passage
-from ..utils import load_from_geojson, distance, haversine
+from ..utils import load_from_geojson, distance, distance_many, haversine
 from .kdtree import KDTree
-from .core import Graph, bidirectional_dijkstra, astar_path
+from .core import Graph, backend_functions
 
 class Marnet(Graph):
     """Base class for maritime network is an undirected graph. 
@@ -15,12 +15,26 @@ class Marnet(Graph):
     
     """
 
+    # see `Graph.__reduce__`
+    _PICKLED = ('graph', 'restrictions', 'chains')
+
     def __init__(self, *args, **kwds):
         super().__init__(*args, **kwds)
         DEFAULT_CRF = 'EPSG:3857'
         self.graph['crs'] = DEFAULT_CRF  # CRS attribute for the graph
         self.restrictions = [Passage.northwest]
         self.kdtree = KDTree()
+        # contraction hierarchy and landmarks, see `ch` and `landmarks`
+        self._ch = None
+        self._landmarks = None
+        # see `passage_gateways`
+        self._gateways = None
+        # intermediate nodes of the edges of a compacted network, see `compacted`
+        self.chains = None
+        # opt-in, see `enable_route_cache`
+        self.route_cache = None
+        # see `snap_grid`
+        self._snap_grid = None
 
         #_restricted_view = self.query()
 
@@ -33,6 +47,12 @@ class Marnet(Graph):
         #attr['y'] = y
 
         self.kdtree.add_point(node)
+        # a new node may be nearer than the ones of the snap grid, stored in the compiled image or not,
+        # and is not in the contraction hierarchy or the landmark tables
+        self._snap_grid = None
+        self._compiled = None
+        self._ch = None
+        self._landmarks = None
         super().add_node(node, **attr)
 
     def add_edge(self, u, v, **attr):
@@ -40,6 +60,14 @@ class Marnet(Graph):
             raise TypeError(
                 "Nodes must be tuples representing the coordinates.")
 
+        # a contraction hierarchy or landmarks no longer match the graph
+        self._ch = None
+        self._landmarks = None
+        self._gateways = None
+        self._compiled = None
+        if getattr(self, 'route_cache', None) is not None:
+            self.route_cache.clear()
+
         # Create nodes if they don't exist in the graph
         if u not in self:
             self.add_node(u)
@@ -54,9 +82,16 @@ class Marnet(Graph):
     def add_edges_from_list(self, edge_list):
         if not edge_list:
             return
-        
+
+        # weights of the edges without one, computed at once
+        missing = [(u, v) for u, v, args in edge_list if "weight" not in args]
+        weights = iter(distance_many([u for u, _ in missing], [v for _, v in missing]).round(1).tolist()
+                       if missing else ())
+
         for edge in edge_list:
             u,v,args = edge
+            if not "weight" in args:
+                args = dict(args, weight=next(weights))
             self.add_edge(u, v, **args)
 
     def add_nodes_from_list(self, node_list):
@@ -68,6 +103,56 @@ class Marnet(Graph):
             self.add_node(n, **args)
 
 
+    def get_edge_data(self, u, v, default=None):
+        """
+        Attributes of the edge between `u` and `v`, as NetworkX does. On a compacted network,
+        consecutive nodes of a chain (see `expand_path`) give the passage of their chain.
+        """
+        chains = getattr(self, 'chains', None)
+        if chains is not None:
+            data = chains.segment(u, v)
+            if data is not None:
+                return data
+        return super().get_edge_data(u, v, default)
+
+    def compacted(self):
+        """
+        Copy of the network where every chain of nodes with two neighbours (and the same passage)
+        is one edge, which speeds up searches and saves memory (see `searoute.compact`).
+
+        Routes found on it go through fewer nodes, `expand_path` gives back all of them ;
+        `searoute()` and the other routing functions expand the routes they return.
+        Points snap to all the nodes of the network, the intermediate nodes of the chains included,
+        and routes to these nodes go along their chain. Build it once and keep it.
+
+        Examples
+        --------
+        >>> Mc = sr.setup_M().compacted()
+        >>> route = sr.searoute(origin, destination, M=Mc)
+        """
+        from ..compact import compact_graph
+        return compact_graph(self)
+
+    def expand_path(self, path, ends=None):
+        """
+        Path with the intermediate nodes of the chains it goes through (compacted networks),
+        and the indexes `ends` of nodes of `path` moved to the expanded path when given.
+        The path is returned as it is on other networks.
+        """
+        chains = getattr(self, 'chains', None)
+        if chains is None or len(path) < 2:
+            return path if ends is None else (path, ends)
+
+        expanded = [path[0]]
+        position = [0]
+        for u, v in zip(path, path[1:]):
+            chain = (super().get_edge_data(u, v) or {}).get('chain')
+            if chain is not None:
+                expanded.extend(chains.nodes(chain, u))
+            expanded.append(v)
+            position.append(len(expanded) - 1)
+        return expanded if ends is None else (expanded, [position[i] for i in ends])
+
     def subgraph(self, nodes):
 
         subg = super().subgraph(nodes)
@@ -115,11 +200,193 @@ class Marnet(Graph):
         if nodes:
             self.kdtree = KDTree(nodes)
         else:
-            self.kdtree = KDTree(self._node)
+            self.kdtree = KDTree(list(self.nodes()))
+
+    @property
+    def ch(self):
+        """
+        Contraction hierarchy of the network, used by `shortest_path(..., algorithm='ch')`.
+        Read from the compiled image the network was loaded from when it has one
+        (the default Marnet does), otherwise contracted on first use.
+        """
+        if getattr(self, '_ch', None) is None:
+            from .ch import ContractionHierarchy, contract_graph
+
+            cg = getattr(self, '_compiled', None)
+            ch = ContractionHierarchy.from_compiled(cg) if cg is not None else None
+            self._ch = ch if ch is not None else contract_graph(self)
+        return self._ch
+
+    @property
+    def landmarks(self):
+        """
+        Landmark distance tables of the network, used by `shortest_path(..., algorithm='alt')`.
+        Read from the compiled image the network was loaded from when it has them
+        (the default Marnet does), otherwise built on first use for the unrestricted
+        network and the current restrictions.
+        """
+        if getattr(self, '_landmarks', None) is None:
+            from .alt import Landmarks, landmarks_graph
+
+            cg = getattr(self, '_compiled', None)
+            landmarks = Landmarks.from_compiled(cg) if cg is not None else None
+            self._landmarks = landmarks if landmarks is not None else landmarks_graph(
+                self, restriction_sets=([], list(self.restrictions or [])))
+        return self._landmarks
+
+    @property
+    def snap_grid(self):
+        """
+        Snapping grid of the network (`searoute.classes.snapgrid.SnapGrid`), None unless it is enabled
+        (`enable_snap_grid`) or stored in the compiled image the network was loaded from
+        """
+        if getattr(self, '_snap_grid', None) is None:
+            cg = getattr(self, '_compiled', None)
+            if cg is not None and 'snap' in cg.header:
+                from .snapgrid import SnapGrid
+
+                self._snap_grid = SnapGrid.from_compiled(cg)
+        return self._snap_grid
+
+    def enable_snap_grid(self, bounds, cell=0.05, P=None):
+        """
+        Snaps the points of a bounded domain with a precomputed grid of the nearest node of
+        every cell (the KD-tree for the cells near two nodes), see `searoute.classes.snapgrid`.
+
+        Parameters
+        ----------
+        bounds : (west, south, east, north) of the domain in degrees
+        cell : float, default 0.05 ; the side of the cells in degrees
+        P : a Ports network, default None ; the grid keeps the nearest terminal port of every cell too
+            and `P` uses it (`Ports.snap_grid`)
+
+        Returns
+        -------
+        the `SnapGrid` ; `grid.to_compiled(compiled_image(M))` and `write_compiled` store it with the
+        compiled image, memory-mapped when read back
+        """
+        from .snapgrid import snap_grid_graph
+
+        self._snap_grid = snap_grid_graph(self, bounds, cell, P)
+        if P is not None:
+            P.snap_grid = self._snap_grid
+        return self._snap_grid
+
+    def snap(self, point):
+        """the node `point` (lon, lat) snaps to, from the snap grid when the network has one"""
+        grid = self.snap_grid
+        if grid is not None:
+            node = grid.node(point)
+            if node is not None:
+                return node
+        return self.kdtree.query(point)
+
+    def snap_many(self, points):
+        """the nodes `points` (sequence of lon, lat) snap to, as a list, see `snap`"""
+        grid = self.snap_grid
+        if grid is None or not len(points):
+            return self.kdtree.query_many(points)
+
+        found = grid.node_indexes(points).tolist()
+        missing = [i for i, ix in enumerate(found) if ix < 0]
+        snapped = self.kdtree.query_many([points[i] for i in missing]) if missing else []
+        names = grid.names
+        nodes = [names[ix] if ix >= 0 else None for ix in found]
+        for i, node in zip(missing, snapped):
+            nodes[i] = node
+        return nodes
+
+    @property
+    def passage_gateways(self):
+        """
+        {passage: (u, v)} gateway edge of every passage of the network, the edge crossed by
+        routes through the passage (`via_shortest_path`), found once from the compiled arrays
+        """
+        if getattr(self, '_gateways', None) is None and getattr(self, 'chains', None) is not None:
+            # the gateways of the network before compaction, edges of its chains included
+            from ..compact import chain_gateways
+            self._gateways = chain_gateways(self)
+        elif getattr(self, '_gateways', None) is None:
+            from ..compiled import compiled_image
+            from ..via import passage_gateways
+
+            cg = compiled_image(self)
+            names = cg.node_names()
+            self._gateways = {p: (names[u], names[v]) for p, (u, v) in passage_gateways(cg).items()}
+        return self._gateways
+
+    def via_shortest_path(self, origin, destination, waypoints, restrictions=None):
+        """
+        Shortest route from the origin to the destination through `waypoints` in order.
+
+        Parameters
+        ----------
+        origin, destination : locations, snapped to the closest nodes as `shortest_path` does
+        waypoints : list of locations or passage names (see `passage_gateways`) ; passages are crossed
+            in the direction giving the shortest route, and are not restricted even when in `restrictions`
+        restrictions : list of passages to avoid, default None which means `self.restrictions`
+
+        Returns
+        -------
+        length, path, ends : length and path as `shortest_path` returns them, and the index in `path` of the
+            end of the leg to every waypoint and to the destination ((inf, [], []) when a leg has no route)
+        """
+        from ..compiled import compiled_image
+        from ..via import via_path
+
+        if restrictions is None:
+            restrictions = self.restrictions
+        gateways = self.passage_gateways
+        via = {stop for stop in waypoints if isinstance(stop, str)}
+        for passage in via:
+            if passage not in gateways:
+                raise ValueError(f"Unknown passage '{passage}', use one of {sorted(gateways)}")
+        restrictions = [p for p in restrictions or () if p not in via]
+
+        stops = [stop if isinstance(stop, str) else self.snap(stop) for stop in [origin] + list(waypoints) + [destination]]
+        cg = compiled_image(self)
+        # the chains of a compacted network are cut at the nodes the route goes through
+        cut = [node for stop in stops for node in (gateways[stop] if isinstance(stop, str) else [stop])
+               if self._intermediate(node)]
+        if cut:
+            from ..compact import split_chains
+            cg = split_chains(self, cg, cut)
+        names = cg.node_names()
+        name_to_idx = cg.node_index()
+
+        stops = [tuple(name_to_idx[node] for node in gateways[stop]) if isinstance(stop, str) else name_to_idx[stop]
+                 for stop in stops]
+        length, path, ends = via_path(cg, stops, restrictions)
+        path = [names[ix] for ix in path]
+        if cut:
+            from ..compact import fill_chains
+            path, ends = fill_chains(self, path, ends)
+        return length, path, ends
+
+    def enable_route_cache(self, maxsize=10000, max_bytes=None):
+        """
+        Keeps the routes found by `shortest_path` in a bounded LRU cache, keyed by the
+        nodes the origin and destination snap to, the restrictions and the algorithm.
+
+        Parameters
+        ----------
+        maxsize : int, default 10000 ; maximum number of routes kept, None for no limit
+        max_bytes : int, default None ; maximum approximate memory of the routes kept, None for no limit
+
+        Returns
+        -------
+        the `RouteCache`, `route_cache.cache_info()` gives hits and misses
+        """
+        from .route_cache import RouteCache
+
+        self.route_cache = RouteCache(maxsize, max_bytes)
+        return self.route_cache
+
+    def disable_route_cache(self):
+        self.route_cache = None
 
     # Get the shortest route by distance
-    def __make_weight_fn(self):
-        restrictions = self.restrictions  # local ref, faster lookup
+    def __make_weight_fn(self, restrictions):
         inf = float('inf')
 
         def weight_fn(u, v, data):
@@ -129,7 +396,7 @@ class Marnet(Graph):
         return weight_fn
     
     
-    def shortest_path(self, origin, destination, algorithm:str = 'dijkstra'):
+    def shortest_path(self, origin, destination, algorithm:str = 'dijkstra', restrictions=None):
         """
         Shortest Path between the origin and the destination.
         Dijkstra algorithm is used to perform the calculation.
@@ -140,33 +407,112 @@ class Marnet(Graph):
             if origin is not a known node, a closed node search will be performed
         destination : destination location in the graph or not
             if destination is not a known node, a closed node search will be performed
+        algorithm : str one of `dijkstra` (default), `astar`, `alt` (A* with landmarks, see `landmarks`)
+            or `ch` (contraction hierarchy, see `ch`)
+        restrictions : list of passages to avoid for this call, default None which means `self.restrictions` ;
+            passing them per call (instead of setting `restrictions`) is safe when the network is shared between threads
 
         Returns
         -------
         length, path : number and list
         length is the distance from source to target. path is a list of nodes on a path from source to target building the shortest path.
         Note: length is in the unit when Marnet weight was registered (`km`)
+        Routes are reused from `route_cache` when it is enabled, see `enable_route_cache`.
         
         """
-        origin_node = self.kdtree.query(origin)
-        destination_node = self.kdtree.query(destination)
-        
-        weight = self.__make_weight_fn()
+        origin_node = self.snap(origin)
+        destination_node = self.snap(destination)
+        return self.node_shortest_path(origin_node, destination_node, algorithm, restrictions)
+
+    def node_shortest_path(self, origin_node, destination_node, algorithm:str = 'dijkstra', restrictions=None):
+        """
+        Shortest Path between two nodes of the network (already snapped), see `shortest_path`.
+        """
+        if restrictions is None:
+            restrictions = self.restrictions
+
+        cache = getattr(self, 'route_cache', None)
+        if cache is None:
+            return self._shortest_path(origin_node, destination_node, algorithm, restrictions)
+
+        cached = cache.get(origin_node, destination_node, restrictions, algorithm)
+        if cached is not None:
+            return cached
+        length, path = self._shortest_path(origin_node, destination_node, algorithm, restrictions)
+        cache.put(origin_node, destination_node, restrictions, algorithm, length, path)
+        return length, path
+
+    def k_shortest_paths(self, origin, destination, k=3, diversity=0.5, restrictions=None, max_stretch=2.0):
+        """
+        Up to `k` diverse routes between the origin and the destination, the shortest first
+        (plateau method on the compiled arrays of the network, see `searoute.alternatives`).
+
+        Parameters
+        ----------
+        origin, destination : locations, snapped to the closest nodes as `shortest_path` does
+        k : int, maximum number of routes
+        diversity : float between 0 and 1, default 0.5 ; minimum share of the length of a route
+            that is not shared with any shorter route returned
+        restrictions : list of passages to avoid, default None which means `self.restrictions`
+        max_stretch : float, default 2.0 ; routes longer than `max_stretch` times the shortest one are ignored
+
+        Returns
+        -------
+        list of (length, path) as `shortest_path` returns them, empty when there is no route
+        """
+        from ..compiled import compiled_image
+        from ..alternatives import alternative_paths
+
+        if restrictions is None:
+            restrictions = self.restrictions
+        origin_node, destination_node = self.snap(origin), self.snap(destination)
+        if self._intermediate(origin_node, destination_node):
+            from ..compact import chain_alternative_paths
+            return chain_alternative_paths(self, origin_node, destination_node, k, diversity, max_stretch,
+                                           restrictions)
+
+        cg = compiled_image(self)
+        names = cg.node_names()
+        name_to_idx = cg.node_index()
+        routes = alternative_paths(cg, name_to_idx[origin_node], name_to_idx[destination_node],
+                                   k, diversity, max_stretch, restrictions)
+        return [(length, [names[ix] for ix in path]) for length, path in routes]
+
+    def _intermediate(self, *nodes):
+        """whether one of `nodes` is an intermediate node of a chain (compacted networks)"""
+        chains = getattr(self, 'chains', None)
+        return chains is not None and any(chains.locate(node) is not None for node in nodes)
+
+    def _shortest_path(self, origin_node, destination_node, algorithm, restrictions):
+        if self._intermediate(origin_node, destination_node):
+            # searched from the ends of their chains on the compiled arrays, whatever the algorithm
+            from ..compact import chain_shortest_path
+            return chain_shortest_path(self, origin_node, destination_node, restrictions)
+
+        weight = self.__make_weight_fn(restrictions)
+        backend = backend_functions(self)
     
         # dijkstra option 
         if algorithm == "dijkstra" or algorithm is None:
-            return bidirectional_dijkstra(
-                self, origin_node, destination_node, weight)
+            return backend["bidirectional_dijkstra"](
+                self, origin_node, destination_node, weight, restrictions=restrictions)
         elif algorithm == "astar":
             # a*
             
             #g_path = astar_path(self, origin_node, destination_node, heuristic=distance, weight=weight)
             #total_ln = sum(weight(u, v, self[u][v]) for u, v in zip(g_path[:-1], g_path[1:]))
             #return total_ln, g_path
-            return astar_path(self, origin_node, destination_node, heuristic=distance, weight=weight)
+            return backend["astar_path"](self, origin_node, destination_node, heuristic=distance, weight=weight,
+                                         restrictions=restrictions)
+        elif algorithm == "alt":
+            heuristic = self.landmarks.heuristic(destination_node, restrictions)
+            return backend["astar_path"](self, origin_node, destination_node, heuristic=heuristic, weight=weight,
+                                         restrictions=restrictions)
+        elif algorithm == "ch":
+            return self.ch.shortest_path(origin_node, destination_node, restrictions)
         
         else:
-            raise Exception("Algorithm not supported, please use dijkstra (default) or astar")
+            raise Exception("Algorithm not supported, please use dijkstra (default), astar, alt or ch")
     
     
 
@@ -2,10 +2,38 @@ from .core import Graph
 
 from ..utils import load_from_geojson
 from .kdtree import KDTree
-from . import area_feature
-from geojson import FeatureCollection
+from collections import OrderedDict
 from itertools import product
 
+# nearest port indexes kept by filter of `Ports.query`
+FILTER_CACHE_SIZE = 64
+
+
+class _PortIndex:
+    """
+    Inverted indexes of the port attributes, the port nodes by terminal flag (`t`),
+    by country (the first two letters of `port`) and by `to_cty`, in the order they were added,
+    and the first (node, attributes) of every UN/LOCODE (`port`)
+    """
+
+    def __init__(self, nodes=()):
+        self.nodes = []
+        self.by_terminal = {}
+        self.by_cty = {}
+        self.by_to_cty = {}
+        self.by_locode = {}
+        for node, data in nodes:
+            self.add(node, data)
+
+    def add(self, node, data):
+        self.nodes.append(node)
+        self.by_terminal.setdefault(data.get('t'), []).append(node)
+        self.by_cty.setdefault((data.get('port') or '')[:2], set()).add(node)
+        for cty in data.get('to_cty') or []:
+            self.by_to_cty.setdefault(cty, set()).add(node)
+        if data.get('port'):
+            self.by_locode.setdefault(data['port'], (node, data))
+
 
 class Ports(Graph):
     """
@@ -25,6 +53,25 @@ class Ports(Graph):
         DEFAULT_CRF = 'EPSG:3857'
         self.graph['crs'] = DEFAULT_CRF  # CRS attribute for the graph
         self.kdtree = KDTree()
+        # nearest terminal port of the cells of a domain, see `Marnet.enable_snap_grid`
+        self.snap_grid = None
+        # see `query`, built on first use
+        self._port_index = None
+        self._filter_trees = OrderedDict()
+
+    @property
+    def kdtree(self):
+        # built on first use, see `update_kdtree`
+        if self._kdtree is None:
+            points = self._kdtree_points
+            self._kdtree = KDTree(list(points) if points is not None else list(self.nodes()))
+            self._kdtree_points = None
+        return self._kdtree
+
+    @kdtree.setter
+    def kdtree(self, tree):
+        self._kdtree = tree
+        self._kdtree_points = None
 
     def add_node(self, node, **attr):
         if not isinstance(node, tuple):
@@ -37,7 +84,17 @@ class Ports(Graph):
             raise TypeError(
                 "Node port requires to have both port name (name), and country (cty) in properties to be correctly mapped")
 
-        self.kdtree.add_point(node)
+        if self._kdtree is not None:
+            self._kdtree.add_point(node)
+        elif self._kdtree_points is not None:
+            self._kdtree_points.append(node)
+        self.snap_grid = None
+        if self._port_index is not None:
+            if node in self:
+                self._port_index = None
+            else:
+                self._port_index.add(node, attr)
+        self._filter_trees.clear()
         super().add_node(node, **attr)
 
 
@@ -76,55 +133,94 @@ class Ports(Graph):
         if not terminals and not cty and not to_cty:
             return self
 
-        def cty_filter(data, cty):
-            if not cty:
-                return True
-            else:
-                return data.get('port')[:2] == cty
-            
-        def cty_to_filter(data, to_cty):
-            if not to_cty:
-                return True
-            else:
-                return to_cty in (data.get('to_cty') or [])
+        tree = self._filter_tree(terminals, cty, to_cty, strict)
+        subg = self.subgraph(tree.points)
+        subg.kdtree = tree
+        return subg
 
-        terminal_filter = True if terminals else None
+    @property
+    def port_index(self):
+        """inverted indexes of the port attributes used by `query` and `by_locode`, kept up to date by `add_node`"""
+        if self._port_index is None:
+            self.update_port_index()
+        return self._port_index
 
-        if strict:
-            strict_filter = [n for n, data in self.nodes(data=True) 
-             if data.get('t') == terminal_filter and cty_filter(data, cty) and cty_to_filter(data, to_cty)]
-            
-            if len(strict_filter)<1:
-                raise KeyError(f'There is no ports for your query terminals:{terminals}, from country:{cty}, to country:{to_cty}, strict:{strict}')
-            
-            return self.subgraph(strict_filter)
+    def update_port_index(self):
+        """(re)builds the indexes of the port attributes from the nodes, see `port_index`"""
+        self._port_index = _PortIndex(self.nodes(data=True))
+        self._filter_trees.clear()
+        return self._port_index
 
-        # add filter terminals
-        filtered_nodes = [(n, data) for n, data in self.nodes(data=True) if data.get('t') == terminal_filter]
-        filtered_nodes_prev = []
+    def by_locode(self, locode):
+        """
+        The port of a UN/LOCODE
 
-        if len(filtered_nodes)>0:
-            # add filter "from county"
-            filtered_nodes_prev = filtered_nodes
-            filtered_nodes = [(n, data) for n, data in filtered_nodes_prev if cty_filter(data, cty)]
-        else:
-            filtered_nodes = filtered_nodes_prev
+        Parameters
+        ----------
+        locode : str
+            the port code (`port` attribute), e.g. 'FRMRS'
 
-        if len(filtered_nodes)>0:
-            # add filter "to county"
-            filtered_nodes_prev = filtered_nodes
-            filtered_nodes = [(n, data) for n, data in filtered_nodes_prev if cty_to_filter(data, to_cty)]
-        else:
-            filtered_nodes = filtered_nodes_prev
+        Returns
+        -------
+        (node, props) of the first port added with this code, the node as (lon, lat),
+        or None if there is no such port
+        """
+        return self.port_index.by_locode.get(locode)
+
+    def _filter(self, terminals, cty, to_cty, strict):
+        """the port nodes of `query`, in the order they were added"""
+        index = self.port_index
+        nodes = index.by_terminal.get(True if terminals else None, [])
+
+        def in_cty(nodes):
+            in_cty = index.by_cty.get(cty, ())
+            return [n for n in nodes if n in in_cty] if cty else nodes
+
+        def to(nodes):
+            to = index.by_to_cty.get(to_cty, ())
+            return [n for n in nodes if n in to] if to_cty else nodes
+
+        if strict:
+            nodes = to(in_cty(nodes))
+            if len(nodes)<1:
+                raise KeyError(f'There is no ports for your query terminals:{terminals}, from country:{cty}, to country:{to_cty}, strict:{strict}')
+            return nodes
+
+        # filters are dropped from the last one when nothing is left
+        if nodes:
+            nodes_cty = in_cty(nodes)
+            nodes = to(nodes_cty) if nodes_cty else nodes
 
         # finally select all if not found any yet..
-        if len(filtered_nodes)==0:
-            filtered_nodes = self.nodes(data=True)
-            
-        if len(filtered_nodes)>0:
-            return self.subgraph([n for n,_ in filtered_nodes])
-        else:
+        if not nodes:
+            nodes = index.nodes
+        if not nodes:
             raise KeyError(f'There is no ports for your query terminals:{terminals}, from country:{cty}, to country:{to_cty}, strict:{strict}')
+        return nodes
+
+    def _filter_tree(self, terminals, cty, to_cty, strict):
+        """
+        nearest port index (`KDTree`) of the ports of `query`, kept for the `FILTER_CACHE_SIZE`
+        filters used last ; no lock, the operations of the `OrderedDict` are atomic
+        """
+        key = (bool(terminals), cty or None, to_cty or None, bool(strict))
+        cache = self._filter_trees
+        tree = cache.get(key)
+        if tree is not None:
+            try:
+                cache.move_to_end(key)
+            except KeyError:
+                pass
+            return tree
+
+        tree = KDTree(self._filter(*key))
+        cache[key] = tree
+        while len(cache) > FILTER_CACHE_SIZE:
+            try:
+                cache.popitem(last=False)
+            except KeyError:
+                break
+        return tree
 
        
 
@@ -132,7 +228,9 @@ class Ports(Graph):
         return True if edge_data.get('t', 0) == 1 else False
 
     def load_geojson(self, path):
-        return load_from_geojson(self, path)
+        load_from_geojson(self, path)
+        self.update_port_index()
+        return self
 
     @staticmethod
     def from_geojson(path):
@@ -156,12 +254,27 @@ class Ports(Graph):
             self.add_node(n, **args)
 
     def update_kdtree(self, nodes = None):
-        if nodes:
-            self.kdtree = KDTree(nodes)
-        else:
-            self.kdtree = KDTree(self._node)
+        # the tree is built lazily on first access of `kdtree`
+        self._kdtree = None
+        self._kdtree_points = list(nodes) if nodes else None
+        # the nodes were set at once, see `from_nodes_edges_set`
+        self.update_port_index()
 
     
+    def closest_port(self, point, terminals: bool = True, cty: str = None, to_cty: str = None, strict = False):
+        """
+        The port nearest to `point` (lon, lat) among the ports of `query(terminals, cty, to_cty, strict)`,
+        from the snap grid for terminal ports when `P.snap_grid` has them
+        """
+        grid = getattr(self, 'snap_grid', None)
+        if grid is not None and terminals and not cty and not to_cty:
+            port = grid.port(point)
+            if port is not None:
+                return port
+        if not terminals and not cty and not to_cty:
+            return self.kdtree.query(point)
+        return self._filter_tree(terminals, cty, to_cty, strict).query(point)
+
     def get_selected_port_matrix(self, origin, destination, port_params = {}):
         
         
@@ -205,8 +318,8 @@ class Ports(Graph):
 
         if len(pref_ports_from)==0:
             # set origin as closest port
-            closestPortOrigin = self.query(
-                terminals=only_terminals, cty=country_pol, to_cty=to_cty, strict=country_restricted_strict).kdtree.query(origin)
+            closestPortOrigin = self.closest_port(
+                origin, terminals=only_terminals, cty=country_pol, to_cty=to_cty, strict=country_restricted_strict)
             if closestPortOrigin:
                 port_origin = self.nodes[closestPortOrigin].copy()
                 if country_restricted_key in port_origin:
@@ -222,8 +335,7 @@ class Ports(Graph):
                     c.pop(country_restricted_key)
 
         if len(pref_ports_to)==0:
-            closestPortDest = self.query(
-                terminals=only_terminals, cty=country_pod).kdtree.query(destination)
+            closestPortDest = self.closest_port(destination, terminals=only_terminals, cty=country_pod)
             if closestPortDest:
                 port_dest = self.nodes[closestPortDest].copy()
                 if country_restricted_key in port_dest:
@@ -234,7 +346,7 @@ class Ports(Graph):
         return list(product(pref_ports_from, pref_ports_to))
 
 
-    def get_preferred_ports(self, x, y, ft:FeatureCollection, top = None, include_area_name = False, strict_area = True):
+    def get_preferred_ports(self, x, y, ft:'FeatureCollection', top = None, include_area_name = False, strict_area = True):
         """
         Retrieves the preferred ports based on the given (x, y) location.
 
@@ -247,6 +359,8 @@ class Ports(Graph):
         Returns:
         - A sorted list of preferred ports, normalized by their share value.
         """
+        from . import area_feature
+
         preferred_ports = []
 
         # Find the smallest area feature containing (x, y)
@@ -293,12 +407,9 @@ class Ports(Graph):
         def _update_props(port_id, props):
             # update props
             if props is None or props == {}:
-                try:
-                    res = [y for x,y in self.nodes(data=True) if y['port']==port_id]
-                    if len(res)>0:
-                        return res[0] # first values
-                except:
-                    pass
+                found = self.by_locode(port_id)
+                if found is not None:
+                    return found[1] # first values
             return props 
 
         if include_area_name:
@@ -0,0 +1,90 @@
+from collections import namedtuple, OrderedDict
+import sys
+import threading
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize', 'nbytes', 'max_bytes'])
+
+# approximate size of an entry besides its path: key tuple, frozenset, OrderedDict slot
+_ENTRY_OVERHEAD = 400
+
+
+class RouteCache:
+    """
+    Bounded LRU cache of the routes found by `Marnet.shortest_path`, see `Marnet.enable_route_cache`.
+
+    Entries are keyed by (origin node, destination node, restrictions, algorithm), the
+    network being undirected a route A -> B is also returned (reversed) for B -> A.
+
+    Parameters
+    ----------
+    maxsize : int, default 10000 ; maximum number of routes kept, None for no limit
+    max_bytes : int, default None ; maximum approximate memory of the routes kept, None for no limit
+    """
+
+    def __init__(self, maxsize=10000, max_bytes=None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        # the network, and its cache, may be shared between threads
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(origin, destination, restrictions, algorithm):
+        """canonical key (the smallest node first) and whether the route is stored reversed"""
+        restrictions = frozenset(restrictions or ())
+        algorithm = algorithm or 'dijkstra'
+        if destination < origin:
+            return (destination, origin, restrictions, algorithm), True
+        return (origin, destination, restrictions, algorithm), False
+
+    def get(self, origin, destination, restrictions, algorithm):
+        """(length, path) of a cached route or None, the path is a new list"""
+        key, reverse = self._key(origin, destination, restrictions, algorithm)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        length, path, _ = entry
+        if path is None:
+            return length, None
+        return length, list(reversed(path)) if reverse else list(path)
+
+    def put(self, origin, destination, restrictions, algorithm, length, path):
+        key, reverse = self._key(origin, destination, restrictions, algorithm)
+        if path is not None:
+            path = tuple(reversed(path)) if reverse else tuple(path)
+        size = _ENTRY_OVERHEAD + sys.getsizeof(path)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[2]
+            self._entries[key] = (length, path, size)
+            self.nbytes += size
+
+            while self._entries and (
+                    (self.maxsize is not None and len(self._entries) > self.maxsize)
+                    or (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def clear(self):
+        """drops every route, `Marnet.add_edge` does it, call it after changing edge attributes in place"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def cache_info(self):
+        """hits, misses, maxsize, currsize, nbytes and max_bytes, as `functools.lru_cache`"""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries), self.nbytes, self.max_bytes)
@@ -0,0 +1,240 @@
+"""
+Precomputed snapping grid of a Marnet over a bounded domain.
+
+The domain is cut in cells of `cell` degrees. A cell keeps the node that is the
+nearest to every point of the cell, so snapping a point in it is an array
+lookup. A cell is resolved when its nearest node `a` is nearer to the center
+than the second nearest node by more than twice the distance from the center
+to the corners of the cell (`r`): for every point `p` of the cell,
+``d(p, a) <= d(c, a) + r < d(c, b) - r <= d(p, b)``. Other cells, near the
+bisectors between nodes, keep -1 and their points are snapped with the KD-tree,
+so the grid gives the same nodes as `KDTree.query`.
+
+The grid may also keep the nearest terminal port of every cell, the port
+`Ports.query(terminals=True)` would give, resolved the same way.
+
+It is stored next to the graph in its compiled image (``snap/*`` arrays, see
+`searoute.compiled`) and memory-mapped with it:
+
+- ``snap/nodes`` : int32 (rows, cols) node index of every cell, -1 when not resolved
+- ``snap/ports`` : int32 (rows, cols) terminal port of every cell in ``snap/port_coords``, -1 when not resolved
+- ``snap/port_coords`` : float64 (k, 2) the terminal ports (lon, lat)
+
+with the bounds and the cell size in the ``snap`` entry of the header.
+"""
+from math import floor
+
+import numpy as np
+
+from .kdtree import _Tree, _units
+
+
+SNAP_PREFIX = 'snap/'
+
+DEFAULT_CELL = 0.05
+# side in cells of the largest blocks resolved at once when building a grid, a power of 2
+_BLOCK = 32
+# blocks searched at once
+_CHUNK = 10000
+
+
+class SnapGrid:
+    """
+    Snapping grid of a Marnet, see `build_snap_grid`.
+
+    Parameters
+    ----------
+    bounds : (west, south, east, north) of the domain in degrees
+    cell : float, the side of the cells in degrees
+    nodes : numpy.ndarray (rows, cols) of node indexes, -1 where the cell is not resolved
+    names : list of node ids in node index order, (lon, lat) tuples
+    ports : numpy.ndarray (rows, cols) of indexes in `port_names`, -1 where the cell is not resolved, optional
+    port_names : list of the terminal ports (lon, lat), optional
+    """
+
+    def __init__(self, bounds, cell, nodes, names, ports=None, port_names=None):
+        self.bounds = tuple(float(b) for b in bounds)
+        self.cell = float(cell)
+        self.nodes = nodes
+        self.names = names
+        self.ports = ports
+        self.port_names = port_names
+        self.shape = nodes.shape
+
+    @classmethod
+    def from_compiled(cls, cg, names=None):
+        """
+        Returns the grid stored in a `CompiledGraph`, or None if it has none
+        """
+        snap = cg.header.get('snap')
+        if snap is None:
+            return None
+        ports = cg[SNAP_PREFIX + 'ports'] if snap.get('ports') else None
+        port_names = [tuple(p) for p in cg[SNAP_PREFIX + 'port_coords'].tolist()] if ports is not None else None
+        return cls(snap['bounds'], snap['cell'], cg[SNAP_PREFIX + 'nodes'],
+                   names if names is not None else cg.node_names(), ports, port_names)
+
+    def to_compiled(self, cg):
+        """stores the grid in a `CompiledGraph` (arrays and header)"""
+        cg.arrays[SNAP_PREFIX + 'nodes'] = np.asarray(self.nodes, dtype=np.int32)
+        if self.ports is not None:
+            cg.arrays[SNAP_PREFIX + 'ports'] = np.asarray(self.ports, dtype=np.int32)
+            cg.arrays[SNAP_PREFIX + 'port_coords'] = np.array(self.port_names, dtype=np.float64).reshape(-1, 2)
+        cg.header['snap'] = {'bounds': list(self.bounds), 'cell': self.cell, 'ports': self.ports is not None}
+        return cg
+
+    @property
+    def resolved(self):
+        """share of the cells resolved by the grid"""
+        return float((np.asarray(self.nodes) >= 0).mean()) if self.nodes.size else 0.0
+
+    def _cell(self, point):
+        """(row, col) of the cell of `point` (lon, lat), None outside the domain"""
+        west, south, _, _ = self.bounds
+        row, col = floor((point[1] - south) / self.cell), floor((point[0] - west) / self.cell)
+        rows, cols = self.shape
+        if 0 <= row < rows and 0 <= col < cols:
+            return row, col
+        return None
+
+    def _cells(self, lon_lat):
+        """rows, cols and whether they are in the domain of an array (m, 2) of points"""
+        west, south, _, _ = self.bounds
+        rows, cols = self.shape
+        row = np.floor((lon_lat[:, 1] - south) / self.cell)
+        col = np.floor((lon_lat[:, 0] - west) / self.cell)
+        inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+        return np.where(inside, row, 0).astype(np.intp), np.where(inside, col, 0).astype(np.intp), inside
+
+    def node(self, point):
+        """the node `point` (lon, lat) snaps to, None outside the domain or when the cell is not resolved"""
+        cell = self._cell(point)
+        if cell is None:
+            return None
+        ix = int(self.nodes[cell])
+        return self.names[ix] if ix >= 0 else None
+
+    def node_indexes(self, points):
+        """node indexes the rows of `points` (array (m, 2) of lon, lat) snap to, -1 where the grid can not tell"""
+        lon_lat = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        row, col, inside = self._cells(lon_lat)
+        return np.where(inside, self.nodes[row, col], -1)
+
+    def port(self, point):
+        """the terminal port nearest to `point` (lon, lat), None outside the domain or when the cell is not resolved"""
+        if self.ports is None:
+            return None
+        cell = self._cell(point)
+        if cell is None:
+            return None
+        ix = int(self.ports[cell])
+        return self.port_names[ix] if ix >= 0 else None
+
+
+def _exact(tree, west, south, cell, row0, col0, size):
+    """
+    nearest point index to the blocks of `size` x `size` cells starting at the cells (row0, col0),
+    -1 for the blocks where it is not the nearest to every point of the block
+    """
+    lon0, lat0 = west + col0 * cell, south + row0 * cell
+    side = size * cell
+    center = _units(np.stack([lon0 + side / 2, lat0 + side / 2], axis=1))
+    first, first_d = tree.nearest_many(center)
+    if tree.count > 1:
+        _, second_d = tree.nearest_many(center, exclude=first)
+    else:
+        second_d = np.full(len(row0), np.inf)
+
+    # chord from the center to the farthest corner of the block
+    radius = np.zeros(len(row0))
+    for dx in (0, side):
+        for dy in (0, side):
+            corner = _units(np.stack([lon0 + dx, lat0 + dy], axis=1))
+            radius = np.maximum(radius, np.sqrt(((corner - center) ** 2).sum(axis=1)))
+    radius = radius * (1 + 1e-9) + 1e-12
+
+    return np.where(np.sqrt(first_d) + 2 * radius < np.sqrt(second_d), first, -1)
+
+
+def _resolve(points, bounds, cell, shape):
+    """
+    nearest point index of every cell, -1 where it is not the nearest to every point of the cell ;
+    blocks of `_BLOCK` x `_BLOCK` cells are resolved at once, and split in four while they are not
+    """
+    rows, cols = shape
+    west, south, _, _ = bounds
+    resolved = np.full(shape, -1, dtype=np.int32)
+    if not len(points):
+        return resolved
+    tree = _Tree(points, len(points))
+
+    size = _BLOCK
+    row0, col0 = (a.ravel() for a in np.meshgrid(np.arange(0, rows, size), np.arange(0, cols, size), indexing='ij'))
+    while len(row0):
+        found = np.concatenate([_exact(tree, west, south, cell, row0[k:k + _CHUNK], col0[k:k + _CHUNK], size)
+                                for k in range(0, len(row0), _CHUNK)])
+        for r, c, ix in zip(row0[found >= 0].tolist(), col0[found >= 0].tolist(), found[found >= 0].tolist()):
+            resolved[r:r + size, c:c + size] = ix
+        if size == 1:
+            break
+
+        # the others are split in four
+        size //= 2
+        row0, col0 = row0[found < 0], col0[found < 0]
+        row0 = np.concatenate([row0, row0, row0 + size, row0 + size])
+        col0 = np.concatenate([col0, col0 + size, col0, col0 + size])
+        inside = (row0 < rows) & (col0 < cols)
+        row0, col0 = row0[inside], col0[inside]
+    return resolved
+
+
+def build_snap_grid(names, bounds, cell=DEFAULT_CELL, ports=None):
+    """
+    Resolves the cells of a snapping grid.
+
+    Parameters
+    ----------
+    names : list of the nodes (lon, lat) in node index order
+    bounds : (west, south, east, north) of the domain in degrees
+    cell : float, default 0.05 ; the side of the cells in degrees
+    ports : list of the terminal ports (lon, lat), default None for no port grid
+
+    Returns
+    -------
+    SnapGrid
+    """
+    west, south, east, north = bounds
+    if not (-180 <= west < east <= 180 and -90 <= south < north <= 90) or cell <= 0:
+        raise ValueError('bounds must be (west, south, east, north) within (-180, -90, 180, 90) and cell positive')
+
+    shape = (int(np.ceil((north - south) / cell)), int(np.ceil((east - west) / cell)))
+    nodes = _resolve(names, bounds, cell, shape)
+    port_cells = _resolve(ports, bounds, cell, shape) if ports is not None else None
+    return SnapGrid(bounds, cell, nodes, names, port_cells, list(ports) if ports is not None else None)
+
+
+def snap_grid_graph(G, bounds, cell=DEFAULT_CELL, P=None):
+    """
+    Snapping grid of a Marnet network (any backend), see `build_snap_grid`.
+
+    Parameters
+    ----------
+    G : a Marnet network
+    bounds : (west, south, east, north) of the domain in degrees
+    cell : float, default 0.05 ; the side of the cells in degrees
+    P : a Ports network, default None ; its terminal ports are resolved too
+
+    Examples
+    --------
+    >>> grid = snap_grid_graph(sr.setup_M(), (-10, 30, 40, 60))
+    >>> grid.node((2.35, 48.85))
+    """
+    from ..compiled import compiled_image
+
+    names = compiled_image(G).node_names()
+    chains = getattr(G, 'chains', None)
+    if chains is not None:
+        # points snap to the intermediate nodes of the chains of a compacted network too
+        names += [tuple(c) for c in chains.coords.tolist()]
+    ports = P.query(terminals=True).kdtree.points if P is not None else None
+    return build_snap_grid(names, bounds, cell, ports)
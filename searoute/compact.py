@@ -0,0 +1,549 @@
+"""
+Degree-2 chain contraction of a Marnet.
+
+Marnet lanes are long polylines: most of their nodes have two neighbours. In
+the compacted network every maximal chain of such nodes, with the same passage
+on all its edges, becomes one edge between the two nodes it joins:
+
+- ``weight``  : the sum of the weights of the chain
+- ``length``  : its great circle length in km, as `searoute()` measures routes
+- ``passage`` : the passage of the chain, if any
+- ``chain``   : index of its intermediate coordinates in the packed `Chains`
+
+Searches run on the smaller network, and routes get their intermediate nodes back
+when they are materialized (`Marnet.expand_path`).
+
+Points snap to all the nodes of the network, the intermediate nodes of the chains
+included, so that routes are the ones of the network before compaction. Routes to
+an intermediate node go along its chain from one of its ends: point to point routes
+and passages are searched with its chain cut at the node (`split_chains`), matrices,
+reachability and port tables from both ends of the chain (`chain_table`).
+"""
+from collections import ChainMap
+
+import numpy as np
+
+from .compiled import _VALUE, compiled_image
+from .matrix import CHUNK_SIZE, _tree_lengths, _tree_passages, shortest_path_trees
+from .utils import conversions, distance_length, distance_many
+from .via import _tree_path
+
+
+_inf = float('inf')
+
+
+class Chains:
+    """
+    Packed intermediate nodes of the contracted chains.
+
+    Attributes
+    ----------
+    indptr : int64 array, the nodes of chain `c` are ``coords[indptr[c]:indptr[c + 1]]``
+    coords : float64 array (m, 2) of the intermediate nodes (lon, lat)
+    starts : list of the node each chain starts next to
+    passages : list of the passage of each chain, None when it has none
+    ends : list of the node each chain ends next to
+    offsets : float64 array (m,), weight from the start of its chain to every intermediate node
+    distances : float64 array (m,), great circle length in km from the start of its chain to every intermediate node
+    weights, lengths : float64 arrays of the weight and the length in km of every chain
+    """
+
+    def __init__(self, indptr, coords, starts, passages, ends, offsets, distances, weights, lengths):
+        self.indptr = indptr
+        self.coords = coords
+        self.starts = starts
+        self.passages = passages
+        self.ends = ends
+        self.offsets = offsets
+        self.distances = distances
+        self.weights = weights
+        self.lengths = lengths
+        self._segments = None
+        self._positions = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def nodes(self, chain, start):
+        """intermediate nodes of `chain` walked from its end `start`"""
+        nodes = [tuple(c) for c in self.coords[self.indptr[chain]:self.indptr[chain + 1]].tolist()]
+        return nodes if start == self.starts[chain] else nodes[::-1]
+
+    def segment(self, u, v, default=None):
+        """attributes of the edge between two consecutive nodes of a chain, `default` when there is none"""
+        if self._segments is None:
+            segments = {}
+            for chain, start in enumerate(self.starts):
+                nodes = [start] + self.nodes(chain, start)
+                for a, b in zip(nodes, nodes[1:]):
+                    segments[(a, b)] = segments[(b, a)] = chain
+            self._segments = segments
+        chain = self._segments.get((u, v))
+        if chain is None:
+            return default
+        passage = self.passages[chain]
+        return {'passage': passage} if passage is not None else {}
+
+    def locate(self, node):
+        """(chain, position in `coords`) of an intermediate node, None for the other nodes"""
+        if self._positions is None:
+            self._positions = {tuple(c): k for k, c in enumerate(self.coords.tolist())}
+        k = self._positions.get(node)
+        if k is None:
+            return None
+        return int(np.searchsorted(self.indptr, k, side='right')) - 1, k
+
+    def ways(self, node, restrictions=None):
+        """
+        (end, weight, length in km, lead) ways from an intermediate node to the start and the end of its
+        chain, `lead` the nodes from `node` to the end (excluded) ; None for the other nodes, [] when
+        the passage of the chain is restricted
+        """
+        found = self.locate(node)
+        if found is None:
+            return None
+        chain, k = found
+        if self.passages[chain] is not None and self.passages[chain] in (restrictions or ()):
+            return []
+        first = int(self.indptr[chain])
+        nodes = [tuple(c) for c in self.coords[first:self.indptr[chain + 1]].tolist()]
+        i = k - first
+        return [(self.starts[chain], float(self.offsets[k]), float(self.distances[k]), nodes[i::-1]),
+                (self.ends[chain], float(self.weights[chain] - self.offsets[k]),
+                 float(self.lengths[chain] - self.distances[k]), nodes[i:])]
+
+    def along(self, u, v, restrictions=None):
+        """
+        (weight, length in km, path) from `u` to `v` along their chain when both are intermediate nodes
+        of the same chain, otherwise None
+        """
+        found_u, found_v = self.locate(u), self.locate(v)
+        if found_u is None or found_v is None or found_u[0] != found_v[0]:
+            return None
+        (chain, i), (_, j) = found_u, found_v
+        if i != j and self.passages[chain] is not None and self.passages[chain] in (restrictions or ()):
+            return None
+        step = 1 if j >= i else -1
+        path = [tuple(c) for c in self.coords[np.arange(i, j + step, step)].tolist()]
+        return (abs(float(self.offsets[j] - self.offsets[i])), abs(float(self.distances[j] - self.distances[i])),
+                path)
+
+
+def compact_graph(M):
+    """
+    Compacted copy of the Marnet `M` (same backend), see the module notes.
+
+    Chains closing a loop, or joining two nodes already joined by an edge or another chain,
+    are kept as they are.
+
+    Returns
+    -------
+    a Marnet with its `chains`
+    """
+    from .classes.marnet import Marnet
+    from .utils import from_nodes_edges_set
+
+    cg = compiled_image(M)
+    names = cg.node_names()
+    n = cg.node_count
+    indptr, indices = cg['indptr'].tolist(), cg['indices'].tolist()
+    weights, codes = cg['weights'].tolist(), cg['passages'].tolist()
+    attrs = cg.node_attrs()
+
+    def interior(ix):
+        start = indptr[ix]
+        return (indptr[ix + 1] - start == 2 and indices[start] != indices[start + 1]
+                and codes[start] == codes[start + 1] and not attrs[ix])
+
+    contracted = [interior(ix) for ix in range(n)]
+    # rings of interior nodes only are cut open at one of their nodes
+    seen = bytearray(n)
+
+    def walk(a, eid):
+        """nodes, their weight from `a`, end, weight and passage code of the chain leaving `a` by the edge `eid`"""
+        nodes, offsets, weight, code = [], [], weights[eid], codes[eid]
+        x, prev = indices[eid], a
+        while contracted[x]:
+            nodes.append(x)
+            offsets.append(weight)
+            seen[x] = 1
+            start = indptr[x]
+            e = start if indices[start] != prev else start + 1
+            weight += weights[e]
+            prev, x = x, indices[e]
+        return nodes, offsets, x, weight, code
+
+    chains, direct = [], {}
+    kept = [ix for ix in range(n) if not contracted[ix]]
+    pending = list(kept)
+    while True:
+        for a in pending:
+            for eid in range(indptr[a], indptr[a + 1]):
+                v = indices[eid]
+                if contracted[v]:
+                    if not seen[v]:
+                        chains.append((a,) + walk(a, eid))
+                elif a < v:
+                    direct[(a, v)] = (weights[eid], codes[eid])
+        rings = [ix for ix in range(n) if contracted[ix] and not seen[ix]]
+        if not rings:
+            break
+        contracted[rings[0]] = False
+        kept.append(rings[0])
+        pending = [rings[0]]
+
+    # chains that would make a loop or a second edge between two nodes are not contracted
+    pairs = set(direct)
+    packed = []
+    for a, nodes, offsets, b, weight, code in chains:
+        key = (min(a, b), max(a, b))
+        if a == b or key in pairs:
+            path = [a] + nodes + [b]
+            for x in nodes:
+                contracted[x] = False
+            for u, v in zip(path, path[1:]):
+                start = indptr[u]
+                eid = start + indices[start:indptr[u + 1]].index(v)
+                direct[(min(u, v), max(u, v))] = (weights[eid], codes[eid])
+        else:
+            pairs.add(key)
+            packed.append((a, nodes, offsets, b, weight, code))
+
+    passage_names = cg.passages
+    node_set = {names[ix]: dict(attrs[ix]) for ix in range(n) if not contracted[ix]}
+    edge_set = {node: {} for node in node_set}
+
+    def add(u, v, attr):
+        edge_set[names[u]][names[v]] = attr
+        edge_set[names[v]][names[u]] = attr
+
+    for (u, v), (weight, code) in direct.items():
+        attr = {'weight': weight}
+        if code >= 0:
+            attr['passage'] = passage_names[code]
+        add(u, v, attr)
+
+    chain_indptr = np.zeros(len(packed) + 1, dtype=np.int64)
+    np.cumsum([len(nodes) for _, nodes, _, _, _, _ in packed], out=chain_indptr[1:])
+    coords = np.asarray(cg['coords'], dtype=np.float64)
+    chain_coords = coords[[x for _, nodes, _, _, _, _ in packed for x in nodes]].reshape(-1, 2)
+    chain_lengths = np.empty(len(packed))
+    for c, (a, nodes, _, b, weight, code) in enumerate(packed):
+        chain_lengths[c] = distance_length([names[x] for x in [a] + nodes + [b]])
+        attr = {'weight': weight, 'chain': c, 'length': float(chain_lengths[c])}
+        if code >= 0:
+            attr['passage'] = passage_names[code]
+        add(a, b, attr)
+
+    # great circle length from the start of its chain to every intermediate node (chains have one at least)
+    first = chain_indptr[:-1]
+    steps = distance_many(np.concatenate([chain_coords[:1], chain_coords[:-1]]), chain_coords)
+    steps[first] = distance_many(coords[[a for a, _, _, _, _, _ in packed]], chain_coords[first])
+    distances = np.cumsum(steps)
+    distances -= np.repeat(distances[first] - steps[first], np.diff(chain_indptr))
+
+    compact = from_nodes_edges_set(Marnet(backend=getattr(M, '_backend', None)), node_set, edge_set)
+    compact.restrictions = list(M.restrictions)
+    compact.chains = Chains(chain_indptr, chain_coords, [names[a] for a, _, _, _, _, _ in packed],
+                            [passage_names[code] if code >= 0 else None for _, _, _, _, _, code in packed],
+                            [names[b] for _, _, _, b, _, _ in packed],
+                            np.array([w for _, _, offsets, _, _, _ in packed for w in offsets], dtype=np.float64),
+                            distances, np.array([weight for _, _, _, _, weight, _ in packed], dtype=np.float64),
+                            chain_lengths)
+    # points snap to every node of the network, intermediate nodes of the chains included
+    compact.update_kdtree(list(node_set) + [tuple(c) for c in chain_coords.tolist()])
+    return compact
+
+
+def _ways(M, cg, nodes, restrictions=None, units='km'):
+    """
+    Ways from nodes of the compacted network `M` to the nodes of `cg`, two at most per node (see `Chains.ways`):
+    arrays (len(nodes), 2) of the node index reached, the weight (inf for missing ways), the length in `units`
+    and the passage bit along the chain, and the list of the leads of every node
+    """
+    chains = M.chains
+    index = cg.node_index()
+    codes = {p: i for i, p in enumerate(cg.passages)}
+    factor = conversions[units] / conversions['km']
+    ix = np.zeros((len(nodes), 2), dtype=np.intp)
+    weights = np.full((len(nodes), 2), _inf)
+    lengths = np.zeros((len(nodes), 2))
+    bits = np.zeros((len(nodes), 2), dtype=np.int64)
+    leads = []
+    for i, node in enumerate(nodes):
+        ways = chains.ways(node, restrictions)
+        if ways is None:
+            ix[i, 0], weights[i, 0] = index[node], 0.0
+            leads.append([[]])
+            continue
+        passage = chains.passages[chains.locate(node)[0]]
+        for w, (end, weight, length, _) in enumerate(ways):
+            ix[i, w], weights[i, w], lengths[i, w] = index[end], weight, length * factor
+            bits[i, w] = 1 << codes[passage] if passage is not None else 0
+        leads.append([lead for _, _, _, lead in ways])
+    return ix, weights, lengths, bits, leads
+
+
+def chain_table(M, origin_nodes, destination_nodes, units='km', restrictions=None, passages=False, paths=False,
+                use_scipy=None, limit=None):
+    """
+    Routes between nodes of a compacted network, the intermediate nodes of its chains included, as
+    `searoute.matrix.node_table` searches them: routes leave (and reach) an intermediate node along its chain,
+    by the end giving the shortest route, or stay on the chain between two nodes of the same chain.
+
+    Parameters
+    ----------
+    M : a compacted Marnet
+    origin_nodes, destination_nodes : lists of its nodes
+    units : unit of the lengths, None when they are not needed
+    restrictions : list of passages to avoid
+    passages : boolean, default False ; returns the passages of the routes
+    paths : boolean, default False ; returns the function giving the paths of the routes
+    use_scipy : boolean, default None which means when installed
+    limit : number, default None ; routes farther than this distance (weights) from the chain ends
+        of the origin may be missed
+
+    Returns
+    -------
+    weights : numpy array (len(origin_nodes), len(destination_nodes)) of network distances, `inf` when there is no route
+    lengths : numpy array of the route lengths in `units` of the same shape, None when `units` is None
+    masks : numpy array of passage bitmasks (see `searoute.matrix._tree_passages`) when `passages`, otherwise None
+    route : function (i, j) giving the path (nodes, not expanded) from origin `i` to destination `j`, [] when
+        there is no route ; None unless `paths`
+    """
+    cg = compiled_image(M)
+    names = cg.node_names()
+    origins = _ways(M, cg, origin_nodes, restrictions, units or 'km')
+    destinations = _ways(M, cg, destination_nodes, restrictions, units or 'km')
+    o_ix, o_weights, o_lengths, o_bits, o_leads = origins
+    d_ix, d_weights, d_lengths, d_bits, d_leads = destinations
+
+    shape = (len(origin_nodes), len(destination_nodes))
+    weights = np.full(shape, _inf)
+    lengths = np.full(shape, _inf) if units is not None else None
+    masks = np.zeros(shape, dtype=np.int64) if passages else None
+    choices = np.zeros(shape, dtype=np.intp)
+    rows = np.zeros((len(origin_nodes), 2), dtype=np.intp)
+    kept, searched = [], 0
+
+    step = max(CHUNK_SIZE // 2, 1)
+    for start in range(0, len(origin_nodes), step):
+        chunk = slice(start, start + step)
+        reached = np.isfinite(o_weights[chunk])
+        sources = list(dict.fromkeys(o_ix[chunk][reached].tolist()))
+        if not sources:
+            continue
+        row_of = {s: r for r, s in enumerate(sources)}
+        local = np.array([[row_of.get(x, 0) for x in pair] for pair in o_ix[chunk].tolist()], dtype=np.intp)
+        rows[chunk] = local + searched
+        searched += len(sources)
+        dist, preds = shortest_path_trees(cg, sources, restrictions, use_scipy, limit)
+
+        # (origins, destinations, origin way * 2 + destination way)
+        def join(origin, tree, destination):
+            total = origin[:, :, None, None] + tree[local[:, :, None, None], d_ix[None, None]] + destination[None, None]
+            return total.transpose(0, 2, 1, 3).reshape(len(local), len(destination_nodes), 4)
+
+        total = join(o_weights[chunk], dist, d_weights)
+        choice = total.argmin(axis=2)
+        weights[chunk] = np.take_along_axis(total, choice[..., None], 2)[..., 0]
+        if units is not None:
+            tree_lengths = _tree_lengths(cg, preds, units)
+            lengths[chunk] = np.take_along_axis(join(o_lengths[chunk], tree_lengths, d_lengths),
+                                                choice[..., None], 2)[..., 0]
+        if passages:
+            tree_masks = _tree_passages(cg, preds)
+            bits = (o_bits[chunk][:, :, None, None] | tree_masks[local[:, :, None, None], d_ix[None, None]]
+                    | d_bits[None, None]).transpose(0, 2, 1, 3).reshape(total.shape)
+            masks[chunk] = np.take_along_axis(bits, choice[..., None], 2)[..., 0]
+        choices[chunk] = choice
+        if paths:
+            kept.append(preds)
+    if units is not None:
+        lengths[np.isinf(weights)] = _inf
+
+    # routes along a chain, between two of its intermediate nodes
+    chains = M.chains
+    along = {}
+    o_chain = [(chains.locate(node) or (-1,))[0] for node in origin_nodes]
+    d_chain = {}
+    for j, node in enumerate(destination_nodes):
+        d_chain.setdefault((chains.locate(node) or (-1,))[0], []).append(j)
+    factor = conversions[units or 'km'] / conversions['km']
+    for i, chain in enumerate(o_chain):
+        for j in d_chain.get(chain, []) if chain >= 0 else ():
+            found = chains.along(origin_nodes[i], destination_nodes[j], restrictions)
+            if found is not None and found[0] <= weights[i, j]:
+                weights[i, j] = found[0]
+                if units is not None:
+                    lengths[i, j] = found[1] * factor
+                if passages:
+                    passage = chains.passages[chain]
+                    moved = origin_nodes[i] != destination_nodes[j]
+                    masks[i, j] = 1 << cg.passages.index(passage) if passage is not None and moved else 0
+                along[(i, j)] = found[2]
+
+    route = None
+    if paths:
+        preds = np.concatenate(kept) if kept else None
+
+        def route(i, j):
+            if (i, j) in along:
+                return list(along[(i, j)])
+            if weights[i, j] == _inf:
+                return []
+            e, f = divmod(int(choices[i, j]), 2)
+            source, target = int(o_ix[i, e]), int(d_ix[j, f])
+            head = o_leads[i][e]
+            tail = d_leads[j][f]
+            return head + [names[x] for x in _tree_path(preds[rows[i, e]], source, target)] + tail[::-1]
+
+    return weights, lengths, masks, route
+
+
+def chain_shortest_path(M, origin_node, destination_node, restrictions=None, use_scipy=None):
+    """
+    Shortest path between two nodes of a compacted network, one of them at least an intermediate node of
+    a chain, searched with the chains cut at these nodes (see `split_chains`) ; (length, path) as
+    `Marnet.shortest_path` returns them
+    """
+    cg = split_chains(M, compiled_image(M), [origin_node, destination_node])
+    index = cg.node_index()
+    source, target = index[origin_node], index[destination_node]
+    dist, preds = shortest_path_trees(cg, [source], restrictions, use_scipy)
+    if dist[0, target] == _inf:
+        return _inf, []
+    names = cg.node_names()
+    path = [names[ix] for ix in _tree_path(preds[0], source, target)]
+    return float(dist[0, target]), fill_chains(M, path, [])[0]
+
+
+def chain_alternative_paths(M, origin_node, destination_node, k=3, diversity=0.5, max_stretch=2.0,
+                            restrictions=None, use_scipy=None):
+    """
+    `searoute.alternatives.alternative_paths` between two nodes of a compacted network, one of them at least
+    an intermediate node of a chain, searched with the chains cut at these nodes (see `split_chains`) ;
+    list of (length, path) as `Marnet.k_shortest_paths` returns them
+    """
+    from .alternatives import alternative_paths
+
+    cg = split_chains(M, compiled_image(M), [origin_node, destination_node])
+    names = cg.node_names()
+    index = cg.node_index()
+    routes = alternative_paths(cg, index[origin_node], index[destination_node], k, diversity, max_stretch,
+                               restrictions, use_scipy)
+    return [(length, fill_chains(M, [names[ix] for ix in path], [])[0]) for length, path in routes]
+
+
+def chain_gateways(M):
+    """
+    {passage: (u, v)} gateway edge of every passage of a compacted network, chosen as
+    `searoute.via.passage_gateways` chooses it among the edges of the network before compaction
+    """
+    cg = compiled_image(M)
+    chains = M.chains
+    names = cg.node_names()
+    coords = np.asarray(cg['coords'], dtype=np.float64)
+    sources = np.repeat(np.arange(cg.node_count), np.diff(cg['indptr']))
+    targets = np.asarray(cg['indices'], dtype=np.intp)
+    direct = (cg['edge/chain/state'] != _VALUE) if 'edge/chain/state' in cg else np.ones(len(targets), dtype=bool)
+    codes = np.asarray(cg['passages'])
+
+    gateways = {}
+    for code, passage in enumerate(cg.passages):
+        eids = np.flatnonzero((codes == code) & direct & (sources < targets))
+        edges = [(names[u], names[v]) for u, v in zip(sources[eids].tolist(), targets[eids].tolist())]
+        for chain in [c for c, p in enumerate(chains.passages) if p == passage]:
+            nodes = [chains.starts[chain]] + chains.nodes(chain, chains.starts[chain]) + [chains.ends[chain]]
+            edges.extend(zip(nodes, nodes[1:]))
+        if not edges:
+            continue
+        ends = np.array(edges, dtype=np.float64)
+        middles = ends.mean(axis=1)
+        gateways[passage] = edges[int(np.argmin(((middles - middles.mean(axis=0)) ** 2).sum(axis=1)))]
+    return gateways
+
+
+def split_chains(M, cg, nodes):
+    """
+    Compiled arrays of a compacted network with the chains through some of their intermediate `nodes`
+    cut at these nodes, which become nodes of the network (routes through given nodes and edges,
+    see `Marnet.via_shortest_path`) ; `fill_chains` gives the routes found on them back their nodes
+
+    Returns
+    -------
+    a `CompiledGraph` with the arrays searched, the nodes cut at are numbered after the nodes of `cg`
+    """
+    from .compiled import CompiledGraph
+
+    chains = M.chains
+    index = cg.node_index()
+    cut = {}
+    for node in nodes:
+        found = chains.locate(node)
+        if found is not None:
+            cut.setdefault(found[0], set()).add(found[1])
+    positions = sorted(k for ks in cut.values() for k in ks)
+    added = {k: cg.node_count + i for i, k in enumerate(positions)}
+
+    rows = np.repeat(np.arange(cg.node_count), np.diff(cg['indptr']))
+    chain_of = np.where(cg['edge/chain/state'] == _VALUE, cg['edge/chain/data'], -1)
+    keep = ~np.isin(chain_of, list(cut))
+    u, v = [rows[keep]], [np.asarray(cg['indices'])[keep]]
+    weights, codes = [np.asarray(cg['weights'])[keep]], [np.asarray(cg['passages'])[keep]]
+    for chain, ks in cut.items():
+        ks = sorted(ks)
+        points = [index[chains.starts[chain]]] + [added[k] for k in ks] + [index[chains.ends[chain]]]
+        offsets = np.concatenate([[0.0], chains.offsets[ks], [chains.weights[chain]]])
+        passage = chains.passages[chain]
+        code = cg.passages.index(passage) if passage is not None else -1
+        a, b, w = np.array(points[:-1]), np.array(points[1:]), np.diff(offsets)
+        u += [a, b]
+        v += [b, a]
+        weights += [w, w]
+        codes += [np.full(len(w), code)] * 2
+
+    u, v, weights, codes = (np.concatenate(x) for x in (u, v, weights, codes))
+    order = np.argsort(u, kind='stable')
+    n = cg.node_count + len(positions)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(u, minlength=n), out=indptr[1:])
+    arrays = {
+        'coords': np.concatenate([np.asarray(cg['coords'], dtype=np.float64), chains.coords[positions]]),
+        'indptr': indptr,
+        'indices': v[order],
+        'weights': weights[order],
+        'passages': codes[order],
+    }
+    split = CompiledGraph(arrays, {'passages': cg.passages})
+    # names and index of the nodes, the ones of `cg` are not copied
+    split._names = cg._names + tuple(tuple(c) for c in chains.coords[positions].tolist())
+    split._index = ChainMap({split._names[ix]: ix for ix in added.values()}, index)
+    return split
+
+
+def fill_chains(M, path, ends):
+    """
+    Route `path` (nodes) found on the arrays of `split_chains`, with the intermediate nodes of the pieces
+    of chains it goes through, and the indexes `ends` of nodes of `path` moved to it ; the chains that
+    were not cut are left to `Marnet.expand_path`
+    """
+    chains = M.chains
+    filled, position = path[:1], [0]
+    for x, y in zip(path, path[1:]):
+        found_x, found_y = chains.locate(x), chains.locate(y)
+        if found_x is not None or found_y is not None:
+            chain = (found_x or found_y)[0]
+            first, last = int(chains.indptr[chain]), int(chains.indptr[chain + 1])
+
+            def at(node, found):
+                if found is not None:
+                    return found[1]
+                return first - 1 if node == chains.starts[chain] else last
+
+            i, j = at(x, found_x), at(y, found_y)
+            step = 1 if j > i else -1
+            filled.extend(tuple(c) for c in chains.coords[np.arange(i + step, j, step)].tolist())
+        filled.append(y)
+        position.append(len(filled) - 1)
+    return filled, [position[i] for i in ends]
@@ -0,0 +1,490 @@
+"""
+Compiled, versioned binary image of a searoute network (Marnet or Ports).
+
+The image stores the graph as flat arrays so that it can be memory-mapped
+instead of parsed:
+
+- ``coords``  : float64 (n, 2) node coordinates as (lon, lat)
+- ``indptr``  : int64 (n + 1,) CSR offsets
+- ``indices`` : int32 (m,) CSR targets (both directions of every edge)
+- ``weights`` : float64 (m,) edge weights
+- ``passages``: int8 (m,) passage code, -1 when the edge has no passage
+- ``edge_length_m``: float64 (m,) great circle length of every edge in metres
+- ``edge_shift``: int16 (m,) antimeridian longitude shift of the target of every edge
+- node and edge attribute columns (see `_encode_column`)
+
+Any other named array (e.g. precomputed tables) can be stored next to them.
+
+File layout::
+
+    b"SRGRAPH\\0" | version uint32 | header length uint32 | JSON header | arrays
+
+Every array is aligned on 64 bytes so that it can be viewed in place from a
+memory map.
+"""
+import json
+import os
+
+import numpy as np
+
+from .data import DATA_DIR, MARNET_FILE, PORTS_FILE
+
+
+MAGIC = b"SRGRAPH\x00"
+FORMAT_VERSION = 1
+_ALIGN = 64
+_PREAMBLE = len(MAGIC) + 8
+
+# states of a value in an attribute column
+_ABSENT, _VALUE, _NONE = 0, 1, 2
+
+# attributes stored in dedicated arrays, not as generic edge columns
+_EDGE_RESERVED = ('weight', 'passage')
+
+
+class CompiledGraph:
+    """
+    A compiled graph image, arrays are read-only views of the file when
+    memory-mapped.
+
+    Parameters
+    ----------
+    arrays : dict of str -> numpy.ndarray
+    header : dict, the decoded JSON header
+    path : the file the image was read from, if any
+    """
+
+    def __init__(self, arrays, header, path=None):
+        self.arrays = arrays
+        self.header = header
+        self.path = path
+        # node ids and their index, see `node_names` and `node_index`
+        self._names = None
+        self._index = None
+        # sorted (source, target) keys of the edges and their edge ids, see `edge_ids`
+        self._edge_keys = None
+
+    @property
+    def kind(self):
+        return self.header.get('kind')
+
+    @property
+    def crs(self):
+        return self.header.get('crs')
+
+    @property
+    def passages(self):
+        """list of passage names, indexed by the codes of ``passages`` array"""
+        return self.header.get('passages', [])
+
+    @property
+    def meta(self):
+        return self.header.get('meta', {})
+
+    @property
+    def node_count(self):
+        return len(self.arrays['coords'])
+
+    @property
+    def edge_count(self):
+        """number of directed edges (each undirected edge counts twice)"""
+        return len(self.arrays['indices'])
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def __contains__(self, name):
+        return name in self.arrays
+
+    def node_names(self):
+        """list of node ids as (lon, lat) tuples, in node index order"""
+        if self._names is None:
+            self._names = tuple(tuple(c) for c in self.arrays['coords'].tolist())
+        return list(self._names)
+
+    def node_index(self):
+        """{(lon, lat): node index}, built once"""
+        if self._index is None:
+            self.node_names()
+            self._index = {name: ix for ix, name in enumerate(self._names)}
+        return self._index
+
+    def edge_ids(self, sources, targets):
+        """
+        edge ids from the node indexes `sources` to `targets` (arrays of the same shape),
+        -1 where the nodes are not joined by an edge
+        """
+        n = self.node_count
+        if self._edge_keys is None:
+            rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.arrays['indptr']))
+            keys = rows * n + np.asarray(self.arrays['indices'], dtype=np.int64)
+            order = np.argsort(keys)
+            self._edge_keys = (keys[order], order)
+        keys, order = self._edge_keys
+
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        wanted = sources * n + targets
+        if not len(keys):
+            return np.full(wanted.shape, -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        joined = (sources >= 0) & (targets >= 0) & (keys[found] == wanted)
+        return np.where(joined, order[found], -1)
+
+    def edge_lengths(self):
+        """float64 (m,) great circle length in metres of every edge, as `searoute.utils.distance` measures it"""
+        if 'edge_length_m' not in self.arrays:
+            self.arrays['edge_length_m'] = _edge_length_m(self.arrays)
+        return self.arrays['edge_length_m']
+
+    def edge_shifts(self):
+        """
+        int16 (m,) longitude shift (-360, 0 or 360) of the target of every edge, so that the edge
+        does not cross the antimeridian, as `searoute.utils.normalize_linestring` does
+        """
+        if 'edge_shift' not in self.arrays:
+            self.arrays['edge_shift'] = _edge_shift(self.arrays)
+        return self.arrays['edge_shift']
+
+    def node_column(self, name):
+        return _decode_column(self, 'node', name, self.header['node_columns'][name], self.node_count)
+
+    def edge_column(self, name):
+        return _decode_column(self, 'edge', name, self.header['edge_columns'][name], self.edge_count)
+
+    def node_attrs(self):
+        """list of node attributes dict, in node index order"""
+        attrs = [{} for _ in range(self.node_count)]
+        for col in self.header['node_columns']:
+            for d, (state, value) in zip(attrs, self.node_column(col)):
+                if state != _ABSENT:
+                    d[col] = value
+        return attrs
+
+    def node_set(self):
+        """
+        Node set as used by `searoute.utils.from_nodes_edges_set`:
+        {(lon, lat): {attr: value, ...}, ...}
+        """
+        return dict(zip(self.node_names(), self.node_attrs()))
+
+    def edge_set(self):
+        """
+        Edge set as used by `searoute.utils.from_nodes_edges_set`:
+        {u: {v: {'weight': w, ...}, ...}, ...}
+        """
+        names = self.node_names()
+        indptr = self.arrays['indptr'].tolist()
+        indices = self.arrays['indices'].tolist()
+        weights = self.arrays['weights'].tolist()
+        codes = self.arrays['passages'].tolist()
+        passages = self.passages
+        columns = [(col, self.edge_column(col)) for col in self.header['edge_columns']]
+
+        edge_set = {}
+        for u_ix, u in enumerate(names):
+            start, end = indptr[u_ix], indptr[u_ix + 1]
+            if start == end:
+                continue
+            targets = {}
+            for eid in range(start, end):
+                attr = {'weight': weights[eid]}
+                if codes[eid] >= 0:
+                    attr['passage'] = passages[codes[eid]]
+                for col, values in columns:
+                    state, value = values[eid]
+                    if state != _ABSENT:
+                        attr[col] = value
+                targets[names[indices[eid]]] = attr
+            edge_set[u] = targets
+        return edge_set
+
+
+def _edge_sources(arrays):
+    return np.repeat(np.arange(len(arrays['coords'])), np.diff(arrays['indptr']))
+
+
+def _edge_length_m(arrays):
+    from .utils import distance_many
+    coords = np.asarray(arrays['coords'], dtype=np.float64)
+    return distance_many(coords[_edge_sources(arrays)], coords[np.asarray(arrays['indices'], dtype=np.intp)], 'm')
+
+
+def _edge_shift(arrays):
+    lon = np.asarray(arrays['coords'], dtype=np.float64)[:, 0]
+    dlon = lon[np.asarray(arrays['indices'], dtype=np.intp)] - lon[_edge_sources(arrays)]
+    return np.where(dlon > 180, -360, np.where(dlon < -180, 360, 0)).astype(np.int16)
+
+
+def _encode_column(values):
+    """
+    Encode a list of python values (`_ABSENT` marks a missing key).
+
+    Returns the column kind and its arrays: `f8`/`i8` numeric columns,
+    `str` utf-8 columns, and `json` for anything else.
+    """
+    present = [v for v in values if v is not _ABSENT and v is not None]
+    state = np.array([_ABSENT if v is _ABSENT else (_NONE if v is None else _VALUE) for v in values],
+                     dtype=np.uint8)
+
+    if present and all(isinstance(v, float) for v in present):
+        kind = 'f8'
+    elif present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        kind = 'i8'
+    elif all(isinstance(v, str) for v in present):
+        kind = 'str'
+    else:
+        kind = 'json'
+
+    if kind in ('f8', 'i8'):
+        fill = np.nan if kind == 'f8' else 0
+        data = np.array([v if s == _VALUE else fill for v, s in zip(values, state)], dtype=kind)
+        return kind, {'state': state, 'data': data}
+
+    encode = (lambda v: v) if kind == 'str' else json.dumps
+    chunks = [encode(v).encode('utf-8') if s == _VALUE else b'' for v, s in zip(values, state)]
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in chunks], out=offsets[1:])
+    data = np.frombuffer(b''.join(chunks), dtype=np.uint8)
+    return kind, {'state': state, 'data': data, 'offsets': offsets}
+
+
+def _decode_column(cg, scope, name, kind, size):
+    """Returns a list of (state, value) for a column"""
+    prefix = f'{scope}/{name}/'
+    states = cg.arrays[prefix + 'state'].tolist() if size else []
+    if kind in ('f8', 'i8'):
+        data = cg.arrays[prefix + 'data'].tolist()
+    else:
+        blob = cg.arrays[prefix + 'data'].tobytes()
+        offsets = cg.arrays[prefix + 'offsets'].tolist()
+        decode = (lambda b: b.decode('utf-8')) if kind == 'str' else (lambda b: json.loads(b.decode('utf-8')))
+        data = [decode(blob[offsets[i]:offsets[i + 1]]) if states[i] == _VALUE else None for i in range(size)]
+
+    return [(s, data[i] if s == _VALUE else None) for i, s in enumerate(states)]
+
+
+def compile_graph(G, kind=None):
+    """
+    Compile a Marnet or Ports network into a `CompiledGraph`.
+
+    Parameters
+    ----------
+    G : a Ports or Marnet network (any backend)
+    kind : str stored in the header, defaults to the class name in lower case
+
+    Returns
+    -------
+    CompiledGraph
+    """
+    if kind is None:
+        kind = type(G).__name__.lower()
+
+    nodes = list(G.nodes(data=True))
+    names = [n for n, _ in nodes]
+    name_to_idx = {n: i for i, n in enumerate(names)}
+
+    # both directions of every edge, the first seen attributes win
+    adjacency = [dict() for _ in names]
+    for u, v, data in G.edges(data=True):
+        u_ix, v_ix = name_to_idx[u], name_to_idx[v]
+        adjacency[u_ix].setdefault(v_ix, data)
+        adjacency[v_ix].setdefault(u_ix, data)
+
+    indptr = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in adjacency], out=indptr[1:])
+    edges = [(v_ix, data) for a in adjacency for v_ix, data in a.items()]
+
+    passages = sorted({d['passage'] for _, d in edges if d.get('passage') is not None})
+    passage_code = {p: i for i, p in enumerate(passages)}
+    if len(passages) > 127:
+        raise ValueError('A compiled graph supports at most 127 distinct passages')
+
+    arrays = {
+        'coords': np.array(names, dtype=np.float64).reshape(len(names), 2),
+        'indptr': indptr,
+        'indices': np.array([v_ix for v_ix, _ in edges], dtype=np.int32),
+        'weights': np.array([d.get('weight', 0.0) for _, d in edges], dtype=np.float64),
+        'passages': np.array([passage_code.get(d.get('passage'), -1) for _, d in edges], dtype=np.int8),
+    }
+    arrays['edge_length_m'] = _edge_length_m(arrays)
+    arrays['edge_shift'] = _edge_shift(arrays)
+
+    node_columns = {}
+    for col in sorted({k for _, d in nodes for k in d}):
+        kind_, col_arrays = _encode_column([d.get(col, _ABSENT) for _, d in nodes])
+        node_columns[col] = kind_
+        arrays.update({f'node/{col}/{k}': a for k, a in col_arrays.items()})
+
+    edge_columns = {}
+    for col in sorted({k for _, d in edges for k in d if k not in _EDGE_RESERVED}):
+        kind_, col_arrays = _encode_column([d.get(col, _ABSENT) for _, d in edges])
+        edge_columns[col] = kind_
+        arrays.update({f'edge/{col}/{k}': a for k, a in col_arrays.items()})
+
+    header = {
+        'kind': kind,
+        'crs': G.graph.get('crs'),
+        'passages': passages,
+        'node_columns': node_columns,
+        'edge_columns': edge_columns,
+        'meta': {},
+    }
+    return CompiledGraph(arrays, header)
+
+
+def write_compiled(cg: CompiledGraph, file_name):
+    """
+    Write a `CompiledGraph` to `file_name`.
+    """
+    layout = {}
+    blobs = []
+    offset = 0
+    for name, arr in cg.arrays.items():
+        arr = np.ascontiguousarray(arr)
+        arr = arr.astype(arr.dtype.newbyteorder('<'), copy=False)
+        offset = -(-offset // _ALIGN) * _ALIGN
+        layout[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': offset}
+        blobs.append((offset, arr))
+        offset += arr.nbytes
+    data_size = offset
+
+    header = dict(cg.header, version=FORMAT_VERSION, arrays=layout)
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    data_start = -(-(_PREAMBLE + len(header_bytes)) // _ALIGN) * _ALIGN
+
+    with open(file_name, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.array([FORMAT_VERSION, len(header_bytes)], dtype='<u4').tobytes())
+        f.write(header_bytes)
+        for offset, arr in blobs:
+            f.seek(data_start + offset)
+            f.write(arr.tobytes())
+        f.truncate(data_start + data_size)
+
+
+def read_compiled(file_name, mmap=True):
+    """
+    Read a compiled graph image.
+
+    Parameters
+    ----------
+    file_name : path of the image
+    mmap : boolean, default True ; arrays are read-only views of a memory map of the file,
+        otherwise the file is read in memory
+
+    Returns
+    -------
+    CompiledGraph
+    """
+    if mmap:
+        buf = np.memmap(file_name, dtype=np.uint8, mode='r')
+    else:
+        with open(file_name, 'rb') as f:
+            buf = np.frombuffer(f.read(), dtype=np.uint8)
+
+    if buf[:len(MAGIC)].tobytes() != MAGIC:
+        raise ValueError(f'{file_name} is not a compiled searoute graph')
+
+    version, header_len = np.frombuffer(buf[len(MAGIC):_PREAMBLE].tobytes(), dtype='<u4').tolist()
+    if version != FORMAT_VERSION:
+        raise ValueError(
+            f'{file_name} has compiled graph version {version}, expected {FORMAT_VERSION}; '
+            'rebuild it with searoute.compiled.to_compiled')
+
+    header = json.loads(buf[_PREAMBLE:_PREAMBLE + header_len].tobytes().decode('utf-8'))
+    data_start = -(-(_PREAMBLE + header_len) // _ALIGN) * _ALIGN
+
+    arrays = {}
+    for name, spec in header.pop('arrays').items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        start = data_start + spec['offset']
+        arrays[name] = buf[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+
+    return CompiledGraph(arrays, header, path=file_name)
+
+
+def to_compiled(G, file_name, kind=None):
+    """
+    Compile a graph and export it to a file, see `compile_graph`.
+
+    Examples
+    --------
+    >>> M = sr.Marnet().load_geojson('marnet_searoute.geojson')
+    >>> to_compiled(M, 'marnet.srg')
+    """
+    cg = compile_graph(G, kind)
+    write_compiled(cg, file_name)
+    return cg
+
+
+def from_compiled(G, file_name, mmap=True):
+    """Returns a searoute Network (Ports or Marnet) loaded from a compiled image.
+
+    Parameters
+    ----------
+    G : a Ports or Marnet network (instance)
+    file_name : path of the compiled image, or an already read `CompiledGraph`
+    mmap : boolean, default True ; memory-maps the file
+
+    Examples
+    --------
+    >>> M = from_compiled(sr.Marnet(), 'marnet.srg')
+    """
+    from .utils import from_nodes_edges_set
+
+    cg = file_name if isinstance(file_name, CompiledGraph) else read_compiled(file_name, mmap=mmap)
+    if cg.crs:
+        G.graph['crs'] = cg.crs
+
+    if hasattr(G, '_attach_compiled'):
+        # array backed graphs use the arrays in place
+        G._attach_compiled(cg)
+        G.update_kdtree(G.nodes())
+    else:
+        G = from_nodes_edges_set(G, cg.node_set(), cg.edge_set())
+
+    # precomputed tables stored with the graph (e.g. `ch/*`, `alt/*`) are read from the image on use
+    G._compiled = cg
+    return G
+
+
+def compiled_image(G):
+    """
+    The `CompiledGraph` of a network: the image it was loaded from, otherwise
+    compiled on first call and kept until the network changes (`Marnet.add_edge`).
+    """
+    cg = getattr(G, '_compiled', None)
+    if cg is None:
+        cg = compile_graph(G)
+        G._compiled = cg
+    return cg
+
+
+def build_default_artifacts(data_dir=DATA_DIR):
+    """
+    (Re-)builds the compiled images shipped with searoute from `data/marnet_dict.py`
+    and `data/ports_dict.py`, Marnet with its contraction hierarchy and landmarks (takes about a minute).
+    """
+    from .data.marnet_dict import edge_list as marnet_e, node_list as marnet_n
+    from .data.ports_dict import edge_list as port_e, node_list as port_n
+    from .classes.marnet import Marnet
+    from .classes.ports import Ports
+    from .utils import from_nodes_edges_set
+
+    from .classes.ch import contract
+    from .classes.alt import build_landmarks
+
+    M = from_nodes_edges_set(Marnet(), marnet_n, marnet_e)
+    P = from_nodes_edges_set(Ports(), port_n, port_e)
+
+    cg = compile_graph(M)
+    cg.arrays.update(contract(cg).to_arrays())
+    build_landmarks(cg).to_compiled(cg)
+    write_compiled(cg, os.path.join(data_dir, os.path.basename(MARNET_FILE)))
+    to_compiled(P, os.path.join(data_dir, os.path.basename(PORTS_FILE)))
+
+
+if __name__ == '__main__':
+    build_default_artifacts()
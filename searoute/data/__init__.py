@@ -0,0 +1,6 @@
+import os
+
+# compiled images of the default networks, see searoute.compiled
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+MARNET_FILE = os.path.join(DATA_DIR, 'marnet.srg')
+PORTS_FILE = os.path.join(DATA_DIR, 'ports.srg')
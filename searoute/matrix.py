@@ -0,0 +1,303 @@
+"""
+Distance matrices between many origins and destinations on Marnet.
+
+Every point is snapped once, then one single-source search is run per unique
+origin node (scipy.sparse.csgraph when installed, otherwise a python Dijkstra)
+on the compiled arrays of the network (`searoute.compiled.compiled_image`).
+Lengths are the ones `searoute()` reports: the great circle length of the
+route between the snapped nodes, summed along the shortest path tree.
+"""
+from heapq import heappush, heappop
+
+import numpy as np
+
+from .compiled import compiled_image
+from .utils import conversions, speed_coef, process_route
+
+
+_inf = float('inf')
+# origins searched at once, bounds the (chunk, node count) arrays held in memory
+CHUNK_SIZE = 256
+
+
+def _tree_accumulate(values, preds, op=np.add):
+    """
+    Accumulates `values` (k, n), the value of the edge from its predecessor at every node,
+    from the roots of shortest path trees `preds` (k, n) of predecessor indexes (-1 at the
+    roots and unreachable nodes), by pointer jumping. `values` is updated in place.
+    """
+    k, n = preds.shape
+    flat = np.flatnonzero(preds >= 0)
+    jump = np.full(k * n, -1, dtype=np.int64)
+    jump[flat] = preds.ravel()[flat] + (flat // n) * n
+    total = values.reshape(-1)
+
+    while flat.size:
+        parents = jump[flat]
+        total[flat] = op(total[flat], total[parents])
+        jump[flat] = jump[parents]
+        flat = flat[jump[flat] >= 0]
+    return values
+
+
+def _tree_edges(cg, preds):
+    """edge ids from the predecessor of every node of shortest path trees `preds` (k, n) that has one"""
+    has_pred = preds >= 0
+    nodes = np.broadcast_to(np.arange(cg.node_count, dtype=np.int64), preds.shape)
+    return cg.edge_ids(preds[has_pred], nodes[has_pred])
+
+
+def _tree_lengths(cg, preds, units='km'):
+    """
+    length from the root of every node of shortest path trees `preds` (k, n), as `searoute()` reports it,
+    from the edge lengths of `cg` ; edges with a `length` (chains of a compacted network, see `searoute.compact`)
+    count it
+    """
+    eids = _tree_edges(cg, preds)
+    lengths = np.zeros(preds.shape)
+    lengths[preds >= 0] = cg.edge_lengths()[eids] * conversions[units]
+    if 'edge/length/data' in cg:
+        chain = cg['edge/length/data'][eids] * conversions[units] / conversions['km']
+        lengths[preds >= 0] = np.where(np.isnan(chain), lengths[preds >= 0], chain)
+    return _tree_accumulate(lengths, preds)
+
+
+def _tree_passages(cg, preds):
+    """
+    Bitmask of the passages traversed from the root to every node of shortest path
+    trees `preds` (k, n), bit `i` for the passage `cg.passages[i]`
+    """
+    codes = np.asarray(cg['passages'], dtype=np.int64)
+    bits = np.where(codes >= 0, np.left_shift(1, np.maximum(codes, 0)), 0)
+
+    masks = np.zeros(preds.shape, dtype=np.int64)
+    masks[preds >= 0] = bits[_tree_edges(cg, preds)]
+    return _tree_accumulate(masks, preds, np.bitwise_or)
+
+
+def _dijkstra(lists, blocked, source, limit=_inf):
+    """
+    distances and predecessors (lists) of every node from `source`, skipping the blocked passage codes,
+    nodes farther than `limit` are left unreached
+    """
+    indptr, indices, weights, codes = lists
+    n = len(indptr) - 1
+    dist = [_inf] * n
+    preds = [-1] * n
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, v = heappop(heap)
+        if d > dist[v]:
+            continue
+        for eid in range(indptr[v], indptr[v + 1]):
+            if codes[eid] in blocked:
+                continue
+            w = indices[eid]
+            dw = d + weights[eid]
+            if dw < dist[w] and dw <= limit:
+                dist[w] = dw
+                preds[w] = v
+                heappush(heap, (dw, w))
+    return dist, preds
+
+
+def _csgraph():
+    try:
+        from scipy.sparse import csgraph
+    except ImportError:
+        return None
+    return csgraph
+
+
+def shortest_path_trees(cg, sources, restrictions=None, use_scipy=None, limit=None):
+    """
+    Single-source shortest paths from every node index of `sources`.
+
+    Parameters
+    ----------
+    cg : `searoute.compiled.CompiledGraph` of a Marnet
+    sources : list of node indexes
+    restrictions : list of passages to avoid
+    use_scipy : boolean, default None which means when installed
+    limit : number, default None ; searches stop at this distance (weights), farther nodes are unreached
+
+    Returns
+    -------
+    dist, preds : numpy arrays (len(sources), n) of network distances (weights) and
+        predecessor indexes (-1 for the sources and unreachable nodes)
+    """
+    codes = {p: i for i, p in enumerate(cg.passages)}
+    blocked = {codes[p] for p in restrictions or () if p in codes}
+    csgraph = _csgraph() if use_scipy is not False else None
+
+    if csgraph is not None:
+        from scipy.sparse import csr_matrix
+
+        n = cg.node_count
+        keep = ~np.isin(cg['passages'], list(blocked))
+        rows = np.repeat(np.arange(n), np.diff(cg['indptr']))[keep]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        mat = csr_matrix((cg['weights'][keep], cg['indices'][keep], indptr), shape=(n, n))
+        dist, preds = csgraph.dijkstra(mat, directed=True, indices=sources, return_predecessors=True,
+                                       limit=_inf if limit is None else limit)
+        preds = preds.astype(np.int64)
+        preds[preds < 0] = -1
+        return dist.reshape(len(sources), n), preds.reshape(len(sources), n)
+
+    lists = (cg['indptr'].tolist(), cg['indices'].tolist(), cg['weights'].tolist(), cg['passages'].tolist())
+    trees = [_dijkstra(lists, blocked, s, _inf if limit is None else limit) for s in sources]
+    return (np.array([d for d, _ in trees], dtype=np.float64).reshape(len(sources), -1),
+            np.array([p for _, p in trees], dtype=np.int64).reshape(len(sources), -1))
+
+
+class RouteMatrix:
+    """
+    Result of `searoute.searoute_matrix`.
+
+    Attributes
+    ----------
+    distances : numpy array (len(origins), len(destinations)), length in `units`, `inf` when there is no route
+    durations : numpy array (len(origins), len(destinations)), duration in hours at `speed_knot`
+    units : unit of the distances
+    origin_nodes, destination_nodes : list of the Marnet nodes the points were snapped to
+    """
+
+    def __init__(self, distances, durations, units, origin_nodes, destination_nodes, names=None, preds=None, rows=None,
+                 expand=None, route=None):
+        self.distances = distances
+        self.durations = durations
+        self.units = units
+        self.origin_nodes = origin_nodes
+        self.destination_nodes = destination_nodes
+        self._names = names
+        self._preds = preds
+        self._rows = rows
+        self._name_to_idx = None
+        self._expand = expand
+        # function (i, j) giving the paths of compacted networks, see `searoute.compact.chain_table`
+        self._route = route
+
+    @property
+    def shape(self):
+        return self.distances.shape
+
+    def path(self, i, j):
+        """
+        Nodes of the route from origin `i` to destination `j` (built on demand), [] when there is no route.
+        Only available with `return_paths=True`.
+        """
+        if self._route is not None:
+            path = self._route(i, j)
+            return self._expand(path) if self._expand is not None else path
+        if self._preds is None:
+            raise ValueError('paths are not kept, use searoute_matrix(..., return_paths=True)')
+        if self._name_to_idx is None:
+            self._name_to_idx = {name: ix for ix, name in enumerate(self._names)}
+
+        preds = self._preds[self._rows[i]]
+        source = self._name_to_idx[self.origin_nodes[i]]
+        x = self._name_to_idx[self.destination_nodes[j]]
+        if x != source and preds[x] < 0:
+            return []
+
+        path = [x]
+        while x != source:
+            x = int(preds[x])
+            path.append(x)
+        path.reverse()
+        path = [self._names[ix] for ix in path]
+        return self._expand(path) if self._expand is not None else path
+
+    def feature(self, i, j):
+        """
+        GeoJSON Feature (LineString) of the route from origin `i` to destination `j`, as `searoute()` returns it.
+        Only available with `return_paths=True`.
+        """
+        from geojson import Feature, LineString
+
+        ls, _ = process_route(self.path(i, j), None)
+        return Feature(geometry=LineString(ls), properties={
+            'length': float(self.distances[i, j]), 'units': self.units,
+            'duration_hours': float(self.durations[i, j])})
+
+
+def node_table(cg, sources, targets, units='km', restrictions=None, passages=False, use_scipy=None):
+    """
+    Route lengths between node indexes, searched by chunks of `CHUNK_SIZE` sources.
+
+    Returns
+    -------
+    lengths : numpy array (len(sources), len(targets)), `inf` when there is no route
+    masks : numpy array of passage bitmasks of the same shape (see `_tree_passages`) when `passages`, otherwise None
+    preds : list of the predecessor arrays of every chunk
+    """
+    targets = np.asarray(targets, dtype=np.intp)
+    lengths = np.empty((len(sources), len(targets)))
+    masks = np.zeros((len(sources), len(targets)), dtype=np.int64) if passages else None
+    kept = []
+    for start in range(0, len(sources), CHUNK_SIZE):
+        dist, preds = shortest_path_trees(cg, sources[start:start + CHUNK_SIZE], restrictions, use_scipy)
+        chunk = _tree_lengths(cg, preds, units)
+        chunk[np.isinf(dist)] = _inf
+        lengths[start:start + len(dist)] = chunk[:, targets]
+        if passages:
+            masks[start:start + len(dist)] = _tree_passages(cg, preds)[:, targets]
+        kept.append(preds)
+    return lengths, masks, kept
+
+
+def _chain_matrix(M, origin_nodes, destination_nodes, units, speed_knot, restrictions, return_paths, use_scipy):
+    """`route_matrix` of a compacted network, whose points may snap to the intermediate nodes of its chains"""
+    from .compact import chain_table
+
+    sources = list(dict.fromkeys(origin_nodes))
+    row_of = {node: r for r, node in enumerate(sources)}
+    rows = [row_of[node] for node in origin_nodes]
+    _, table, _, route = chain_table(M, sources, destination_nodes, units, restrictions, paths=return_paths,
+                                     use_scipy=use_scipy)
+    distances = table[rows]
+    durations = distances / (speed_knot * speed_coef(units)) if speed_knot > 0 else np.zeros_like(distances)
+    if not return_paths:
+        return RouteMatrix(distances, durations, units, origin_nodes, destination_nodes)
+    return RouteMatrix(distances, durations, units, origin_nodes, destination_nodes, expand=M.expand_path,
+                       route=lambda i, j: route(rows[i], j))
+
+
+def route_matrix(M, origins, destinations, units='km', speed_knot=24, restrictions=None,
+                 return_paths=False, use_scipy=None):
+    """
+    See `searoute.searoute_matrix`, `M` is the Marnet to route on.
+    """
+    if restrictions is None:
+        restrictions = M.restrictions
+    cg = compiled_image(M)
+    names = cg.node_names()
+    name_to_idx = cg.node_index()
+
+    # every distinct point is snapped once
+    distinct = list(dict.fromkeys(tuple(point) for point in list(origins) + list(destinations)))
+    snapped = dict(zip(distinct, M.snap_many(distinct)))
+    origin_nodes = [snapped[tuple(p)] for p in origins]
+    destination_nodes = [snapped[tuple(p)] for p in destinations]
+
+    if getattr(M, 'chains', None) is not None:
+        return _chain_matrix(M, origin_nodes, destination_nodes, units, speed_knot, restrictions, return_paths,
+                             use_scipy)
+
+    # one search per distinct origin node
+    sources = list(dict.fromkeys(name_to_idx[n] for n in origin_nodes))
+    row_of = {s: r for r, s in enumerate(sources)}
+    rows = np.array([row_of[name_to_idx[n]] for n in origin_nodes], dtype=np.intp)
+    cols = [name_to_idx[n] for n in destination_nodes]
+
+    table, _, kept = node_table(cg, sources, cols, units, restrictions, use_scipy=use_scipy)
+    distances = table[rows]
+    durations = distances / (speed_knot * speed_coef(units)) if speed_knot > 0 else np.zeros_like(distances)
+
+    if not return_paths:
+        return RouteMatrix(distances, durations, units, origin_nodes, destination_nodes)
+    preds = np.concatenate(kept) if kept else None
+    return RouteMatrix(distances, durations, units, origin_nodes, destination_nodes, names, preds, rows,
+                       M.expand_path)
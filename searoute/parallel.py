@@ -0,0 +1,213 @@
+"""
+Parallel batch routing on a pool of worker processes or threads.
+
+Threads share the networks of the caller: routing passes restrictions per call
+and does not write to the networks. Searches hold the GIL on every backend
+(networkx, csr, and igraph whose C calls do not release it), so threads suit
+routing next to I/O or free-threaded Python builds; CPU-bound batches need processes.
+
+Worker processes do not build their own networks:
+
+- with the `fork` start method (default where available), the networks loaded in
+  the parent are inherited by the workers. `gc.freeze()` moves them out of the
+  garbage collector so that their memory pages stay shared (copy-on-write).
+- with `spawn`/`forkserver`, every worker attaches to the compiled image of the
+  network (`searoute.compiled`); with the `csr` backend the arrays are a read-only
+  memory map of the file, shared by all workers through the page cache.
+"""
+import gc
+import multiprocessing
+import os
+
+# networks and parameters of a worker process, set by `_init_worker`
+_STATE = {}
+
+DEFAULT_CHUNKSIZE = 256
+
+
+def _network_spec(G, backend):
+    """how a spawned worker gets the network `G`: attached again from its compiled image when it has one, otherwise pickled"""
+    if G is None:
+        return None
+    cg = getattr(G, '_compiled', None)
+    path = getattr(cg, 'path', None) if cg is not None else None
+    if path is None:
+        return ('graph', G)
+    return ('image', path, getattr(G, '_backend', None) or backend)
+
+
+def _attach(spec, network_class):
+    if spec is None:
+        return None
+    if spec[0] == 'graph':
+        return spec[1]
+    from .compiled import from_compiled
+    _, path, backend = spec
+    return from_compiled(network_class(backend=backend), path)
+
+
+def _init_worker(marnet, ports, backend, params):
+    from .searoute import get_graphs
+    from .classes.marnet import Marnet
+    from .classes.ports import Ports
+
+    M, P = get_graphs(_attach(marnet, Marnet), _attach(ports, Ports), backend, params.get('include_ports', False))
+    _STATE.update(M=M, P=P, params=params)
+
+
+def _route_chunk(chunk, state=_STATE):
+    from .searoute import searoute_many
+
+    start, pairs = chunk
+    return start, searoute_many(pairs, M=state['M'], P=state['P'], **state['params'])
+
+
+def _threaded(chunks, processes, ordered, state):
+    """thread pool routing the chunks, with an iterator of their (start, results)"""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    executor = ThreadPoolExecutor(processes)
+    futures = [executor.submit(_route_chunk, chunk, state) for chunk in chunks]
+    if ordered:
+        return executor, (future.result() for future in futures)
+    return executor, (future.result() for future in as_completed(futures))
+
+
+def _pooled(ctx, processes, initargs, chunks, ordered):
+    """pool of worker processes routing the chunks, with an iterator of their (start, results)"""
+    pool = _start_pool(ctx, processes, initargs)
+    if ordered:
+        return pool, pool.imap(_route_chunk, chunks)
+    return pool, pool.imap_unordered(_route_chunk, chunks)
+
+
+def _start_pool(ctx, processes, initargs):
+    if ctx.get_start_method() != 'fork':
+        return ctx.Pool(processes, initializer=_init_worker, initargs=initargs)
+
+    # frozen objects are ignored by the collector of the workers, which would
+    # otherwise write to all their pages and copy them ; the workers are forked
+    # when the pool starts, the parent does not need them frozen afterwards
+    gc.collect()
+    gc.freeze()
+    try:
+        return ctx.Pool(processes, initializer=_init_worker, initargs=initargs)
+    finally:
+        gc.unfreeze()
+
+
+def _results(chunks, ordered):
+    for start, results in chunks:
+        if ordered:
+            yield from results
+        else:
+            yield from enumerate(results, start)
+
+
+class ParallelRoutes:
+    """
+    Iterator of the results of `searoute_parallel`, owning the pool that computes them.
+
+    The pool is started by `searoute_parallel` and stopped when the results are exhausted,
+    on `close()` or when leaving a `with` block ; workers still routing are terminated
+    (threads finish their current chunk, the chunks not started are cancelled).
+    """
+
+    def __init__(self, pool, chunks, ordered):
+        self._pool = pool
+        self._results = _results(chunks, ordered)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._results)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        self._results.close()
+        if hasattr(pool, 'terminate'):
+            pool.terminate()
+            pool.join()
+        else:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+def searoute_parallel(pairs, processes=None, chunksize=DEFAULT_CHUNKSIZE, ordered=True, start_method=None,
+                      M=None, P=None, backend="networkx", mode="process", **params):
+    """
+    Sea routes of many origin and destination pairs on a pool of worker processes
+    (or threads), see `searoute_many`.
+
+    Parameters
+    ----------
+    pairs : list of (origin, destination) or (origin, destination, restrictions)
+    processes : int, number of workers, default None which means `os.cpu_count()`
+    chunksize : int, default 256 ; pairs sent to a worker at once
+    ordered : boolean, default True ; yields the results in the order of `pairs`,
+        otherwise yields (index, result) as the chunks complete
+    start_method : `fork`, `spawn` or `forkserver`, default None which means `fork` when available
+    M, P, backend : networks to route on, see `searoute()` ; with `spawn`, networks loaded from a compiled
+        image are attached again by every worker (in place with `csr`), others are pickled once per worker
+    mode : `process` (default) or `thread` ; threads share `M` and `P`, see the module notes about the GIL
+    params : other parameters of `searoute()`, common to every pair
+
+    Returns
+    -------
+    a `ParallelRoutes` iterator of the `searoute()` results, or (index, result) when not `ordered` ;
+    the arguments are checked, the networks loaded and the pool started when called, the pool is stopped
+    once the results are exhausted: iterate to the end, call `close()` or use it in a `with` block
+
+    Examples
+    --------
+    >>> for route in sr.searoute_parallel(pairs, processes=8, units='naut'):
+    ...     print(route.properties['length'])
+    >>> with sr.searoute_parallel(pairs, processes=8) as routes:
+    ...     first = next(routes)
+    """
+    from .searoute import get_graphs
+
+    if mode not in ('process', 'thread'):
+        raise ValueError(f"Unknown mode '{mode}', use 'process' or 'thread'")
+    if processes is not None and processes < 1:
+        raise ValueError('processes must be at least 1')
+    if chunksize < 1:
+        raise ValueError('chunksize must be at least 1')
+
+    pairs = list(pairs)
+    chunks = [(start, pairs[start:start + chunksize]) for start in range(0, len(pairs), chunksize)]
+    include_ports = params.get('include_ports', False)
+
+    if mode == 'thread':
+        M, P = get_graphs(M, P, backend, include_ports)
+        state = {'M': M, 'P': P, 'params': params}
+        return ParallelRoutes(*_threaded(chunks, processes or os.cpu_count() or 1, ordered, state), ordered)
+
+    if start_method is None:
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    ctx = multiprocessing.get_context(start_method)
+    processes = min(processes or os.cpu_count() or 1, max(len(chunks), 1))
+
+    if start_method == 'fork':
+        # the workers inherit the networks, their arguments are not pickled
+        M, P = get_graphs(M, P, backend, include_ports)
+        initargs = (('graph', M), ('graph', P) if P is not None else None, backend, params)
+    else:
+        initargs = (_network_spec(M, backend), _network_spec(P, backend), backend, params)
+
+    return ParallelRoutes(*_pooled(ctx, processes, initargs, chunks, ordered), ordered)
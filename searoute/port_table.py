@@ -0,0 +1,254 @@
+"""
+Precomputed network distances between ports.
+
+A port table holds the route length, as `searoute()` reports it, between every
+pair of a set of ports (by default the terminal ports) for a few restriction
+sets, so that port to port distances are a lookup. Pairs or restriction sets
+that are not in the table are routed live.
+
+Tables are stored as compiled images (see `searoute.compiled`), memory-mapped when read:
+
+- ``coords``        : float64 (n, 2) port coordinates (lon, lat)
+- ``distances``     : float32 (S, n * (n - 1) / 2) upper triangle of the distance matrix
+  in km, `inf` when there is no route, for each of the S restriction sets of the header
+- ``passage_masks`` : uint32 (S, n * (n - 1) / 2) bitmask of the passages traversed,
+  bit `i` for the passage `passages[i]` of the header (optional)
+"""
+import numpy as np
+
+from .classes.passages import Passage
+from .compiled import CompiledGraph, compiled_image, read_compiled, write_compiled
+from .compact import chain_table
+from .matrix import node_table
+from .utils import conversions
+
+
+DEFAULT_RESTRICTION_SETS = ([Passage.northwest], [Passage.northwest, Passage.suez], [Passage.northwest, Passage.panama])
+
+
+def _port_codes(P):
+    """{port code: node} of a Ports network, the first node of a code is kept"""
+    codes = {}
+    for node, data in P.nodes(data=True):
+        if data.get('port'):
+            codes.setdefault(data['port'], node)
+    return codes
+
+
+class PortTable:
+    """
+    Distances between ports, see `build_port_table`.
+
+    Ports are given by their code (`port` attribute, e.g. 'FRLEH') or their (lon, lat) node.
+
+    Parameters
+    ----------
+    cg : `searoute.compiled.CompiledGraph` of kind `port_table`
+    M : Marnet network to route the pairs that are not in the table, default None which means the default one
+    P : Ports network to find the ports that are not in the table, default None which means the default one
+    """
+
+    def __init__(self, cg, M=None, P=None):
+        self.cg = cg
+        self.M = M
+        self.P = P
+        self.ports = cg.header['ports']
+        self.nodes = cg.node_names()
+        self.restriction_sets = [frozenset(r) for r in cg.header['restrictions']]
+
+        self._index = {}
+        for i, (code, node) in enumerate(zip(self.ports, self.nodes)):
+            self._index.setdefault(node, i)
+            if code:
+                self._index.setdefault(code, i)
+        self._sets = {r: s for s, r in enumerate(self.restriction_sets)}
+        self._distances = cg['distances']
+        self._masks = cg['passage_masks'] if 'passage_masks' in cg else None
+        self._codes = None
+
+    @classmethod
+    def load(cls, file_name, mmap=True, M=None, P=None):
+        """Reads a table written by `save`, memory-mapped by default"""
+        cg = read_compiled(file_name, mmap=mmap)
+        if cg.kind != 'port_table':
+            raise ValueError(f'{file_name} is not a port table')
+        return cls(cg, M, P)
+
+    def save(self, file_name):
+        write_compiled(self.cg, file_name)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, port):
+        return self._key(port) in self._index
+
+    @staticmethod
+    def _key(port):
+        return port if isinstance(port, str) else tuple(port)
+
+    def _lookup(self, origin, destination, restrictions):
+        """(restriction set index, pair index or -1 for the same port) in the table, or None"""
+        s = self._sets.get(frozenset(restrictions or ()))
+        i = self._index.get(self._key(origin))
+        j = self._index.get(self._key(destination))
+        if s is None or i is None or j is None:
+            return None
+        if i == j:
+            return s, -1
+        if i > j:
+            i, j = j, i
+        n = len(self.nodes)
+        return s, i * (2 * n - i - 1) // 2 + j - i - 1
+
+    def _coords(self, port):
+        """(lon, lat) of a port, for live routing"""
+        key = self._key(port)
+        i = self._index.get(key)
+        if i is not None:
+            return self.nodes[i]
+        if not isinstance(key, str):
+            return key
+        if self._codes is None:
+            from .searoute import setup_P
+            self._codes = _port_codes(self.P if self.P is not None else setup_P())
+        if key not in self._codes:
+            raise KeyError(f'Unknown port {key}')
+        return self._codes[key]
+
+    def _restrictions(self, restrictions):
+        """`restrictions`, the ones of the Marnet when None as `searoute()` does"""
+        if restrictions is None:
+            from .searoute import setup_M
+            restrictions = (self.M if self.M is not None else setup_M()).restrictions
+        return restrictions
+
+    def _route(self, origin, destination, units, restrictions, return_passages=False):
+        from .searoute import searoute
+        return searoute(self._coords(origin), self._coords(destination), units=units,
+                        restrictions=list(restrictions or []), M=self.M, return_passages=return_passages)
+
+    def distance(self, origin, destination, units='km', restrictions=[Passage.northwest]):
+        """
+        Route length between two ports in `units`, `inf` when there is no route.
+        Routed live when the pair or the restriction set is not in the table.
+        """
+        restrictions = self._restrictions(restrictions)
+        found = self._lookup(origin, destination, restrictions)
+        if found is None:
+            return self._route(origin, destination, units, restrictions).properties['length']
+
+        s, ix = found
+        if ix < 0:
+            return 0.0
+        length = float(self._distances[s, ix])
+        return length if units == 'km' else length * conversions[units] / conversions['km']
+
+    def passages(self, origin, destination, restrictions=[Passage.northwest]):
+        """
+        Passages traversed between two ports, as `searoute(..., return_passages=True)` reports them.
+        Routed live when the pair, the restriction set or the passages are not in the table.
+        """
+        restrictions = self._restrictions(restrictions)
+        found = self._lookup(origin, destination, restrictions) if self._masks is not None else None
+        if found is None:
+            return self._route(origin, destination, 'km', restrictions, True).properties['traversed_passages']
+
+        s, ix = found
+        mask = int(self._masks[s, ix]) if ix >= 0 else 0
+        return Passage.filter_valid_passages(p for b, p in enumerate(self.cg.passages) if mask >> b & 1)
+
+    def route(self, origin, destination, units='km', restrictions=[Passage.northwest], return_passages=False):
+        """GeoJSON Feature of the route between two ports, always routed live (see `searoute.searoute`)"""
+        return self._route(origin, destination, units, self._restrictions(restrictions), return_passages)
+
+
+def build_port_table(ports=None, P=None, M=None, restriction_sets=DEFAULT_RESTRICTION_SETS, passages=True, use_scipy=None):
+    """
+    Computes the distances between every pair of ports.
+
+    Parameters
+    ----------
+    ports : list of port codes or (lon, lat) nodes of `P`, default None which means the terminal ports
+    P : Ports network, default None which means the default one
+    M : Marnet network, default None which means the default one
+    restriction_sets : list of lists of passages, a table is computed for each ; None means the restrictions of `M`
+    passages : boolean, default True ; stores the passages traversed by every route
+    use_scipy : boolean, default None which means when installed
+
+    Returns
+    -------
+    PortTable
+
+    Examples
+    --------
+    >>> table = build_port_table()
+    >>> table.save('terminals.srg')
+    >>> PortTable.load('terminals.srg').distance('FRLEH', 'CNSHA', units='naut')
+    """
+    from .searoute import setup_M, setup_P
+
+    P = P if P is not None else setup_P()
+    M = M if M is not None else setup_M()
+
+    if ports is None:
+        nodes = [node for node, data in P.nodes(data=True) if data.get('t') == True]
+    else:
+        codes = _port_codes(P)
+        nodes = []
+        for port in ports:
+            if isinstance(port, str):
+                if port not in codes:
+                    raise KeyError(f'Unknown port {port}')
+                nodes.append(codes[port])
+            else:
+                nodes.append(tuple(port))
+    nodes = list(dict.fromkeys(nodes))
+    node_attrs = dict(P.nodes(data=True))
+    port_codes = [node_attrs.get(node, {}).get('port') for node in nodes]
+
+    # ports are routed from the Marnet nodes they snap to, as `searoute()` does
+    cg = compiled_image(M)
+    name_to_idx = cg.node_index()
+    snapped = M.snap_many(nodes)
+    chained = getattr(M, 'chains', None) is not None
+    # nodes of a compacted network may be intermediate nodes of its chains, searched from their names
+    targets = snapped if chained else [name_to_idx[node] for node in snapped]
+    sources = list(dict.fromkeys(targets))
+    row_of = {s: r for r, s in enumerate(sources)}
+    rows = np.array([row_of[t] for t in targets], dtype=np.intp)
+
+    n = len(nodes)
+    tri_i, tri_j = np.triu_indices(n, 1)
+    sets = [sorted(set(r if r is not None else M.restrictions)) for r in restriction_sets]
+    distances = np.empty((len(sets), len(tri_i)), dtype=np.float32)
+    masks = np.empty((len(sets), len(tri_i)), dtype=np.uint32) if passages else None
+
+    for s, restrictions in enumerate(sets):
+        if chained:
+            _, lengths, pair_masks, _ = chain_table(M, sources, targets, 'km', restrictions, passages,
+                                                    use_scipy=use_scipy)
+        else:
+            lengths, pair_masks, _ = node_table(cg, sources, targets, 'km', restrictions, passages, use_scipy)
+        distances[s] = lengths[rows[tri_i], tri_j]
+        if passages:
+            masks[s] = pair_masks[rows[tri_i], tri_j]
+
+    arrays = {'coords': np.array(nodes, dtype=np.float64).reshape(n, 2), 'distances': distances}
+    if passages:
+        arrays['passage_masks'] = masks
+    header = {
+        'kind': 'port_table',
+        'crs': M.graph.get('crs'),
+        'ports': port_codes,
+        'restrictions': sets,
+        'passages': cg.passages,
+        'meta': {},
+    }
+    return PortTable(CompiledGraph(arrays, header), M, P)
+
+
+if __name__ == '__main__':
+    import sys
+
+    build_port_table().save(sys.argv[1] if len(sys.argv) > 1 else 'port_table.srg')
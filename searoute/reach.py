@@ -0,0 +1,196 @@
+"""
+Reachability queries: what can be reached from a point within a sailing time.
+
+One single-source search bounded by the distance sailed in `max_hours` at
+`speed_knot` is run on the compiled arrays of the network
+(`searoute.compiled.compiled_image`). The search gives every reachable node,
+the ports reachable through them and, on demand, the isochrone: the parts of
+the network that can be sailed within the time.
+"""
+import weakref
+
+import numpy as np
+
+from .compiled import _VALUE, compiled_image
+from .matrix import _tree_lengths, shortest_path_trees
+from .utils import conversions, distance_length_array, distance_many, speed_coef
+
+
+# {Ports: (compiled image of the Marnet, port count, port coordinates, snapped nodes, their coordinates
+#          and indexes, port attributes)}
+_PORT_NODES = weakref.WeakKeyDictionary()
+
+
+def _port_nodes(M, P, cg):
+    """
+    coordinates, Marnet nodes (list, array of coordinates and of indexes, -1 for the intermediate nodes
+    of the chains of a compacted network) and attributes of the ports of `P`, snapped once per network
+    """
+    cached = _PORT_NODES.get(P)
+    if cached is not None and cached[0] is cg and cached[1] == len(P):
+        return cached[2:]
+
+    name_to_idx = cg.node_index()
+    ports = list(P.nodes(data=True))
+    coords = np.array([node for node, _ in ports], dtype=np.float64).reshape(len(ports), 2)
+    nodes = M.snap_many([node for node, _ in ports])
+    node_coords = np.array(nodes, dtype=np.float64).reshape(len(ports), 2)
+    indexes = np.array([name_to_idx.get(node, -1) for node in nodes], dtype=np.intp)
+    attrs = [data for _, data in ports]
+    _PORT_NODES[P] = (cg, len(P), coords, nodes, node_coords, indexes, attrs)
+    return coords, nodes, node_coords, indexes, attrs
+
+
+class Reachability:
+    """
+    Result of `searoute.reachable_within`.
+
+    Attributes
+    ----------
+    nodes : list of the reachable Marnet nodes (lon, lat), the nearest first
+    lengths : numpy array of their route lengths in `units`, as `searoute()` reports them
+    hours : numpy array of their sailing time at `speed_knot`
+    ports : list of the reachable ports, their attributes with `length` and `duration_hours`, the nearest first
+    origin_node : the Marnet node the origin was snapped to
+    """
+
+    def __init__(self, cg, origin_node, reached, lengths, speed_knot, max_hours, units, restrictions, ports,
+                 chains=None):
+        self._cg = cg
+        self._chains = chains
+        self._reached = reached
+        self._restrictions = restrictions
+        self.origin_node = origin_node
+        names = cg.node_names()
+        self.nodes = [names[ix] for ix in reached.tolist()]
+        self.lengths = lengths
+        self.hours = lengths / (speed_knot * speed_coef(units))
+        self.speed_knot = speed_knot
+        self.max_hours = max_hours
+        self.units = units
+        self.ports = ports
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def _chain_coords(self, chain, start):
+        nodes = self._chains.nodes(chain, tuple(start.tolist()))
+        return np.array(nodes, dtype=np.float64).reshape(-1, 2)
+
+    def isochrone(self):
+        """
+        GeoJSON Feature (MultiLineString) of the network that can be sailed within `max_hours`:
+        the edges between reachable nodes, cut where the time runs out
+        """
+        from geojson import Feature, MultiLineString
+
+        cg = self._cg
+        # the chain of the origin on a compacted network, sailed from the origin too
+        found = self._chains.locate(self.origin_node) if self._chains is not None else None
+        origin_chain = found[0] if found is not None else -1
+        n = cg.node_count
+        coords = np.asarray(cg['coords'], dtype=np.float64)
+        budget = self.max_hours * self.speed_knot * speed_coef(self.units)
+        length = np.full(n, np.inf)
+        length[self._reached] = self.lengths
+
+        u = np.repeat(np.arange(n), np.diff(cg['indptr']))
+        v = np.asarray(cg['indices'], dtype=np.intp)
+        blocked = [i for i, p in enumerate(cg.passages) if p in (self._restrictions or ())]
+        keep = (u < v) & ~np.isin(cg['passages'], blocked) & (np.isfinite(length[u]) | np.isfinite(length[v]))
+        if origin_chain >= 0:
+            keep |= ((u < v) & ~np.isin(cg['passages'], blocked) & (cg['edge/chain/state'] == _VALUE)
+                     & (cg['edge/chain/data'] == origin_chain))
+        starts, ends = coords[u[keep]], coords[v[keep]]
+        at_start, at_end = length[u[keep]], length[v[keep]]
+
+        if self._chains is not None and 'edge/chain/data' in cg:
+            # chains of a compacted network are cut along their intermediate nodes
+            chained = cg['edge/chain/state'][keep] == _VALUE
+            pieces = [(starts[~chained], ends[~chained], at_start[~chained], at_end[~chained])]
+            for k in np.flatnonzero(chained).tolist():
+                chain = int(cg['edge/chain/data'][keep][k])
+                line = np.concatenate([starts[k:k + 1], self._chain_coords(chain, starts[k]), ends[k:k + 1]])
+                steps = distance_length_array(line, self.units)
+                along = np.concatenate([[0], np.cumsum(steps)])
+                # intermediate nodes are reached from either end of the chain
+                reach = np.minimum(at_start[k] + along, at_end[k] + along[-1] - along)
+                if chain == origin_chain:
+                    origin = np.flatnonzero((line == self.origin_node).all(axis=1))[0]
+                    reach = np.minimum(reach, np.abs(along - along[origin]))
+                pieces.append((line[:-1], line[1:], reach[:-1], reach[1:]))
+            starts, ends, at_start, at_end = (np.concatenate(a) for a in zip(*pieces))
+
+        edge = distance_many(starts, ends, self.units)
+        sailed = edge > 0
+        starts, ends, at_start, at_end, edge = (a[sailed] for a in (starts, ends, at_start, at_end, edge))
+
+        # share of the edge sailed from each end
+        from_start = np.clip((budget - at_start) / edge, 0, 1)
+        from_end = np.clip((budget - at_end) / edge, 0, 1)
+        whole = from_start + from_end >= 1
+
+        lines = [[a, b] for a, b in zip(starts[whole].tolist(), ends[whole].tolist())]
+        for a, b, share in ((starts, ends, from_start), (ends, starts, from_end)):
+            part = ~whole & (share > 0)
+            cut = a[part] + (b[part] - a[part]) * share[part, None]
+            lines.extend([start, end] for start, end in zip(a[part].tolist(), cut.tolist()))
+
+        return Feature(geometry=MultiLineString(lines), properties={
+            'max_hours': self.max_hours, 'speed_knot': self.speed_knot, 'units': self.units,
+            'origin_node': list(self.origin_node)})
+
+
+def reachable(M, origin, max_hours, speed_knot=24, restrictions=None, units='km', P=None, only_terminals=False,
+              use_scipy=None):
+    """
+    See `searoute.reachable_within`, `M` is the Marnet to search and `P` the Ports (None for no ports).
+    """
+    if speed_knot <= 0 or max_hours < 0:
+        raise ValueError('speed_knot must be positive and max_hours not negative')
+
+    if restrictions is None:
+        restrictions = M.restrictions
+    cg = compiled_image(M)
+    origin_node = M.snap(origin)
+    if P is not None:
+        port_coords, port_nodes, node_coords, port_ix, attrs = _port_nodes(M, P, cg)
+
+    budget = max_hours * speed_knot * speed_coef(units)
+    budget_km = budget * conversions['km'] / conversions[units]
+    # weights are rounded lengths (0.1 km), the search goes a bit farther than the budget
+    limit = budget_km * 1.01 + 1
+    if getattr(M, 'chains', None) is not None:
+        # nodes and ports of a compacted network, intermediate nodes of its chains included
+        from .compact import chain_table
+
+        targets = cg.node_names() + (port_nodes if P is not None else [])
+        dist, lengths, _, _ = chain_table(M, [origin_node], targets, units, restrictions, use_scipy=use_scipy,
+                                          limit=limit)
+        dist, lengths = dist[0], lengths[0]
+    else:
+        source = cg.node_index()[origin_node]
+        dist, preds = shortest_path_trees(cg, [source], restrictions, use_scipy, limit=limit)
+        dist, lengths = dist[0], _tree_lengths(cg, preds, units)[0]
+        if P is not None:
+            dist = np.concatenate([dist, dist[port_ix]])
+            lengths = np.concatenate([lengths, lengths[port_ix]])
+
+    n = cg.node_count
+    within = np.isfinite(dist) & (lengths <= budget)
+    reached = np.flatnonzero(within[:n])
+    reached = reached[np.argsort(lengths[reached], kind='stable')]
+
+    ports = []
+    if P is not None:
+        legs = distance_many(node_coords, port_coords, units)
+        port_lengths = np.where(within[n:], lengths[n:] + legs, np.inf)
+        found = np.flatnonzero(port_lengths <= budget)
+        if only_terminals:
+            found = found[np.array([attrs[i].get('t') == True for i in found.tolist()], dtype=bool)]
+        found = found[np.argsort(port_lengths[found], kind='stable')]
+        hours = port_lengths / (speed_knot * speed_coef(units))
+        ports = [dict(attrs[i], length=float(port_lengths[i]), duration_hours=float(hours[i])) for i in found.tolist()]
+
+    return Reachability(cg, origin_node, reached, lengths[reached], speed_knot, max_hours, units, restrictions, ports,
+                        getattr(M, 'chains', None))
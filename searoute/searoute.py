@@ -1,36 +1,50 @@
 
 from .classes import ports, marnet, passages 
 
-from .utils import get_duration, distance_length, from_nodes_edges_set, process_route, validate_lon_lat, raise_warn_no_path
-from geojson import Feature, LineString
+from .utils import get_duration, conversions, distance, distance_length_array, from_nodes_edges_set, normalize_linestring, process_route, validate_lon_lat, raise_warn_no_path
+from .data import MARNET_FILE, PORTS_FILE
 
+from copy import deepcopy
 from functools import lru_cache
+import os
 #from copy import copy
 
 
 @lru_cache(maxsize=None)
 def setup_P(backend = None):
+    if os.path.exists(PORTS_FILE):
+        from .compiled import from_compiled
+        return from_compiled(ports.Ports(backend = backend), PORTS_FILE)
+    # fallback on the python sources when the compiled image is not built
     from .data.ports_dict import edge_list as port_e, node_list as port_n
     return from_nodes_edges_set(ports.Ports(backend = backend), port_n, port_e)
 
 @lru_cache(maxsize=None)
 def setup_M(backend = None):
+    if os.path.exists(MARNET_FILE):
+        from .compiled import from_compiled
+        return from_compiled(marnet.Marnet(backend = backend), MARNET_FILE)
+    # fallback on the python sources when the compiled image is not built
     from .data.marnet_dict import edge_list as marnet_e, node_list as marnet_n
     return from_nodes_edges_set(marnet.Marnet(backend = backend), marnet_n, marnet_e)
 
 
 
-def get_graphs(M = None, P = None, backend = None):
+def get_graphs(M = None, P = None, backend = None, include_ports = True):
+    """
+    Returns the Marnet and Ports networks, the default ones are built on first use.
+    Ports is not built when `include_ports` is False (P is returned as given).
+    """
     if M is None:
         M = setup_M(backend)#copy(setup_M())
 
-    if P is None:
+    if P is None and include_ports:
         P = setup_P(backend)#copy(setup_P())
 
     return M, P
 
 
-def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=False, restrictions=[passages.Passage.northwest], include_ports=False, port_params={}, M:marnet.Marnet=None, P:ports.Ports=None, return_passages:bool = False, algorithm = None, backend="networkx"):
+def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=False, restrictions=[passages.Passage.northwest], include_ports=False, port_params={}, M:marnet.Marnet=None, P:ports.Ports=None, return_passages:bool = False, algorithm = None, backend="networkx", waypoints=None, via_passages=None):
     """
     Calculates the shortest sea route between two points on Earth.
 
@@ -56,19 +70,23 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
                             If there are many ports then the result will be a list of GeoJson Features, instead of an object of GeoJson Feature.
                             Preferred ports with share = 0 will be ignored.
     return_passages : boolean to return traversed passages (default is `False`)
-    algorithm : str one of `dijkstra` or `astar`, default `dijkstra`
-    backend : str one of `networkx` or `igraph`, default `networkx` chose between backend graph class
+    algorithm : str one of `dijkstra`, `astar`, `alt` (A* with landmarks) or `ch` (contraction hierarchy), both precomputed for the default Marnet, default `dijkstra`
+    backend : str one of `networkx`, `igraph` or `csr`, default `networkx` chose between backend graph class
+    waypoints : list of points (lon, lat) or passage names to go through in order, default None ;
+        all legs are routed at once (`algorithm` is not used) and passages are crossed even when in `restrictions`
+    via_passages : list of passages to cross in order, default None ; same as `waypoints` with passage names only
 
     Returns
     -------
-    a Feature (geojson) of a LineString of sea route with parameters : `unit` and `length`, `duration_hours` or port details, others
+    a Feature (geojson) of a LineString of sea route with parameters : `unit` and `length`, `duration_hours` or port details, others ;
+    with `waypoints` or `via_passages`, `legs` lists the `from`, `to`, `length` and `duration_hours` (and `traversed_passages`) of every leg
     """
 
     #if M is None:
     #    M = copy(setup_M())
     #if P is None:
     #    P = copy(setup_P())
-    M, P = get_graphs(M, P, backend)
+    M, P = get_graphs(M, P, backend, include_ports)
 
     # Validate origin input
     validate_lon_lat(origin)
@@ -76,75 +94,209 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
     validate_lon_lat(destination)
 
 
-    if P is None:
+    if P is None and include_ports:
         raise Exception('Ports network must not be None')
 
     if M is None:
         raise Exception('Marnet network must not be None')
 
-    o_origin = tuple(origin)
-    o_destination = tuple(destination)
+    waypoints = _validate_waypoints(waypoints, via_passages)
 
-    # updating restrictions
-    if restrictions is not None:
-        M.restrictions = restrictions
+    # restrictions are passed per call, `M` may be shared between threads
+    return _searoute_features(M, P, origin, destination, units, speed_knot, append_orig_dest, restrictions,
+                              include_ports, port_params, return_passages, algorithm, waypoints=waypoints)
 
-    if include_ports:
-        if not port_params:
-            port_params = {}
 
-        port_matrix = P.get_selected_port_matrix(origin, destination, port_params)
-    else:
-        port_matrix = [(None, None)]
+def _validate_waypoints(waypoints, via_passages):
+    """the stops of a route, `waypoints` or `via_passages`, with their points validated"""
+    if waypoints is not None and via_passages is not None:
+        raise ValueError("Use either waypoints or via_passages, waypoints can mix points and passage names")
+    waypoints = via_passages if via_passages is not None else waypoints
+    for waypoint in waypoints or ():
+        if not isinstance(waypoint, str):
+            validate_lon_lat(waypoint)
+    return waypoints
 
 
-    def _get_feature(o_origin, o_destination, origin, destination, port_origin, port_dest, include_ports, append_orig_dest, algorithm):
+def _route_feature(M, o_origin, o_destination, origin, destination, port_origin, port_dest, units, speed_knot,
+                   include_ports, append_orig_dest, return_passages, restrictions, algorithm, snapped=None,
+                   waypoints=None):
+    """
+    Feature of the route between `origin` and `destination` on `M` avoiding `restrictions` (None for
+    the ones of `M`), `snapped` the (origin, destination) Marnet nodes when they are known already,
+    through `waypoints` when given
+    """
+    # Get shortest route from the Marnet network 
+    # if origin or destination is not present in M, searches from the closest one
+    # if path is restricted then returns the next shortest possible one
+    # if no paths are found due to restricted passages, length will be inf 
+    ends = None
+    if waypoints:
+        length_km, shortest_route_by_distance, ends = M.via_shortest_path(origin, destination, waypoints,
+                                                                          restrictions)
+    elif snapped is not None:
+        length_km, shortest_route_by_distance = M.node_shortest_path(*snapped, algorithm, restrictions)
+    else:
+        length_km, shortest_route_by_distance = M.shortest_path(origin, destination, algorithm, restrictions)
 
-        # Get shortest route from the Marnet network 
-        # if origin or destination is not present in M, searches from the closest one
-        # if path is restricted then returns the next shortest possible one
-        # if no paths are found due to restricted passages, length will be inf 
-        length_km, shortest_route_by_distance = M.shortest_path(origin, destination, algorithm)
+    return _path_feature(M, shortest_route_by_distance, length_km, o_origin, o_destination, origin, destination,
+                         port_origin, port_dest, units, speed_knot, include_ports, append_orig_dest,
+                         return_passages, restrictions, ends, waypoints)
 
-        # route path will be set to empty if length is inf due to restrictive passages
-        if shortest_route_by_distance is None or length_km == float('inf'):
-            # raise warning as no path found
-            raise_warn_no_path(origin, destination, length_km, restrictions)
-            shortest_route_by_distance = []
-            
-        if include_ports and shortest_route_by_distance:
-            shortest_route_by_distance.insert(0, origin )
-            shortest_route_by_distance.append(destination )
 
-        if append_orig_dest:
-            if (origin != o_origin):
-                shortest_route_by_distance.insert(0, o_origin)
-            if (destination != o_destination):
-                shortest_route_by_distance.append(o_destination)
+def _path_feature(M, shortest_route_by_distance, length_km, o_origin, o_destination, origin, destination,
+                  port_origin, port_dest, units, speed_knot, include_ports, append_orig_dest,
+                  return_passages, restrictions, ends=None, waypoints=None):
+    """
+    Feature of a route found on `M` (list of nodes, `length_km` inf when there is no route),
+    with the `legs` of the route ending at the path indexes `ends` when there are waypoints
+    """
+    from geojson import Feature, LineString
+
+    # routes of a compacted network get the nodes of their chains back
+    if shortest_route_by_distance and length_km != float('inf'):
+        if ends is not None:
+            shortest_route_by_distance, ends = M.expand_path(shortest_route_by_distance, ends)
+        else:
+            shortest_route_by_distance = M.expand_path(shortest_route_by_distance)
+
+    # route path will be set to empty if length is inf due to restrictive passages
+    if shortest_route_by_distance is None or length_km == float('inf'):
+        # raise warning as no path found
+        raise_warn_no_path(origin, destination, length_km, restrictions)
+        shortest_route_by_distance = []
+        ends = []
+        
+    # points added before the path shift the ends of its legs
+    offset = 0
+    if include_ports and shortest_route_by_distance:
+        shortest_route_by_distance.insert(0, origin )
+        shortest_route_by_distance.append(destination )
+        offset += 1
+
+    if append_orig_dest:
+        if (origin != o_origin):
+            shortest_route_by_distance.insert(0, o_origin)
+            offset += 1
+        if (destination != o_destination):
+            shortest_route_by_distance.append(o_destination)
+
+    # normalized coords, length and passages of every hop of the route
+    ls, hops, hop_passages = _route_hops(M, shortest_route_by_distance, return_passages)
+
+    # (re-)calculate length and duration
+    total_length = float(hops.sum()) * conversions[units]
+    duration = get_duration(speed_knot, total_length, units)
+
+
+    # create Feature with LineSting and calculated parameters
+    feature = Feature(geometry=LineString(ls), properties={
+                    'length': total_length, 'units': units, 'duration_hours': duration})
+
+    if include_ports and port_origin and port_dest:
+        feature.properties['port_origin'] = port_origin
+        feature.properties['port_dest'] = port_dest
+    
+    # add traversed passages if included in parameters
+    if return_passages:
+        feature.properties['traversed_passages'] = passages.Passage.filter_valid_passages(
+            [p for p in hop_passages if p])
 
-        # processes passages : checks and normalizes the coords
-        ls, traversed_passages = process_route(shortest_route_by_distance, M, return_passages)
+    if waypoints:
+        feature.properties['legs'] = _legs(shortest_route_by_distance, hops, hop_passages, ends, offset, o_origin,
+                                           o_destination, waypoints, units, speed_knot)
 
-        # (re-)calculate length and duration
-        # (optional) length can use the provided one by shortest_path which should be normalized
-        total_length = distance_length(ls, units=units)
-        duration = get_duration(speed_knot, total_length, units)
+    return feature
 
 
-        # create Feature with LineSting and calculated parameters
-        feature = Feature(geometry=LineString(ls), properties={
-                        'length': total_length, 'units': units, 'duration_hours': duration})
+def _legs(route, hops, hop_passages, ends, offset, o_origin, o_destination, waypoints, units, speed_knot):
+    """
+    properties of the legs of a route through waypoints (`hops` and `hop_passages` as `_route_hops` returns them),
+    `ends` the indexes of their last node in the path found (`offset` nodes were added before it) ;
+    the last leg goes to the end of `route`
+    """
+    stops = [list(o_origin)] + [w if isinstance(w, str) else list(w) for w in waypoints] + [list(o_destination)]
+    bounds = [0] + [end + offset for end in ends[:-1]] + [len(route) - 1]
+    if not ends:
+        # no route
+        bounds = [0] * (len(stops) - 1) + [0]
+
+    legs = []
+    for i in range(len(stops) - 1):
+        start, end = bounds[i], bounds[i + 1]
+        length = float(hops[start:end].sum()) * conversions[units]
+        leg = {'from': stops[i], 'to': stops[i + 1], 'length': length,
+               'duration_hours': get_duration(speed_knot, length, units)}
+        if hop_passages is not None:
+            leg['traversed_passages'] = passages.Passage.filter_valid_passages(
+                [p for p in hop_passages[start:end] if p])
+        legs.append(leg)
+    return legs
+
+
+def _route_hops(M, route, return_passages=False):
+    """
+    Normalized LineString coordinates of `route` (as `process_route`), the great circle length in metres
+    of each of its hops (numpy array) and their passages (None unless `return_passages`).
 
-        if include_ports and port_origin and port_dest:
-            feature.properties['port_origin'] = port_origin
-            feature.properties['port_dest'] = port_dest
-        
-        # add traversed passages if included in parameters
+    Hops along edges are read from the edge arrays of the compiled image of `M` when it has one,
+    the other hops (to the ports or the points added to the route) are computed.
+    """
+    import numpy as np
+
+    cg = getattr(M, '_compiled', None)
+    if cg is None or getattr(M, 'chains', None) is not None or len(route) < 2:
+        ls, _ = process_route(route, M)
+        hops = distance_length_array(ls, 'm')
+        hop_passages = None
         if return_passages:
-            feature.properties['traversed_passages'] = passages.Passage.filter_valid_passages(traversed_passages)
+            hop_passages = [(M.get_edge_data(u, v) or {}).get('passage') for u, v in zip(route, route[1:])]
+        return ls, hops, hop_passages
+
+    index = cg.node_index()
+    nodes = np.array([index.get(tuple(node), -1) for node in route], dtype=np.int64)
+    eids = cg.edge_ids(nodes[:-1], nodes[1:])
+    on_edge = eids >= 0
+    hops = np.zeros(len(eids))
+    hops[on_edge] = cg.edge_lengths()[eids[on_edge]]
+    shifts = np.zeros(len(eids))
+    shifts[on_edge] = cg.edge_shifts()[eids[on_edge]]
+    for i in np.flatnonzero(~on_edge).tolist():
+        hops[i] = distance(route[i], route[i + 1], 'm')
+        shifts[i] = normalize_linestring(route[i], route[i + 1])[0] - route[i + 1][0]
+
+    offsets = np.concatenate([[0.0], np.cumsum(shifts)])
+    if np.abs(offsets).max() > 360:
+        # the route goes around the world, longitudes are only shifted once
+        ls, _ = process_route(route, M)
+    else:
+        coords = np.array(route, dtype=np.float64)
+        ls = [route[0]] + list(zip((coords[1:, 0] + offsets[1:]).tolist(), coords[1:, 1].tolist()))
+
+    hop_passages = None
+    if return_passages:
+        names = cg.passages
+        codes = np.where(on_edge, cg['passages'][eids], -1).tolist()
+        hop_passages = [names[code] if code >= 0 else None for code in codes]
+    return ls, hops, hop_passages
+
+
+def _searoute_features(M, P, origin, destination, units, speed_knot, append_orig_dest, restrictions,
+                       include_ports, port_params, return_passages, algorithm, snapped=None, waypoints=None):
+    """
+    `searoute()` once the inputs are validated
+    """
+    o_origin = tuple(origin)
+    o_destination = tuple(destination)
+
+    if include_ports:
+        if not port_params:
+            port_params = {}
+
+        port_matrix = P.get_selected_port_matrix(origin, destination, port_params)
+    else:
+        port_matrix = [(None, None)]
 
-        return feature
-    
     result = []
     for p_m in port_matrix:
         pFrom, pTo = p_m
@@ -160,7 +312,9 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
             pProp['share'] = share
             pTo = pProp
 
-        res = _get_feature(o_origin, o_destination, origin, destination, pFrom, pTo, include_ports, append_orig_dest, algorithm)
+        res = _route_feature(M, o_origin, o_destination, origin, destination, pFrom, pTo, units, speed_knot,
+                             include_ports, append_orig_dest, return_passages, restrictions, algorithm,
+                             None if include_ports else snapped, waypoints)
         result.append(res)
 
 
@@ -170,3 +324,223 @@ def searoute(origin, destination, units='km', speed_knot=24, append_orig_dest=Fa
         return result
     
 
+
+def k_shortest_routes(origin, destination, k=3, diversity=0.5, units='km', speed_knot=24, append_orig_dest=False, restrictions=[passages.Passage.northwest], max_stretch=2.0, M:marnet.Marnet=None, backend="networkx"):
+    """
+    Up to `k` diverse sea routes between two points, the shortest first, such as the routes
+    through Suez, around the Cape of Good Hope and through Panama.
+
+    The routes are found from two shortest path trees, one from the origin and one from the
+    destination (see `searoute.alternatives`), on the compiled arrays of the network whatever its backend.
+
+    Parameters
+    ----------
+    origin, destination : points as (lon, lat)
+    k : int, maximum number of routes, default 3
+    diversity : float between 0 and 1, default 0.5 ; minimum share of the length of a route
+        that is not shared with any shorter route returned
+    units, speed_knot, append_orig_dest, restrictions, M, backend : see `searoute()`
+    max_stretch : float, default 2.0 ; routes longer than `max_stretch` times the shortest one are ignored
+
+    Returns
+    -------
+    a list of Features (geojson) as `searoute(..., return_passages=True)` returns them, with their
+    `traversed_passages` ; empty when there is no route
+
+    Examples
+    --------
+    >>> routes = sr.k_shortest_routes([4.0, 51.9], [121.8, 31.2], k=4, units='naut')
+    >>> [(r.properties['length'], r.properties['traversed_passages']) for r in routes]
+    """
+    validate_lon_lat(origin)
+    validate_lon_lat(destination)
+
+    M, _ = get_graphs(M, None, backend, include_ports=False)
+    if M is None:
+        raise Exception('Marnet network must not be None')
+
+    routes = M.k_shortest_paths(origin, destination, k, diversity, restrictions, max_stretch)
+    if not routes:
+        raise_warn_no_path(origin, destination, float('inf'), restrictions)
+
+    o_origin, o_destination = tuple(origin), tuple(destination)
+    return [_path_feature(M, path, length, o_origin, o_destination, origin, destination, None, None, units,
+                          speed_knot, False, append_orig_dest, True, restrictions)
+            for length, path in routes]
+
+
+def reachable_within(origin, max_hours, speed_knot=24, restrictions=[passages.Passage.northwest], units='km', include_ports=True, only_terminals=False, M:marnet.Marnet=None, P:ports.Ports=None, backend="networkx"):
+    """
+    Marnet nodes and ports that can be reached from a point within a sailing time,
+    with one search bounded by the distance sailed, instead of one `searoute()` call per port.
+
+    Parameters
+    ----------
+    origin : a point as (lon, lat)
+    max_hours : sailing time available in hours
+    speed_knot : speed of the boat, default is `24` knots
+    restrictions : a list of passages to avoid, default restricted ['northwest'] ; None means the restrictions of `M`
+    units : unit of the lengths returned, default `km`, see `searoute()`
+    include_ports : boolean, default True ; finds the reachable ports of `P`
+    only_terminals : boolean, default False ; only the terminal ports
+    M, P, backend : see `searoute()`
+
+    Returns
+    -------
+    a `searoute.reach.Reachability` with the reachable `nodes`, their `lengths` and `hours`, the reachable
+    `ports` (attributes with `length` and `duration_hours`), nearest first ; `isochrone()` gives the GeoJSON
+    Feature of the network that can be sailed. Lengths and times are the ones `searoute()` reports from the
+    node the origin is snapped to, to ports it includes the last leg from their node.
+
+    Examples
+    --------
+    >>> reach = sr.reachable_within([0.35, 50.06], max_hours=72, speed_knot=14, only_terminals=True)
+    >>> [(p['port'], round(p['duration_hours'])) for p in reach.ports]
+    """
+    from .reach import reachable
+
+    validate_lon_lat(origin)
+    M, P = get_graphs(M, P, backend, include_ports)
+    if M is None:
+        raise Exception('Marnet network must not be None')
+
+    return reachable(M, origin, max_hours, speed_knot, restrictions, units, P if include_ports else None,
+                     only_terminals)
+
+
+def _validate_pairs(pairs):
+    """
+    (n, 2, 2) numpy array of the (origin, destination) points of `pairs`, validated
+    in one pass as `validate_lon_lat` does
+    """
+    import numpy as np
+
+    try:
+        points = np.array([(pair[0], pair[1]) for pair in pairs])
+    except (TypeError, ValueError, IndexError, KeyError):
+        raise ValueError("Invalid input format. Each pair must be (origin, destination) with points as (lon, lat).")
+    if len(pairs) == 0:
+        return np.zeros((0, 2, 2))
+    if points.shape[1:] != (2, 2) or points.dtype.kind not in 'iuf':
+        raise ValueError("Invalid input format. Each pair must be (origin, destination) with points as (lon, lat).")
+
+    points = points.astype(np.float64)
+    invalid = ~np.isfinite(points).all(axis=(1, 2)) | (np.abs(points[:, :, 1]) > 90).any(axis=1)
+    if invalid.any():
+        raise ValueError(f"Invalid longitude and/or latitude in pair {int(np.argmax(invalid))}.")
+    return points
+
+
+def searoute_many(pairs, units='km', speed_knot=24, append_orig_dest=False, restrictions=[passages.Passage.northwest], include_ports=False, port_params={}, M:marnet.Marnet=None, P:ports.Ports=None, return_passages:bool = False, algorithm = None, backend="networkx", waypoints=None, via_passages=None):
+    """
+    Sea routes of many origin and destination pairs, as `searoute()` returns them.
+
+    The points are validated and snapped to the Marnet all at once, pairs snapping to the
+    same nodes are routed once, and routes are computed by restriction set.
+
+    Parameters
+    ----------
+    pairs : list of (origin, destination) or (origin, destination, restrictions), points as (lon, lat) ;
+        restrictions of a pair replace `restrictions` when not None
+    others : see `searoute()`, common to every pair (`waypoints` and `via_passages` too)
+
+    Returns
+    -------
+    a list of the `searoute()` results, in the order of `pairs`. Pairs routed once get copies of the same Feature.
+
+    Examples
+    --------
+    >>> routes = sr.searoute_many([([0.35, 50.06], [117.42, 39.36]), ([52.99, 25.01], [-61.87, 17.15], ['suez'])], units='naut')
+    """
+    pairs = list(pairs)
+    points = _validate_pairs(pairs)
+    waypoints = _validate_waypoints(waypoints, via_passages)
+
+    M, P = get_graphs(M, P, backend, include_ports)
+    if P is None and include_ports:
+        raise Exception('Ports network must not be None')
+    if M is None:
+        raise Exception('Marnet network must not be None')
+
+    # every distinct point is snapped once
+    rows = points.tolist()
+    if include_ports:
+        keys = [(tuple(o), tuple(d)) for o, d in rows]
+    else:
+        distinct = list(dict.fromkeys(map(tuple, points.reshape(-1, 2).tolist())))
+        snapped = dict(zip(distinct, M.snap_many(distinct)))
+        keys = [(snapped[tuple(o)], snapped[tuple(d)]) for o, d in rows]
+        if append_orig_dest:
+            keys = [key + (tuple(o), tuple(d)) for key, (o, d) in zip(keys, rows)]
+
+    # rows by restriction set, in order of first appearance
+    groups = {}
+    for i, pair in enumerate(pairs):
+        pair_restrictions = pair[2] if len(pair) > 2 and pair[2] is not None else restrictions
+        group = None if pair_restrictions is None else frozenset(pair_restrictions)
+        if group not in groups:
+            groups[group] = (pair_restrictions, [])
+        groups[group][1].append(i)
+
+    results = [None] * len(pairs)
+    for group_restrictions, indexes in groups.values():
+        routed = {}
+        for i in indexes:
+            key = keys[i]
+            if key not in routed:
+                origin, destination = pairs[i][0], pairs[i][1]
+                routed[key] = results[i] = _searoute_features(
+                    M, P, origin, destination, units, speed_knot, append_orig_dest, group_restrictions,
+                    include_ports, port_params, return_passages, algorithm, None if include_ports else key[:2],
+                    waypoints)
+            else:
+                # the rows of a pair can be changed independently
+                results[i] = deepcopy(routed[key])
+
+    return results
+
+
+def searoute_matrix(origins, destinations=None, units='km', speed_knot=24, restrictions=[passages.Passage.northwest], M:marnet.Marnet=None, return_paths:bool = False, backend="networkx"):
+    """
+    Distance and duration matrix of the sea routes between many origins and destinations.
+
+    Every point is snapped once to the Marnet and one search is run per distinct origin,
+    instead of one `searoute()` call per pair.
+
+    Parameters
+    ----------
+    origins : list of (lon, lat)
+    destinations : list of (lon, lat), default None which means the origins
+    units : `km` (default), `m`, `mi`, `ft`, `in`, `deg`, `cen`, `rad`, `naut`, `yd`
+    speed_knot : speed of the boat in knots, for the durations
+    restrictions : a list of passages to avoid, default restricted ['northwest'] ; None means the restrictions of `M`
+    M : Marnet network, default None which means the default one
+    return_paths : boolean, default False ; keeps the search trees so that `path(i, j)` and `feature(i, j)`
+        of the result can build the routes on demand
+    backend : str one of `networkx`, `igraph` or `csr`, the backend of the default Marnet (the search itself
+        runs on the compiled arrays of the network, with scipy when installed)
+
+    Returns
+    -------
+    a `searoute.matrix.RouteMatrix` with `distances` and `durations` (hours) numpy arrays of shape
+    (len(origins), len(destinations)), `inf` when there is no route. Lengths are the ones `searoute()` returns.
+
+    Examples
+    --------
+    >>> m = sr.searoute_matrix([[0.3515625, 50.064191736659104], [52.99, 25.01]], [[117.42187, 39.36827]])
+    >>> m.distances
+    array([[20863.58...], [...]])
+    """
+    from .matrix import route_matrix
+
+    if destinations is None:
+        destinations = origins
+    for point in list(origins) + list(destinations):
+        validate_lon_lat(point)
+
+    M, _ = get_graphs(M, None, backend, include_ports=False)
+    if M is None:
+        raise Exception('Marnet network must not be None')
+
+    return route_matrix(M, origins, destinations, units=units, speed_knot=speed_knot,
+                        restrictions=restrictions, return_paths=return_paths)
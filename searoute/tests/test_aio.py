@@ -0,0 +1,121 @@
+import searoute as sr
+from searoute import aio
+import asyncio
+import threading
+import time
+import pytest
+
+
+def test_single_flight():
+    router = aio.AsyncRouter()
+
+    async def burst():
+        # points snapping to the same nodes
+        requests = [router.route([52.99 + i * 1e-4, 25.01], [-61.87, 17.15], units='naut') for i in range(20)]
+        return await asyncio.gather(*requests)
+
+    routes = asyncio.run(burst())
+    assert router.searches == 1 and router.coalesced == 19
+    assert all(route == routes[0] and route is not routes[0] for route in routes[1:])
+    assert routes[0] == sr.searoute([52.99, 25.01], [-61.87, 17.15], units='naut')
+
+    # other parameters are other searches
+    async def other():
+        return await asyncio.gather(router.route([52.99, 25.01], [-61.87, 17.15], restrictions=['suez']),
+                                    router.route([52.99, 25.01], [-61.87, 17.15], units='naut'))
+
+    restricted, naut = asyncio.run(other())
+    assert router.searches == 3
+    assert restricted.properties['length'] > naut.properties['length'] / 0.539956803
+    router.close()
+
+
+def test_single_flight_key(monkeypatch):
+    searched = []
+
+    def fake_route(origin, destination, params):
+        time.sleep(0.02)
+        searched.append(params)
+        return {'properties': {'params': sorted(k for k in params if k not in ('M', 'P', 'backend'))}}
+
+    monkeypatch.setattr(aio, '_route', fake_route)
+    router = aio.AsyncRouter()
+    origin, destination = [52.99, 25.01], [-61.87, 17.15]
+
+    async def burst():
+        # any parameter of `searoute()`, known to the router or not, makes another search
+        return await asyncio.gather(router.route(origin, destination),
+                                    router.route(origin, destination, via_passages=['panama']),
+                                    router.route(origin, destination, waypoints=[[-30, 0]]),
+                                    router.route(origin, destination, some_new_parameter=1),
+                                    router.route(origin, destination, via_passages=['panama']))
+
+    routes = asyncio.run(burst())
+    assert router.searches == 4 and router.coalesced == 1
+    assert [r['properties']['params'] for r in routes] == [[], ['via_passages'], ['waypoints'],
+                                                           ['some_new_parameter'], ['via_passages']]
+    # coalesced callers get their own copy
+    assert routes[4] is not routes[1]
+    routes[4]['properties']['params'].append('changed')
+    assert routes[1]['properties']['params'] == ['via_passages']
+    router.close()
+
+
+def test_default_network_loaded_on_executor(monkeypatch):
+    threads = []
+    snap = aio._snap
+
+    def recorded_snap(origin, destination, backend):
+        threads.append(threading.current_thread())
+        return snap(origin, destination, backend)
+
+    monkeypatch.setattr(aio, '_snap', recorded_snap)
+    router = aio.AsyncRouter()
+
+    async def request():
+        return await router.route([52.99, 25.01], [-61.87, 17.15]), threading.current_thread()
+
+    route, loop_thread = asyncio.run(request())
+    assert threads and loop_thread not in threads
+    assert route == sr.searoute([52.99, 25.01], [-61.87, 17.15])
+    router.close()
+
+
+def test_backpressure(monkeypatch):
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow_route(origin, destination, params):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return origin
+
+    monkeypatch.setattr(aio, '_route', slow_route)
+    router = aio.AsyncRouter(max_pending=2)
+
+    async def many():
+        return await asyncio.gather(*[router.route([i, 0], [0, 1]) for i in range(0, 90, 10)])
+
+    assert asyncio.run(many()) == [[i, 0] for i in range(0, 90, 10)]
+    assert peak[0] == 2
+    router.close()
+
+
+def test_route_many_as_completed():
+    pairs = [([52.99, 25.01], [-61.87, 17.15]), ((140.02, 35.51), (-97.36, 27.81)),
+             ([52.99, 25.01], [-61.87, 17.15], ['northwest', 'suez'])]
+
+    async def collect():
+        return [item async for item in sr.searoute_async_many(pairs, return_passages=True)]
+
+    results = dict(asyncio.run(collect()))
+    assert [results[i] for i in range(len(pairs))] == sr.searoute_many(pairs, return_passages=True)
+
+
+def test_invalid_point():
+    with pytest.raises(ValueError):
+        asyncio.run(sr.searoute_async([0, 95], [1, 1]))
@@ -0,0 +1,70 @@
+import searoute as sr
+from searoute.classes.alt import landmarks_graph
+from searoute.tests.test_utils import get_small_marnet
+import pytest
+
+
+def test_restrictions():
+    M = get_small_marnet()
+    M.restrictions = ['suez']
+
+    assert M.shortest_path((4, 0), (0, 0), 'alt') == (9, [(4, 0), (3, 0), (2, 1), (1, 1), (0, 1), (0, 0)])
+    assert M.landmarks.restriction_sets == [frozenset(), frozenset(['suez'])]
+
+    M.restrictions = []
+    assert M.shortest_path((0, 0), (4, 0), 'alt') == (4, [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0)])
+
+
+def test_rebuilt_on_new_node():
+    import networkx as nx
+
+    M = get_small_marnet()
+    M.restrictions = []
+    assert M.shortest_path((0, 0), (4, 0), 'alt')[0] == 4
+
+    M.add_node((5, 5))
+    with pytest.raises(nx.NetworkXNoPath):
+        M.shortest_path((0, 0), (5, 5), 'alt')
+
+
+def test_table_valid_for_restrictions():
+    landmarks = landmarks_graph(get_small_marnet(), count=2, restriction_sets=[['suez'], ['suez', 'panama']])
+    assert len(landmarks.landmarks) == 2
+
+    sets = landmarks.restriction_sets
+    assert sets[landmarks.table_index([])] == frozenset()
+    assert sets[landmarks.table_index(['panama'])] == frozenset()
+    assert sets[landmarks.table_index(['suez', 'northwest'])] == frozenset(['suez'])
+    assert sets[landmarks.table_index(['panama', 'suez'])] == frozenset(['suez', 'panama'])
+
+    # (0, 0) can not reach (4, 0) at all
+    bounds = landmarks.bounds_to((4, 0), ['suez', 'panama'])
+    assert bounds[landmarks.name_to_idx[(3, 0)]] <= 1
+    assert bounds[landmarks.name_to_idx[(0, 0)]] > 1000
+
+
+@pytest.mark.parametrize("restrictions", [['northwest'], ['northwest', 'suez'], ['suez', 'panama']])
+def test_shipped_bounds_are_consistent(restrictions):
+    M = sr.setup_M('csr')
+    landmarks = M.landmarks
+    M.restrictions = restrictions
+
+    for target in [(0.35156, 50.06419), (117.42187, 39.36827), (-61.87, 17.15)]:
+        target = M.kdtree.query(target)
+        bounds = landmarks.bounds_to(target, restrictions)
+        assert bounds[landmarks.name_to_idx[target]] == 0
+        for u, v, data in M.edges(data=True):
+            if data.get('passage') not in restrictions:
+                assert abs(bounds[landmarks.name_to_idx[u]] - bounds[landmarks.name_to_idx[v]]) <= data['weight'] + 1e-6
+
+
+def test_same_routes_as_dijkstra():
+    queries = [((0.35156, 50.06419), (117.42187, 39.36827)),
+               ((52.99, 25.01), (-61.87, 17.15)),
+               ((140.02, 35.51), (-97.36, 27.81))]
+
+    for origin, destination in queries:
+        for restrictions in (['northwest'], ['northwest', 'suez'], []):
+            expected = sr.searoute(origin, destination, restrictions=restrictions)
+            result = sr.searoute(origin, destination, restrictions=restrictions, algorithm='alt')
+            assert result.properties['length'] == pytest.approx(expected.properties['length'])
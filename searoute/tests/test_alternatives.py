@@ -0,0 +1,46 @@
+import searoute as sr
+import pytest
+
+
+ROTTERDAM, SHANGHAI = [4.0, 51.9], [121.8, 31.2]
+
+
+def test_shortest_first():
+    routes = sr.k_shortest_routes(ROTTERDAM, SHANGHAI, k=4, units='naut')
+    assert len(routes) == 4
+    expected = sr.searoute(ROTTERDAM, SHANGHAI, units='naut', return_passages=True)
+    assert routes[0].properties['length'] == pytest.approx(expected.properties['length'])
+    assert routes[0].properties['traversed_passages'] == expected.properties['traversed_passages']
+
+    lengths = [route.properties['length'] for route in routes]
+    assert lengths == sorted(lengths)
+    # suez, panama and the cape of good hope
+    assert 'suez' in routes[0].properties['traversed_passages']
+    passages = [set(route.properties['traversed_passages']) for route in routes[1:]]
+    assert any('panama' in p for p in passages) and any('south_africa' in p for p in passages)
+
+
+@pytest.mark.parametrize("backend", ["csr", "networkx"])
+def test_restrictions_and_backends(backend):
+    M = sr.setup_M(backend)
+    routes = sr.k_shortest_routes(ROTTERDAM, SHANGHAI, k=3, restrictions=['northwest', 'suez'], M=M)
+    assert routes
+    assert all('suez' not in route.properties['traversed_passages'] for route in routes)
+    expected = sr.searoute(ROTTERDAM, SHANGHAI, restrictions=['northwest', 'suez'], M=M)
+    assert routes[0].properties['length'] == pytest.approx(expected.properties['length'])
+
+
+def test_diversity():
+    loose = sr.setup_M().k_shortest_paths(ROTTERDAM, SHANGHAI, k=5, diversity=0.1)
+    strict = sr.setup_M().k_shortest_paths(ROTTERDAM, SHANGHAI, k=5, diversity=0.9)
+    assert loose[0] == strict[0]
+    assert len(strict) <= len(loose)
+    # every route is mostly new to the shorter ones
+    for i, (_, path) in enumerate(strict):
+        for _, other in strict[:i]:
+            assert len(set(path) & set(other)) < 0.5 * len(path)
+
+
+def test_invalid_point():
+    with pytest.raises(ValueError):
+        sr.k_shortest_routes([0, 95], SHANGHAI)
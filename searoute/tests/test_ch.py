@@ -0,0 +1,75 @@
+import searoute as sr
+from searoute.classes.ch import contract_graph
+from searoute.tests.test_utils import get_small_marnet
+import pytest
+
+
+def test_restrictions():
+    M = get_small_marnet()
+
+    M.restrictions = []
+    assert M.shortest_path((0, 0), (4, 0), 'ch') == (4, [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0)])
+
+    M.restrictions = ['suez']
+    assert M.shortest_path((4, 0), (0, 0), 'ch') == (9, [(4, 0), (3, 0), (2, 1), (1, 1), (0, 1), (0, 0)])
+
+    M.restrictions = ['suez', 'panama']
+    assert M.shortest_path((0, 0), (4, 0), 'ch') == (float('inf'), [])
+    assert M.shortest_path((1, 1), (1, 1), 'ch') == (0, [(1, 1)])
+
+
+def test_rebuilt_on_change():
+    M = get_small_marnet()
+    M.restrictions = []
+    assert M.shortest_path((0, 0), (4, 0), 'ch')[0] == 4
+
+    M.add_edge((0, 0), (4, 0), weight=3)
+    assert M.shortest_path((0, 0), (4, 0), 'ch') == (3, [(0, 0), (4, 0)])
+
+
+def test_shipped_hierarchy():
+    M = sr.setup_M()
+    assert M.ch.edge_count > M.number_of_edges()
+
+    queries = [((0.35156, 50.06419), (117.42187, 39.36827)),
+               ((52.99, 25.01), (-61.87, 17.15)),
+               ((140.02, 35.51), (-97.36, 27.81)),
+               ((-170.59, -27.08), (-7.28, 63.78))]
+
+    for origin, destination in queries:
+        for restrictions in (['northwest'], ['northwest', 'suez'], ['northwest', 'suez', 'panama']):
+            expected = sr.searoute(origin, destination, restrictions=restrictions, return_passages=True)
+            result = sr.searoute(origin, destination, restrictions=restrictions, return_passages=True, algorithm='ch')
+            assert result.properties['length'] == pytest.approx(expected.properties['length'])
+            assert sorted(result.properties['traversed_passages']) == sorted(expected.properties['traversed_passages'])
+
+
+def test_same_lengths_as_dijkstra_on_other_backends():
+    M = sr.setup_M('csr')
+    ch = contract_graph(get_small_marnet())
+    assert ch.node_count == 10
+
+    M.restrictions = ['northwest', 'suez']
+    origin, destination = M.kdtree.query((0.35156, 50.06419)), M.kdtree.query((117.42187, 39.36827))
+    length, path = M.shortest_path(origin, destination, 'ch')
+    assert length == pytest.approx(M.shortest_path(origin, destination)[0])
+    assert sum(M.get_edge_data(u, v)['weight'] for u, v in zip(path, path[1:])) == pytest.approx(length)
+
+
+def test_rebuilt_on_new_node():
+    M = get_small_marnet()
+    M.restrictions = []
+    assert M.shortest_path((0, 0), (4, 0), 'ch')[0] == 4
+
+    M.add_node((5, 5))
+    assert M.shortest_path((0, 0), (5, 5), 'ch') == (float('inf'), [])
+
+
+def test_python_query(monkeypatch):
+    from searoute.classes import ch
+
+    M = sr.setup_M()
+    origin, destination = M.kdtree.query((0.35156, 50.06419)), M.kdtree.query((117.42187, 39.36827))
+    expected = M.shortest_path(origin, destination, 'ch')
+    monkeypatch.setattr(ch, '_csgraph', lambda: None)
+    assert M.shortest_path(origin, destination, 'ch') == expected
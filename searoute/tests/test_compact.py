@@ -0,0 +1,112 @@
+import searoute as sr
+import pytest
+
+
+ROTTERDAM, SHANGHAI = [4.0, 51.9], [121.8, 31.2]
+# points snapping to nodes kept by the compaction
+LE_HAVRE, TIANJIN = [0.35, 50.06], [117.42, 39.36]
+
+
+@pytest.fixture(scope='module')
+def compact():
+    return sr.setup_M().compacted()
+
+
+def test_smaller(compact):
+    M = sr.setup_M()
+    assert compact.number_of_nodes() < 0.8 * M.number_of_nodes()
+    assert compact.number_of_edges() < M.number_of_edges()
+    assert len(compact.chains) > 0
+    assert compact.restrictions == M.restrictions
+
+
+def test_same_route(compact):
+    expected = sr.searoute(LE_HAVRE, TIANJIN, return_passages=True)
+    route = sr.searoute(LE_HAVRE, TIANJIN, return_passages=True, M=compact)
+    assert route.geometry.coordinates == expected.geometry.coordinates
+    assert route.properties['length'] == pytest.approx(expected.properties['length'])
+    assert route.properties['traversed_passages'] == expected.properties['traversed_passages']
+
+
+@pytest.mark.parametrize("backend", ["csr", "networkx"])
+def test_backends(backend):
+    compact = sr.setup_M(backend).compacted()
+    route = sr.searoute(ROTTERDAM, SHANGHAI, restrictions=['northwest', 'suez'], return_passages=True, M=compact)
+    assert 'suez' not in route.properties['traversed_passages']
+    expected = sr.searoute(ROTTERDAM, SHANGHAI, restrictions=['northwest', 'suez'], M=sr.setup_M(backend))
+    assert route.geometry.coordinates == expected.geometry.coordinates
+    assert route.properties['length'] == pytest.approx(expected.properties['length'])
+
+
+def test_other_queries(compact):
+    expected = sr.searoute(LE_HAVRE, TIANJIN)
+    matrix = sr.searoute_matrix([LE_HAVRE], [TIANJIN], return_paths=True, M=compact)
+    assert matrix.distances[0, 0] == pytest.approx(expected.properties['length'])
+    assert matrix.feature(0, 0).geometry.coordinates == expected.geometry.coordinates
+
+    routes = sr.k_shortest_routes(LE_HAVRE, TIANJIN, k=2, M=compact)
+    assert routes[0].geometry.coordinates == expected.geometry.coordinates
+    route = sr.searoute(LE_HAVRE, TIANJIN, via_passages=['panama'], return_passages=True, M=compact)
+    assert 'panama' in route.properties['traversed_passages']
+
+    reach = sr.reachable_within(LE_HAVRE, 24, M=compact)
+    full = sr.reachable_within(LE_HAVRE, 24, M=sr.setup_M())
+    length = lambda f: sum(sr.utils.distance_length(line) for line in f.geometry.coordinates)
+    assert length(reach.isochrone()) == pytest.approx(length(full.isochrone()), rel=0.01)
+
+
+def _chain_points(compact, count, seed):
+    """points next to intermediate nodes of the chains, which the compaction does not keep"""
+    import random
+
+    rng = random.Random(seed)
+    coords = compact.chains.coords.tolist()
+    points = [(lon + 0.02, lat - 0.02) for lon, lat in rng.sample(coords, count)]
+    return [p for p in points if compact.chains.locate(compact.snap(p)) is not None]
+
+
+def test_points_on_chains(compact):
+    M = sr.setup_M()
+    points = _chain_points(compact, 24, 1)
+    assert len(points) > 16
+    assert compact.snap_many(points) == M.snap_many(points)
+
+    pairs = list(zip(points[::2], points[1::2])) + [(points[0], TIANJIN), (LE_HAVRE, points[1]), (points[2], points[2])]
+    for origin, destination in pairs:
+        expected = sr.searoute(origin, destination, M=M, return_passages=True)
+        route = sr.searoute(origin, destination, M=compact, return_passages=True)
+        assert route.geometry.coordinates == expected.geometry.coordinates
+        assert route.properties['length'] == pytest.approx(expected.properties['length'])
+        assert route.properties['traversed_passages'] == expected.properties['traversed_passages']
+
+    restricted = sr.searoute(points[0], points[1], M=compact, restrictions=['northwest', 'suez', 'panama'])
+    expected = sr.searoute(points[0], points[1], M=M, restrictions=['northwest', 'suez', 'panama'])
+    assert restricted.geometry.coordinates == expected.geometry.coordinates
+
+
+def test_other_queries_on_chains(compact):
+    M = sr.setup_M()
+    points = _chain_points(compact, 12, 2)
+    origins, destinations = points[:4], points[4:8]
+
+    matrix = sr.searoute_matrix(origins, destinations, return_paths=True, M=compact)
+    expected = sr.searoute_matrix(origins, destinations, return_paths=True, M=M)
+    # routes of the same weight may be taken by either search
+    assert matrix.distances == pytest.approx(expected.distances, rel=1e-5)
+    assert matrix.path(1, 2) == expected.path(1, 2)
+
+    waypoints = [points[8], points[8], 'panama']
+    route = sr.searoute(origins[0], destinations[0], waypoints=waypoints, M=compact)
+    full = sr.searoute(origins[0], destinations[0], waypoints=waypoints, M=M)
+    assert route.geometry.coordinates == full.geometry.coordinates
+
+    assert (M.k_shortest_paths(origins[1], destinations[1], k=1)[0][1]
+            == compact.expand_path(compact.k_shortest_paths(origins[1], destinations[1], k=1)[0][1]))
+
+    P = sr.setup_P()
+    reach = sr.reachable_within(origins[2], 24, M=compact, P=P)
+    full = sr.reachable_within(origins[2], 24, M=M, P=P)
+    assert [p['port'] for p in reach.ports] == [p['port'] for p in full.ports]
+    assert [p['length'] for p in reach.ports] == pytest.approx([p['length'] for p in full.ports])
+    length = lambda f: sum(sr.utils.distance_length(line) for line in f.geometry.coordinates)
+    assert length(reach.isochrone()) == pytest.approx(length(full.isochrone()))
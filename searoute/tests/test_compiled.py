@@ -0,0 +1,84 @@
+import searoute as sr
+from searoute.compiled import compile_graph, read_compiled, to_compiled, from_compiled, MARNET_FILE, PORTS_FILE
+from searoute.tests.test_utils import get_small_marnet
+import numpy as np
+import pytest
+
+
+def test_marnet_roundtrip(tmp_path):
+    M = get_small_marnet()
+    file_name = tmp_path / 'small.srg'
+    to_compiled(M, file_name)
+
+    cg = read_compiled(file_name)
+    assert cg.kind == 'marnet'
+    assert cg.passages == ['panama', 'suez']
+    assert cg.node_count == 10
+    assert cg.edge_count == 20
+    assert list(cg['indptr']) == [0, 2, 4, 6, 9, 11, 13, 15, 17, 19, 20]
+
+    M2 = from_compiled(sr.Marnet(), file_name)
+    assert dict(M2.nodes(data=True)) == dict(M.nodes(data=True))
+    assert M2.get_edge_data((2, 0), (1, 0)) == {'weight': 1, 'passage': 'suez'}
+    assert M2.shortest_path((0, 0), (3, 0)) == (3, [(0, 0), (1, 0), (2, 0), (3, 0)])
+
+
+def test_edge_arrays():
+    M = get_small_marnet()
+    M.add_edge((179.5, 2), (-179.5, 2), weight=111.0)
+    cg = compile_graph(M)
+    index = cg.node_index()
+    u, v = index[(0, 0)], index[(1, 0)]
+    e, back, _ = cg.edge_ids([u, v, u], [v, u, index[(2, 0)]]).tolist()
+    assert cg['indices'][e] == v and cg['indices'][back] == u
+    assert _ == -1
+    assert cg.edge_lengths()[e] == pytest.approx(sr.utils.distance((0, 0), (1, 0), 'm'))
+
+    east = cg.edge_ids([index[(179.5, 2)]], [index[(-179.5, 2)]])[0]
+    assert cg.edge_shifts()[east] == 360
+    assert cg.edge_lengths()[east] == pytest.approx(111195, rel=1e-3)
+
+
+def test_ports_columns_roundtrip(tmp_path):
+    nodes = {
+        (1.5, 2.5): {'x': 1.5, 'y': 2.5, 'port': 'FRLEH', 'cty': 'France', 't': 1.0, 'to_cty': ['BE', 'NL']},
+        (2.5, 3.5): {'x': 2.5, 'y': 3.5, 'port': 'BEANR', 'cty': 'Belgium', 't': None},
+    }
+    P = sr.from_nodes_edges_set(sr.Ports(), nodes, None)
+    file_name = tmp_path / 'ports.srg'
+    to_compiled(P, file_name)
+
+    P2 = from_compiled(sr.Ports(), file_name, mmap=False)
+    assert dict(P2.nodes(data=True)) == nodes
+
+
+def test_version_mismatch(tmp_path):
+    file_name = tmp_path / 'small.srg'
+    to_compiled(get_small_marnet(), file_name)
+
+    raw = bytearray(file_name.read_bytes())
+    raw[8] = 99
+    file_name.write_bytes(bytes(raw))
+
+    with pytest.raises(ValueError):
+        read_compiled(file_name)
+
+
+def test_shipped_artifacts_are_up_to_date():
+    # the compiled images must be rebuilt (python -m searoute.compiled) when the sources change
+    from searoute.data.marnet_dict import edge_list as marnet_e, node_list as marnet_n
+    from searoute.data.ports_dict import edge_list as port_e, node_list as port_n
+
+    for G, nodes, edges, file_name in [(sr.Marnet(), marnet_n, marnet_e, MARNET_FILE),
+                                       (sr.Ports(), port_n, port_e, PORTS_FILE)]:
+        expected = compile_graph(sr.from_nodes_edges_set(G, nodes, edges))
+        shipped = read_compiled(file_name)
+        assert shipped.header['passages'] == expected.header['passages']
+        assert shipped.header['node_columns'] == expected.header['node_columns']
+        # the graph arrays, Marnet also carries its contraction hierarchy (`ch/*`) and landmarks (`alt/*`)
+        assert sorted(a for a in shipped.arrays if not a.startswith(('ch/', 'alt/'))) == sorted(expected.arrays)
+        for name, arr in expected.arrays.items():
+            np.testing.assert_array_equal(shipped[name], arr)
+
+    assert 'ch/rank' in read_compiled(MARNET_FILE)
+    assert 'alt/distances' in read_compiled(MARNET_FILE)
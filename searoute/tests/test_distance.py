@@ -0,0 +1,34 @@
+import searoute as sr
+from searoute.utils import distance, distance_length, distance_length_array, distance_many
+import numpy as np
+import pytest
+
+
+LINE = [(0.35, 50.06), (-5.6, 36.0), (32.3, 31.2), (179.9, -10.0), (-179.9, -10.2)]
+
+
+def test_distance_many():
+    a, b = np.array(LINE[:-1]), np.array(LINE[1:])
+    for units in ('km', 'naut', 'm'):
+        expected = [distance(u, v, units) for u, v in zip(LINE[:-1], LINE[1:])]
+        np.testing.assert_allclose(distance_many(a, b, units), expected, rtol=1e-12)
+
+    # pairwise matrix by broadcasting
+    matrix = distance_many(a[:, None], b[None, :])
+    assert matrix.shape == (4, 4)
+    assert matrix[1, 3] == pytest.approx(distance(LINE[1], LINE[4]))
+
+
+def test_distance_length_array():
+    segments = distance_length_array(LINE, 'naut')
+    assert len(segments) == len(LINE) - 1
+    assert segments.sum() == pytest.approx(distance_length(LINE, 'naut'))
+    assert distance_length_array(LINE[:1]).size == 0
+    assert distance_length([]) == 0
+
+
+def test_weights_computed_at_once():
+    M = sr.Marnet()
+    M.add_edges_from_list([(LINE[0], LINE[1], {}), (LINE[1], LINE[2], {'weight': 1.0})])
+    assert M.get_edge_data(LINE[0], LINE[1])['weight'] == round(distance(LINE[0], LINE[1]), 1)
+    assert M.get_edge_data(LINE[1], LINE[2])['weight'] == 1.0
@@ -0,0 +1,53 @@
+import searoute as sr
+from searoute.tests.test_utils import get_small_marnet
+import pytest
+
+
+@pytest.mark.parametrize("use_scipy", [True, False])
+def test_shortest_path_restrictions(use_scipy):
+    M = get_small_marnet('csr')
+    M.use_scipy = use_scipy
+
+    M.restrictions = []
+    assert M.shortest_path((0, 0), (3, 0)) == (3, [(0, 0), (1, 0), (2, 0), (3, 0)])
+
+    M.restrictions = ['suez']
+    assert M.shortest_path((0, 0), (3, 0)) == (8, [(0, 0), (0, 1), (1, 1), (2, 1), (3, 0)])
+
+    M.restrictions = ['suez', 'panama']
+    assert M.shortest_path((0, 0), (3, 0)) == (float('inf'), [])
+
+
+def test_astar():
+    M = get_small_marnet('csr')
+    M.restrictions = ['panama']
+    assert M.shortest_path((0, 0), (3, 0), 'astar') == (3, [(0, 0), (1, 0), (2, 0), (3, 0)])
+    assert M.shortest_path((1, 1), (1, 1), 'astar') == (0, [(1, 1)])
+
+
+def test_graph_access():
+    M = get_small_marnet('csr')
+    assert len(M) == 10
+    assert M.number_of_edges() == 10
+    assert M.get_edge_data((2, 0), (1, 0)) == {'weight': 1, 'passage': 'suez'}
+    assert M.get_edge_data((0, 0), (2, 0)) is None
+    assert sorted(M.subgraph([(0, 0), (1, 0)]).edges()) == [((0, 0), (1, 0))]
+
+    # update of an existing edge, weight of a new one
+    M.add_edge((1, 0), (0, 0), weight=5)
+    assert M.get_edge_data((0, 0), (1, 0)) == {'weight': 5}
+    M.add_edge((4, 0), (4, 1))
+    assert M.get_edge_data((4, 1), (4, 0)) == {'weight': 111.2}
+
+
+def test_same_routes_as_networkx():
+    queries = [((0.35156, 50.06419), (117.42187, 39.36827)),
+               ((52.99, 25.01), (-61.87, 17.15)),
+               ((140.02, 35.51), (-97.36, 27.81))]
+
+    for origin, destination in queries:
+        for restrictions in (['northwest'], ['northwest', 'suez']):
+            expected = sr.searoute(origin, destination, restrictions=restrictions, return_passages=True)
+            result = sr.searoute(origin, destination, restrictions=restrictions, return_passages=True, backend='csr')
+            assert result.properties['length'] == pytest.approx(expected.properties['length'])
+            assert sorted(result.properties['traversed_passages']) == sorted(expected.properties['traversed_passages'])
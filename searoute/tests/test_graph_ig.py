@@ -0,0 +1,99 @@
+import searoute as sr
+import pytest
+import warnings
+
+pytest.importorskip("igraph")
+
+from searoute.classes.core.graph_ig import (vertex_coords, weights_for, components_for, WEIGHTS_CACHE_SIZE,
+                                            _great_circle_bound)
+from searoute.tests.test_utils import get_small_marnet
+
+
+def test_astar_restrictions():
+    M = get_small_marnet('igraph')
+
+    M.restrictions = []
+    assert M.shortest_path((0, 0), (3, 0), 'astar') == (3, [(0, 0), (1, 0), (2, 0), (3, 0)])
+
+    M.restrictions = ['suez']
+    assert M.shortest_path((0, 0), (3, 0), 'astar') == (8, [(0, 0), (0, 1), (1, 1), (2, 1), (3, 0)])
+
+    M.restrictions = ['suez', 'panama']
+    with warnings.catch_warnings():
+        # no igraph warning when the target can not be reached, as with dijkstra
+        warnings.simplefilter('error')
+        assert M.shortest_path((0, 0), (3, 0), 'astar') == (float('inf'), [])
+    assert M.shortest_path((1, 1), (1, 1), 'astar') == (0, [(1, 1)])
+
+    components = components_for(M, ['suez', 'panama'])
+    assert components[M.name_to_idx[(0, 0)]] == components[M.name_to_idx[(2, 1)]]
+    assert components[M.name_to_idx[(0, 0)]] != components[M.name_to_idx[(3, 0)]]
+    assert components_for(M, {'panama', 'suez'}) is components
+
+
+def test_great_circle_bound_is_consistent():
+    M = get_small_marnet('igraph')
+    weights = weights_for(M, tie_break=True)
+    # (4, 0) - (180, 0) is a bit shorter than its great circle length, which A* searches instead ;
+    # the bound is scaled for the ring, far shorter
+    eid = M.get_eid(M.name_to_idx[(4, 0)], M.name_to_idx[(180, 0)])
+    assert M.es[eid]['weight'] == 19570.3 and weights[eid] == pytest.approx(19570.334, abs=1e-3)
+    eid = M.get_eid(M.name_to_idx[(0, 0)], M.name_to_idx[(1, 0)])
+    assert weights[eid] == pytest.approx(1) and vertex_coords(M)[4] == pytest.approx(1 / 111.195, rel=1e-4)
+
+    for target in range(M.vcount()):
+        h = _great_circle_bound(M, target)
+        assert h(M, target, target) == 0
+        for (u, v), w in zip(M.get_edgelist(), weights):
+            assert abs(h(M, u, target) - h(M, v, target)) <= w
+
+    # cached until the graph changes
+    assert vertex_coords(M) is vertex_coords(M)
+
+
+def test_same_routes_as_dijkstra():
+    M = sr.setup_M('igraph')
+    queries = [((0.35156, 50.06419), (117.42187, 39.36827)),
+               ((52.99, 25.01), (-61.87, 17.15)),
+               ((140.02, 35.51), (-97.36, 27.81)),
+               ((-170.59, -27.08), (-7.28, 63.78))]
+
+    for origin, destination in queries:
+        for restrictions in (['northwest'], ['northwest', 'suez']):
+            M.restrictions = restrictions
+            length, path = M.shortest_path(origin, destination, 'astar')
+            assert length == pytest.approx(M.shortest_path(origin, destination, 'dijkstra')[0])
+            assert path[0] == M.kdtree.query(origin) and path[-1] == M.kdtree.query(destination)
+
+
+def test_weights_cache():
+    M = get_small_marnet('igraph')
+
+    weights = weights_for(M, ['suez', 'panama'])
+    assert isinstance(weights, tuple)
+    assert weights_for(M, {'panama', 'suez'}) is weights
+    assert len(weights) == M.ecount()
+    assert weights.count(float('inf')) == sum(p in ('suez', 'panama') for p in M.es['passage'])
+
+    for i in range(WEIGHTS_CACHE_SIZE):
+        weights_for(M, [f'passage{i}'])
+    assert frozenset(['suez', 'panama']) not in M._weights_cache
+    assert len(M._weights_cache) == WEIGHTS_CACHE_SIZE
+
+    # cleared when edges change
+    M.add_edges([(M.name_to_idx[(0, 0)], M.name_to_idx[(2, 0)])], attributes={'weight': [0.5]})
+    assert len(M._weights_cache) == 0
+    assert M.shortest_path((0, 0), (2, 0)) == (0.5, [(0, 0), (2, 0)])
+
+
+def test_dijkstra_restrictions():
+    M = get_small_marnet('igraph')
+
+    M.restrictions = []
+    assert M.shortest_path((0, 0), (3, 0)) == (3, [(0, 0), (1, 0), (2, 0), (3, 0)])
+
+    M.restrictions = ['suez']
+    assert M.shortest_path((0, 0), (3, 0)) == (8, [(0, 0), (0, 1), (1, 1), (2, 1), (3, 0)])
+
+    M.restrictions = ['suez', 'panama']
+    assert M.shortest_path((0, 0), (3, 0)) == (float('inf'), [])
@@ -0,0 +1,42 @@
+import searoute as sr
+import subprocess
+import sys
+
+# generous budget for `import searoute` alone, heavy libraries must not be imported
+IMPORT_BUDGET_SEC = 0.5
+
+
+def test_import_budget():
+    code = (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        "import searoute\n"
+        "print(time.perf_counter() - t)\n"
+        "print(','.join(m for m in ('networkx', 'igraph', 'numpy', 'geojson') if m in sys.modules))\n"
+    )
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split('\n')
+
+    assert float(out[0]) < IMPORT_BUDGET_SEC
+    assert out[1] == ''
+
+
+def test_ports_not_built_without_include_ports():
+    sr.setup_P.cache_clear()
+
+    sr.searoute([0.35156, 50.06419], [117.42187, 39.36827])
+    assert sr.setup_P.cache_info().currsize == 0
+
+    sr.searoute([0.35156, 50.06419], [117.42187, 39.36827], include_ports=True)
+    assert sr.setup_P.cache_info().currsize == 1
+
+
+def test_ports_kdtree_built_on_first_use():
+    nodes = {
+        (1.5, 2.5): {'x': 1.5, 'y': 2.5, 'port': 'FRLEH', 'cty': 'France', 't': 1.0},
+        (2.5, 3.5): {'x': 2.5, 'y': 3.5, 'port': 'BEANR', 'cty': 'Belgium', 't': None},
+    }
+    P = sr.from_nodes_edges_set(sr.Ports(), nodes, None)
+    assert P._kdtree is None
+
+    assert P.kdtree.query((2.4, 3.4)) == (2.5, 3.5)
+    assert P._kdtree is not None
@@ -0,0 +1,85 @@
+from searoute.classes.kdtree import KDTree, PENDING_SIZE
+from searoute.utils import distance
+import random
+import pytest
+
+
+def brute_force(points, point):
+    return min(squared(p, point) for p in points)
+
+
+def squared(p, point):
+    # squared chord between the unit vectors, in the order of great circle distances
+    return round(distance(p, point, units='rad') * 1e9)
+
+
+@pytest.fixture(scope='module')
+def points():
+    rng = random.Random(1)
+    return [(rng.uniform(-180, 180), rng.uniform(-90, 90)) for _ in range(3000)]
+
+
+def test_query(points):
+    tree = KDTree(points)
+    rng = random.Random(2)
+    for _ in range(300):
+        point = (rng.uniform(-180, 180), rng.uniform(-90, 90))
+        assert squared(tree.query(point), point) == brute_force(points, point)
+    # the points themselves
+    assert all(tree.query(p) == p for p in points[:100])
+
+
+def test_query_many(points):
+    tree = KDTree(points)
+    rng = random.Random(3)
+    queries = [(rng.uniform(-180, 180), rng.uniform(-90, 90)) for _ in range(500)]
+    nearest = tree.query_many(queries)
+    assert [squared(p, q) for p, q in zip(nearest, queries)] == [brute_force(points, q) for q in queries]
+    assert tree.query_many([]) == []
+
+
+def test_add_point(points):
+    tree = KDTree(points[:50])
+    tree.query((0, 0))
+    known = points[:50]
+    # scanned while they are few, then the tree is rebuilt
+    for added in (points[50:60], points[60:60 + PENDING_SIZE + 10]):
+        for p in added:
+            tree.add_point(p)
+        known = known + added
+        queries = points[2000:2050]
+        assert [squared(tree.query(q), q) for q in queries] == [brute_force(known, q) for q in queries]
+        assert tree.query_many(queries) == [tree.query(q) for q in queries]
+
+
+def test_empty():
+    tree = KDTree()
+    with pytest.raises(Exception):
+        tree.query((0, 0))
+    tree.add_point((1.0, 2.0))
+    assert tree.query((0, 0)) == (1.0, 2.0)
+
+
+def test_antimeridian_and_poles():
+    tree = KDTree([(179.9, 10.0), (170.0, 10.0), (0.0, 89.0), (60.0, 85.0)])
+    assert tree.query((-179.9, 10.0)) == (179.9, 10.0)
+    assert tree.query_many([(-179.9, 10.0)]) == [(179.9, 10.0)]
+    # (120, 89) is 1.7 degrees of longitude from (60, 85) but 120 km from (0, 89)
+    assert tree.query((120.0, 89.0)) == (0.0, 89.0)
+
+
+def test_query_k_and_radius(points):
+    tree = KDTree(points)
+    rng = random.Random(4)
+    for _ in range(20):
+        point = (rng.uniform(-180, 180), rng.uniform(-90, 90))
+        by_distance = sorted(points, key=lambda p: distance(p, point))
+
+        found = tree.query_k(point, k=5)
+        assert [p for p, _ in found] == by_distance[:5]
+        assert [d for _, d in found] == pytest.approx([distance(p, point) for p in by_distance[:5]])
+
+        found = tree.query_radius(point, 500, units='naut')
+        assert [p for p, _ in found] == [p for p in by_distance if distance(p, point, units='naut') <= 500]
+    assert tree.query_k((0, 0), k=0) == []
+    assert len(tree.query_radius((0, 0), 30000)) == len(points)
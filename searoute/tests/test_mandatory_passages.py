@@ -3,6 +3,7 @@ from copy import copy
 
 from searoute.classes.passages import Passage
 import geojson
+import pytest
 
 def get_middle_element(lst):
     length = len(lst)
@@ -87,3 +88,67 @@ def test_mandatory_passage():
 
     assert all(element in traversed_passages for element in mandatory_passages)
 
+
+
+def test_via_passages():
+    origin = [-61.87, 17.15]# barbuda 
+    dest =   [52.99, 25.01] # dubai
+    mandatory_passages = [ Passage.panama,Passage.chili, Passage.south_africa, Passage.gibraltar, Passage.suez]
+
+    route = sr.searoute(origin, dest, via_passages=mandatory_passages, return_passages=True)
+    assert all(element in route.properties['traversed_passages'] for element in mandatory_passages)
+
+    legs = route.properties['legs']
+    assert [leg['to'] for leg in legs] == mandatory_passages + [dest]
+    assert sum(leg['length'] for leg in legs) == pytest.approx(route.properties['length'])
+    # every leg ends after crossing its passage
+    for leg in legs[:-1]:
+        assert leg['to'] in leg['traversed_passages']
+
+
+def test_waypoints():
+    origin = [-61.87, 17.15]# barbuda 
+    dest =   [52.99, 25.01] # dubai
+    stop = [-30, 0]
+
+    route = sr.searoute(origin, dest, waypoints=[stop])
+    M = sr.setup_M()
+    expected = [sr.searoute(origin, M.kdtree.query(stop)), sr.searoute(M.kdtree.query(stop), dest)]
+    assert [leg['length'] for leg in route.properties['legs']] == pytest.approx([e.properties['length'] for e in expected])
+
+    # a waypoint passage is crossed even when restricted
+    route = sr.searoute(origin, dest, waypoints=[stop, 'suez'], restrictions=['northwest', 'suez', 'gibraltar'],
+                        return_passages=True)
+    assert 'suez' in route.properties['traversed_passages'] and 'gibraltar' not in route.properties['traversed_passages']
+
+    with pytest.raises(ValueError):
+        sr.searoute(origin, dest, waypoints=['atlantis'])
+    with pytest.raises(ValueError):
+        sr.searoute(origin, dest, waypoints=[stop], via_passages=['suez'])
+
+
+def test_waypoints_many_and_async():
+    import asyncio
+    from searoute import aio
+
+    pairs = [([-61.87, 17.15], [52.99, 25.01]), ([0.35, 50.06], [52.99, 25.01])]
+    routes = sr.searoute_many(pairs, via_passages=['panama'])
+    assert routes == [sr.searoute(*pair, via_passages=['panama']) for pair in pairs]
+    with pytest.raises(ValueError):
+        sr.searoute_many(pairs, waypoints=[[-30, 0]], via_passages=['suez'])
+
+    # concurrent requests with other waypoints are other searches
+    router = aio.AsyncRouter()
+
+    async def burst():
+        origin, dest = [0.35, 50.06], [52.99, 25.01]
+        return await asyncio.gather(router.route(origin, dest), router.route(origin, dest, via_passages=['panama']),
+                                    router.route(origin, dest, waypoints=[[-30, 0]]),
+                                    router.route(origin, dest, via_passages=['panama']))
+
+    direct, panama, stop, panama_again = asyncio.run(burst())
+    assert router.searches == 3 and router.coalesced == 1
+    assert panama == routes[1] and panama_again == panama
+    assert stop == sr.searoute([0.35, 50.06], [52.99, 25.01], waypoints=[[-30, 0]])
+    assert direct.properties['length'] < stop.properties['length'] < panama.properties['length']
+    router.close()
@@ -0,0 +1,70 @@
+import searoute as sr
+from searoute.matrix import shortest_path_trees
+from searoute.compiled import compiled_image
+import numpy as np
+import pytest
+
+
+POINTS = [(0.35156, 50.06419), (117.42187, 39.36827), (52.99, 25.01), (-61.87, 17.15), (140.02, 35.51)]
+
+
+def test_same_as_searoute():
+    m = sr.searoute_matrix(POINTS[:2], POINTS[2:], units='naut', speed_knot=20)
+    assert m.shape == (2, 3)
+
+    for i, origin in enumerate(POINTS[:2]):
+        for j, destination in enumerate(POINTS[2:]):
+            expected = sr.searoute(origin, destination, units='naut', speed_knot=20)
+            assert m.distances[i, j] == pytest.approx(expected.properties['length'])
+            assert m.durations[i, j] == pytest.approx(expected.properties['duration_hours'])
+
+
+def test_square_matrix_and_restrictions():
+    m = sr.searoute_matrix(POINTS)
+    assert m.shape == (len(POINTS), len(POINTS))
+    assert np.all(np.diag(m.distances) == 0)
+    assert m.distances == pytest.approx(m.distances.T)
+
+    # europe to china goes around africa
+    restricted = sr.searoute_matrix(POINTS[:1], POINTS[1:2], restrictions=['northwest', 'suez'])
+    expected = sr.searoute(POINTS[0], POINTS[1], restrictions=['northwest', 'suez'])
+    assert restricted.distances[0, 0] == pytest.approx(expected.properties['length'])
+    assert restricted.distances[0, 0] > m.distances[0, 1]
+
+
+def test_restrictions_of_the_network():
+    # the northwest passage is restricted by the network, as with `searoute()`
+    origin, destination = (-168, 65.5), (-60, 70)
+    expected = sr.searoute(origin, destination, restrictions=None).properties['length']
+    assert sr.searoute_matrix([origin], [destination], restrictions=None).distances[0, 0] == pytest.approx(expected)
+    assert sr.searoute_matrix([origin], [destination], restrictions=[]).distances[0, 0] < expected
+
+
+def test_paths():
+    m = sr.searoute_matrix(POINTS[:2], POINTS[2:4], return_paths=True)
+    path = m.path(0, 1)
+    assert path[0] == m.origin_nodes[0] and path[-1] == m.destination_nodes[1]
+
+    feature = m.feature(1, 0)
+    expected = sr.searoute(POINTS[1], POINTS[2])
+    assert feature.geometry.coordinates[0] == expected.geometry.coordinates[0]
+    assert feature.properties['length'] == pytest.approx(expected.properties['length'])
+
+    with pytest.raises(ValueError):
+        sr.searoute_matrix(POINTS[:2]).path(0, 1)
+
+
+def test_python_search_same_as_scipy():
+    pytest.importorskip("scipy")
+    cg = compiled_image(sr.setup_M())
+    sources = [0, 100, 5000]
+
+    dist, _ = shortest_path_trees(cg, sources, ['northwest', 'suez'], use_scipy=True)
+    py_dist, py_preds = shortest_path_trees(cg, sources, ['northwest', 'suez'], use_scipy=False)
+    assert py_dist == pytest.approx(dist)
+    assert py_preds[0, sources[0]] == -1 and py_preds[1, sources[1]] == -1
+
+
+def test_invalid_point():
+    with pytest.raises(ValueError):
+        sr.searoute_matrix(POINTS[:2], [(10, 95)])
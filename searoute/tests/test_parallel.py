@@ -0,0 +1,138 @@
+import searoute as sr
+import gc
+import multiprocessing
+import pytest
+
+
+PAIRS = [
+    ([52.99, 25.01], [-61.87, 17.15]),
+    ((140.02, 35.51), (-97.36, 27.81)),
+    ([52.99, 25.01], [-61.87, 17.15], ['northwest', 'suez']),
+    ((0.35156, 50.06419), (117.42187, 39.36827)),
+    ((-170.59, -27.08), (-7.28, 63.78)),
+]
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='fork is not available')
+def test_fork_ordered_and_unordered():
+    expected = sr.searoute_many(PAIRS, units='naut', return_passages=True)
+
+    routes = list(sr.searoute_parallel(PAIRS, processes=2, chunksize=2, units='naut', return_passages=True))
+    assert routes == expected
+
+    unordered = dict(sr.searoute_parallel(PAIRS, processes=2, chunksize=2, ordered=False,
+                                          units='naut', return_passages=True))
+    assert [unordered[i] for i in range(len(PAIRS))] == expected
+
+
+def test_spawn_attaches_compiled_image():
+    expected = sr.searoute_many(PAIRS)
+    routes = list(sr.searoute_parallel(PAIRS, processes=2, chunksize=3, start_method='spawn', backend='csr'))
+    assert [r.properties['length'] for r in routes] == pytest.approx([r.properties['length'] for r in expected])
+
+
+def test_empty():
+    assert list(sr.searoute_parallel([], processes=2)) == []
+
+
+def test_threads():
+    expected = sr.searoute_many(PAIRS, units='naut')
+    assert list(sr.searoute_parallel(PAIRS, processes=3, chunksize=1, mode='thread', units='naut')) == expected
+
+    unordered = dict(sr.searoute_parallel(PAIRS, processes=3, chunksize=2, mode='thread', ordered=False, units='naut'))
+    assert [unordered[i] for i in range(len(PAIRS))] == expected
+
+
+def test_arguments_checked_when_called():
+    with pytest.raises(ValueError):
+        sr.searoute_parallel(PAIRS, mode='coroutine')
+    with pytest.raises(ValueError):
+        sr.searoute_parallel(PAIRS, start_method='clone')
+    with pytest.raises(ValueError):
+        sr.searoute_parallel(PAIRS, chunksize=0)
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='fork is not available')
+def test_abandoned_and_concurrent_calls():
+    from searoute import parallel
+
+    first = sr.searoute_parallel(PAIRS, processes=2, chunksize=1, units='naut')
+    second = sr.searoute_parallel(PAIRS[:2], processes=2, chunksize=1, restrictions=['northwest', 'suez'])
+    # the routes of each call use its own parameters
+    assert next(first) == sr.searoute(*PAIRS[0], units='naut')
+    assert list(second) == [sr.searoute(*pair, restrictions=['northwest', 'suez']) for pair in PAIRS[:2]]
+
+    # the calls keep no state in the caller, the collector is not left frozen
+    assert parallel._STATE == {}
+    assert gc.get_freeze_count() == 0
+    first.close()
+
+
+def test_pool_stopped():
+    # the pool starts when called
+    routes = sr.searoute_parallel(PAIRS, processes=2, chunksize=1)
+    workers = list(routes._pool._pool)
+    assert all(worker.is_alive() for worker in workers)
+
+    # and is terminated when leaving the block, routes left unconsumed
+    with routes:
+        next(routes)
+    assert not any(worker.is_alive() for worker in workers)
+    assert list(routes) == []
+
+    # or once exhausted
+    routes = sr.searoute_parallel(PAIRS[:2], processes=2, chunksize=1, mode='thread')
+    executor = routes._pool
+    assert len(list(routes)) == 2
+    assert routes._pool is None and executor._shutdown
+
+
+@pytest.mark.parametrize("backend", ['networkx', 'csr'])
+def test_restrictions_per_call_on_shared_network(backend):
+    from concurrent.futures import ThreadPoolExecutor
+
+    M = sr.setup_M(backend)
+    M.restrictions = ['northwest']
+    origin, destination = [52.99, 25.01], [-61.87, 17.15]
+    sets = [['northwest'], ['northwest', 'suez'], ['northwest', 'suez', 'south_africa']]
+    expected = [sr.searoute(origin, destination, M=M, restrictions=r).properties['length'] for r in sets]
+    assert len(set(expected)) == 3
+
+    def route(i):
+        r = sets[i % 3]
+        return sr.searoute(origin, destination, M=M, restrictions=r, algorithm=['dijkstra', 'astar', 'ch'][i % 3 - 1]).properties['length']
+
+    with ThreadPoolExecutor(6) as executor:
+        lengths = list(executor.map(route, range(60)))
+    assert lengths == pytest.approx([expected[i % 3] for i in range(60)])
+    assert M.restrictions == ['northwest']
+
+
+@pytest.mark.parametrize("backend", ['networkx', 'igraph', 'csr'])
+def test_pickle_network(backend):
+    import pickle
+
+    if backend == 'igraph':
+        pytest.importorskip('igraph')
+    nodes = {(0, 0): {}, (1, 1): {}, (2, 1): {}}
+    edges = {(0, 0): {(1, 1): {'weight': 157.3, 'passage': 'suez'}},
+             (1, 1): {(0, 0): {'weight': 157.3, 'passage': 'suez'}, (2, 1): {'weight': 111.1}},
+             (2, 1): {(1, 1): {'weight': 111.1}}}
+    M = sr.from_nodes_edges_set(sr.Marnet(backend=backend), nodes, edges)
+    M.restrictions = ['panama']
+
+    copy = pickle.loads(pickle.dumps(M))
+    assert isinstance(copy, sr.Marnet) and copy._backend == backend
+    assert copy.restrictions == ['panama']
+    assert copy.get_edge_data((0, 0), (1, 1)) == {'weight': 157.3, 'passage': 'suez'}
+    assert copy.shortest_path((0, 0), (2, 1)) == M.shortest_path((0, 0), (2, 1))
+
+
+def test_spawn_pickles_networks_without_image():
+    # a compacted network has no compiled image, the workers get a pickled copy
+    M = sr.setup_M().compacted()
+    P = sr.Ports()
+    P.add_node((0.35, 50.06), port='FRAAA', cty='France', t=1.0)
+    expected = sr.searoute_many(PAIRS[:2], M=M)
+    routes = list(sr.searoute_parallel(PAIRS[:2], processes=2, chunksize=1, start_method='spawn', M=M, P=P))
+    assert [r.properties['length'] for r in routes] == pytest.approx([r.properties['length'] for r in expected])
@@ -0,0 +1,67 @@
+import searoute as sr
+from searoute.port_table import build_port_table, PortTable
+import pytest
+
+
+PORTS = ['FRLEH', 'CNSHA', 'USHOU', 'SGSIN', 'GEPTI']
+
+
+@pytest.fixture(scope='module')
+def table():
+    return build_port_table(PORTS, restriction_sets=[['northwest'], ['northwest', 'suez']])
+
+
+def test_same_as_searoute(table):
+    assert len(table) == len(PORTS)
+    for restrictions in (['northwest'], ['northwest', 'suez']):
+        for a in PORTS:
+            for b in PORTS:
+                expected = sr.searoute(table._coords(a), table._coords(b), units='naut',
+                                       restrictions=restrictions, return_passages=True)
+                assert table.distance(a, b, 'naut', restrictions) == pytest.approx(expected.properties['length'], rel=1e-6)
+                assert sorted(table.passages(a, b, restrictions)) == sorted(expected.properties['traversed_passages'])
+
+    assert table.distance('FRLEH', 'FRLEH') == 0
+    assert table.distance(table.nodes[0], table.nodes[1]) == table.distance(PORTS[1], PORTS[0])
+
+
+def test_live_routing_fallback(table):
+    P = sr.setup_P()
+    origin = next(node for node, data in P.nodes(data=True) if data.get('port') == 'NLRTM')
+    assert 'NLRTM' not in table
+
+    expected = sr.searoute(origin, table._coords('SGSIN')).properties['length']
+    assert table.distance('NLRTM', 'SGSIN') == pytest.approx(expected)
+    assert table.distance(origin, 'SGSIN') == pytest.approx(expected)
+
+    # restriction set not in the table
+    expected = sr.searoute(table._coords('FRLEH'), table._coords('SGSIN'), restrictions=['suez']).properties['length']
+    assert table.distance('FRLEH', 'SGSIN', restrictions=['suez']) == pytest.approx(expected)
+
+    with pytest.raises(KeyError):
+        table.distance('XXXXX', 'SGSIN')
+
+
+def test_restrictions_of_the_network(table, monkeypatch):
+    expected = table.distance('FRLEH', 'SGSIN')
+
+    def live(*args, **kwargs):
+        raise AssertionError('routed live')
+
+    # None means the restrictions of the network, which are in the table
+    monkeypatch.setattr(table, '_route', live)
+    assert table.distance('FRLEH', 'SGSIN', restrictions=None) == expected
+    assert table.passages('FRLEH', 'SGSIN', restrictions=None) == table.passages('FRLEH', 'SGSIN')
+
+
+def test_save_load(table, tmp_path):
+    file_name = tmp_path / 'ports.srg'
+    table.save(file_name)
+
+    loaded = PortTable.load(file_name)
+    assert loaded.ports == PORTS
+    assert loaded.distance('CNSHA', 'USHOU', restrictions=['suez', 'northwest']) == table.distance('USHOU', 'CNSHA', restrictions=['northwest', 'suez'])
+    assert loaded.passages('FRLEH', 'SGSIN') == table.passages('FRLEH', 'SGSIN')
+
+    with pytest.raises(ValueError):
+        PortTable.load(sr.compiled.MARNET_FILE)
@@ -2,7 +2,7 @@ from searoute.classes.area_feature import AreaFeature
 from searoute.classes.ports_props import PortProps
 from searoute.tests.test_utils import get_eur_like_poly, get_suisse_poly, get_lux_poly, get_be_poly
 
-from searoute.classes.ports import Ports
+from searoute.classes.ports import Ports, FILTER_CACHE_SIZE
 
 import searoute as sr
 import unittest
@@ -128,4 +128,62 @@ class TestPortProps(unittest.TestCase):
 
         paris_point = (2.333333, 48.866667) # Paris
         r = p.get_selected_port_matrix(paris_point, tokyo_point, port_params)
-        print(r)
\ No newline at end of file
+        print(r)
+
+def get_small_ports():
+    P = Ports()
+    P.add_node((1.0, 1.0), port='FRAAA', cty='France', t=1.0, to_cty=['GB'])
+    P.add_node((1.5, 1.0), port='FRBBB', cty='France', t=None)
+    P.add_node((3.0, 1.0), port='GBCCC', cty='United Kingdom', t=1.0, to_cty=['FR'])
+    P.add_node((5.0, 1.0), port='BEDDD', cty='Belgium', t=1.0)
+    return P
+
+
+class TestPortQuery(unittest.TestCase):
+    def test_filters(self):
+        P = get_small_ports()
+        self.assertIs(P.query(terminals=False), P)
+        self.assertEqual(P.query().kdtree.points, [(1.0, 1.0), (3.0, 1.0), (5.0, 1.0)])
+        self.assertEqual(P.query(cty='FR').kdtree.points, [(1.0, 1.0)])
+        self.assertEqual(P.query(cty='FR', to_cty='GB').kdtree.points, [(1.0, 1.0)])
+        # filters are dropped when no port is left
+        self.assertEqual(P.query(cty='NL').kdtree.points, [(1.0, 1.0), (3.0, 1.0), (5.0, 1.0)])
+        self.assertEqual(len(P.query(cty='FR', to_cty='US').kdtree), 4)
+        self.assertEqual(P.query(terminals=False, cty='FR', strict=True).kdtree.points, [(1.5, 1.0)])
+        with self.assertRaises(KeyError):
+            P.query(cty='NL', strict=True)
+
+        self.assertEqual(P.closest_port((1.4, 1.0)), (1.0, 1.0))
+        self.assertEqual(P.closest_port((1.4, 1.0), terminals=False), (1.5, 1.0))
+        self.assertEqual(P.closest_port((1.4, 1.0), cty='GB'), (3.0, 1.0))
+
+    def test_cached_trees(self):
+        P = get_small_ports()
+        tree = P.query(cty='GB').kdtree
+        self.assertIs(P.query(cty='GB').kdtree, tree)
+        self.assertIsNot(P.query(cty='GB', strict=True).kdtree, tree)
+
+        # new ports are indexed and the trees rebuilt
+        P.add_node((3.2, 1.0), port='GBEEE', cty='United Kingdom', t=1.0)
+        self.assertEqual(P.query(cty='GB').kdtree.points, [(3.0, 1.0), (3.2, 1.0)])
+        self.assertEqual(P.closest_port((3.3, 1.0), cty='GB'), (3.2, 1.0))
+
+        for cty in range(FILTER_CACHE_SIZE + 10):
+            P.query(cty=f'{cty:02d}')
+        self.assertEqual(len(P._filter_trees), FILTER_CACHE_SIZE)
+
+    def test_by_locode(self):
+        P = get_small_ports()
+        node, props = P.by_locode('GBCCC')
+        self.assertEqual(node, (3.0, 1.0))
+        self.assertEqual(props['cty'], 'United Kingdom')
+        self.assertIsNone(P.by_locode('NLXXX'))
+
+        # the first port of a code is kept
+        P.add_node((3.5, 1.0), port='GBCCC', cty='United Kingdom')
+        P.add_node((6.0, 1.0), port='NLXXX', cty='Netherlands')
+        self.assertEqual(P.by_locode('GBCCC')[0], (3.0, 1.0))
+        self.assertEqual(P.by_locode('NLXXX')[0], (6.0, 1.0))
+
+        P = sr.setup_P()
+        self.assertEqual(P.by_locode('FRMRS')[0], (5.355148, 43.292341))
@@ -0,0 +1,72 @@
+import searoute as sr
+import pytest
+
+
+LE_HAVRE_BAY = [0.35, 50.06]
+
+
+def test_ports_within_hours():
+    reach = sr.reachable_within(LE_HAVRE_BAY, 72, speed_knot=14, only_terminals=True)
+    assert reach.ports and all(port['t'] == 1 for port in reach.ports)
+    assert max(reach.hours) <= 72
+    hours = [port['duration_hours'] for port in reach.ports]
+    assert hours == sorted(hours) and hours[-1] <= 72
+
+    # same as routing from the snapped origin to the port
+    for port in (reach.ports[0], reach.ports[-1]):
+        route = sr.searoute(reach.origin_node, [port['x'], port['y']], speed_knot=14, append_orig_dest=True)
+        assert port['duration_hours'] == pytest.approx(route.properties['duration_hours'])
+
+    longer = sr.reachable_within(LE_HAVRE_BAY, 96, speed_knot=14, only_terminals=True)
+    assert {p['port'] for p in reach.ports} < {p['port'] for p in longer.ports}
+
+
+def test_nodes_and_isochrone():
+    reach = sr.reachable_within(LE_HAVRE_BAY, 24, units='naut', include_ports=False)
+    assert reach.ports == [] and reach.nodes[0] == reach.origin_node
+    i = len(reach) // 2
+    route = sr.searoute(reach.origin_node, reach.nodes[i], units='naut')
+    assert reach.lengths[i] == pytest.approx(route.properties['length'])
+
+    isochrone = reach.isochrone()
+    assert isochrone.geometry.type == 'MultiLineString'
+    reached = set(reach.nodes)
+    assert all(tuple(line[0]) in reached for line in isochrone.geometry.coordinates)
+
+
+def test_restrictions():
+    # from the Red Sea, Suez closed
+    open_ = sr.reachable_within([34.0, 26.0], 72, include_ports=False)
+    closed = sr.reachable_within([34.0, 26.0], 72, restrictions=['northwest', 'suez'], include_ports=False)
+    assert len(closed) < len(open_)
+
+    # the northwest passage is restricted by the network, as with `searoute()`
+    bering = (-168, 65.5)
+    default = sr.reachable_within(bering, 72, include_ports=False)
+    assert sr.reachable_within(bering, 72, restrictions=None, include_ports=False).nodes == default.nodes
+    assert len(sr.reachable_within(bering, 72, restrictions=[], include_ports=False)) > len(default)
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        sr.reachable_within([0, 95], 10)
+    with pytest.raises(ValueError):
+        sr.reachable_within(LE_HAVRE_BAY, 10, speed_knot=0)
+
+
+def test_ports_snapped_as_routes(monkeypatch):
+    M = sr.setup_M()
+    P = sr.Ports()
+    P.add_node((0.11, 49.48), port='FRLEH', cty='France', t=1.0, x=0.11, y=49.48)
+    snapped = []
+    snap_many = M.snap_many
+
+    def spy(points):
+        snapped.append(list(points))
+        return snap_many(points)
+
+    # ports snap to the nodes `searoute()` uses, with the snap grid when the network has one
+    monkeypatch.setattr(M, 'snap_many', spy)
+    reach = sr.reachable_within(LE_HAVRE_BAY, 24, M=M, P=P)
+    assert snapped == [[(0.11, 49.48)]]
+    assert [port['port'] for port in reach.ports] == ['FRLEH']
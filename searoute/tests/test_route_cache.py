@@ -0,0 +1,67 @@
+import searoute as sr
+from searoute.tests.test_utils import get_small_marnet
+import pytest
+
+
+def test_hits_and_reverse():
+    M = get_small_marnet()
+    M.restrictions = []
+    cache = M.enable_route_cache()
+
+    assert M.shortest_path((0, 0), (2, 0)) == (2, [(0, 0), (1, 0), (2, 0)])
+    # snaps to the same nodes
+    assert M.shortest_path((0.1, 0), (2, 0.1)) == (2, [(0, 0), (1, 0), (2, 0)])
+    assert M.shortest_path((2, 0), (0, 0)) == (2, [(2, 0), (1, 0), (0, 0)])
+    assert cache.cache_info()[:4] == (2, 1, 10000, 1)
+
+    # keyed by restrictions and algorithm
+    M.restrictions = ['suez']
+    assert M.shortest_path((0, 0), (2, 0)) == (9, [(0, 0), (0, 1), (1, 1), (2, 1), (3, 0), (2, 0)])
+    M.shortest_path((0, 0), (2, 0), 'astar')
+    assert cache.cache_info().misses == 3
+
+    # returned paths are copies
+    M.shortest_path((0, 0), (2, 0))[1].append('x')
+    assert M.shortest_path((2, 0), (0, 0)) == (9, [(2, 0), (3, 0), (2, 1), (1, 1), (0, 1), (0, 0)])
+
+
+def test_eviction():
+    M = get_small_marnet()
+    cache = M.enable_route_cache(maxsize=2)
+    for destination in [(1, 0), (2, 0), (0, 1)]:
+        M.shortest_path((0, 0), destination)
+    assert len(cache) == 2
+    assert cache.get((0, 0), (1, 0), M.restrictions, None) is None
+
+    cache = M.enable_route_cache(maxsize=None, max_bytes=1000)
+    for destination in [(1, 0), (2, 0), (0, 1)]:
+        M.shortest_path((0, 0), destination)
+    assert 0 < cache.nbytes <= 1000
+    assert len(cache) < 3
+
+
+def test_cleared_on_change():
+    M = get_small_marnet()
+    M.restrictions = ['suez']
+    cache = M.enable_route_cache()
+    assert M.shortest_path((0, 0), (2, 0))[0] == 9
+
+    M.add_edge((0, 0), (2, 0), weight=3)
+    assert len(cache) == 0
+    assert M.shortest_path((0, 0), (2, 0)) == (3, [(0, 0), (2, 0)])
+
+    M.disable_route_cache()
+    assert M.route_cache is None
+
+
+def test_searoute_units_per_call():
+    M = sr.setup_M()
+    cache = M.enable_route_cache()
+    try:
+        km = sr.searoute((0.35156, 50.06419), (117.42187, 39.36827), M=M)
+        naut = sr.searoute((117.42187, 39.36827), (0.35156, 50.06419), units='naut', speed_knot=20, M=M)
+        assert cache.cache_info().hits == 1
+        assert naut.properties['length'] == pytest.approx(km.properties['length'] * 0.539956803)
+        assert naut.properties['duration_hours'] == pytest.approx(naut.properties['length'] / 20)
+    finally:
+        M.disable_route_cache()
@@ -3,6 +3,7 @@ from searoute.classes.area_feature import AreaFeature
 from searoute.classes.ports_props import PortProps
 from searoute.tests.test_utils import get_be_poly
 import geojson
+import importlib
 import pytest
 
 def test_passages():
@@ -103,4 +104,76 @@ def test_restricted_paths():
 
 
 
-    
\ No newline at end of file
+    
+
+
+@pytest.mark.parametrize("backend", ["csr", "networkx"])
+def test_route_post_processing(backend):
+    # across the antimeridian, with points added at both ends
+    from searoute.classes.passages import Passage
+    from searoute.utils import distance_length, process_route
+
+    M = sr.setup_M(backend)
+    origin, destination = [139.8, 35.4], [-122.5, 37.7]
+    route = sr.searoute(origin, destination, append_orig_dest=True, return_passages=True, M=M)
+    length, path = M.shortest_path(origin, destination)
+    ls, traversed = process_route([tuple(origin)] + path + [tuple(destination)], M, True)
+
+    assert [list(c) for c in route.geometry.coordinates] == [list(c) for c in ls]
+    assert max(c[0] for c in ls) > 180
+    assert route.properties['length'] == pytest.approx(distance_length(ls))
+    assert route.properties['traversed_passages'] == Passage.filter_valid_passages(traversed)
+
+
+def test_searoute_many():
+    pairs = [
+        ([52.99, 25.01], [-61.87, 17.15]),
+        ((140.02, 35.51), (-97.36, 27.81)),
+        ([52.99, 25.01], [-61.87, 17.15], ['suez']),
+        ([52.99, 25.01], [-61.87, 17.15]),
+        ([52.991, 25.011], [-61.87, 17.15]),
+    ]
+    routes = sr.searoute_many(pairs, units='naut', return_passages=True)
+    assert len(routes) == len(pairs)
+
+    for pair, route in zip(pairs, routes):
+        restrictions = pair[2] if len(pair) > 2 else ['northwest']
+        assert route == sr.searoute(pair[0], pair[1], units='naut', restrictions=restrictions, return_passages=True)
+
+    # same snapped nodes and restrictions give copies of one route
+    assert routes[0] == routes[3] == routes[4]
+    assert routes[3] is not routes[0] and routes[4] is not routes[0] and routes[4] is not routes[3]
+    routes[3]['properties']['length'] = 0
+    assert routes[0]['properties']['length'] == routes[4]['properties']['length'] > 0
+    assert sorted(routes[2]['properties']['traversed_passages']) == ['ormuz', 'south_africa']
+
+
+def test_searoute_many_routed_once(monkeypatch):
+    # the module, `sr.searoute` is the function
+    searoute_module = importlib.import_module('searoute.searoute')
+    calls = []
+    features = searoute_module._searoute_features
+
+    def counted(*args):
+        calls.append(args[2:4])
+        return features(*args)
+
+    monkeypatch.setattr(searoute_module, '_searoute_features', counted)
+    pairs = [([52.99, 25.01], [-61.87, 17.15]), ([52.991, 25.011], [-61.87, 17.15]), ([52.99, 25.01], [-61.87, 17.15])]
+    routes = sr.searoute_many(pairs)
+    assert len(calls) == 1 and len(routes) == 3
+
+
+def test_searoute_many_append_orig_dest():
+    pairs = [([52.99, 25.01], [-61.87, 17.15]), ([52.991, 25.011], [-61.87, 17.15])]
+    routes = sr.searoute_many(pairs, append_orig_dest=True)
+    assert routes[0]['geometry']['coordinates'][0] == [52.99, 25.01]
+    assert routes[1]['geometry']['coordinates'][0] == [52.991, 25.011]
+
+
+def test_searoute_many_invalid():
+    assert sr.searoute_many([]) == []
+    with pytest.raises(ValueError, match='pair 1'):
+        sr.searoute_many([([0, 0], [1, 1]), ([0, 95], [1, 1])])
+    with pytest.raises(ValueError):
+        sr.searoute_many([([0, 0], ['a', 1])])
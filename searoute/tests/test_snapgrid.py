@@ -0,0 +1,80 @@
+import searoute as sr
+from searoute.classes.snapgrid import SnapGrid, build_snap_grid
+from searoute.compiled import compiled_image, from_compiled, write_compiled
+import random
+import pytest
+
+
+def get_marnet():
+    # a grid of nodes 0.5 degrees apart around the antimeridian
+    M = sr.Marnet()
+    lons = [179.0, 179.5, 180.0, -179.5, -179.0]
+    for lat in (10.0, 10.5, 11.0):
+        for a, b in zip(lons, lons[1:]):
+            M.add_edge((a, lat), (b, lat))
+    for lon in lons:
+        M.add_edge((lon, 10.0), (lon, 10.5))
+        M.add_edge((lon, 10.5), (lon, 11.0))
+    M.update_kdtree()
+    return M
+
+
+def test_same_nodes_as_kdtree():
+    M = get_marnet()
+    grid = M.enable_snap_grid((-180, 9, -178, 12), cell=0.05)
+    assert grid.shape == (60, 40)
+    assert 0 < grid.resolved < 1
+
+    rng = random.Random(1)
+    points = [(rng.uniform(-180, -178), rng.uniform(9, 12)) for _ in range(2000)]
+    assert [M.snap(p) for p in points] == [M.kdtree.query(p) for p in points]
+    assert M.snap_many(points) == M.kdtree.query_many(points)
+    # outside the domain
+    assert grid.node((178.9, 10.0)) is None
+    assert M.snap((178.9, 10.0)) == (179.0, 10.0)
+
+
+def test_ports():
+    M = get_marnet()
+    P = sr.Ports()
+    P.add_node((-179.2, 10.2), port='FJAAA', cty='FJ', t=True)
+    P.add_node((-179.8, 10.8), port='FJBBB', cty='FJ', t=True)
+    P.add_node((-179.3, 10.7), port='FJCCC', cty='FJ')
+    grid = M.enable_snap_grid((-180, 10, -179, 11), cell=0.1, P=P)
+    assert P.snap_grid is grid
+    assert grid.port((-179.15, 10.25)) == (-179.2, 10.2)
+
+    rng = random.Random(2)
+    points = [(rng.uniform(-180, -179), rng.uniform(10, 11)) for _ in range(500)]
+    terminals = P.query(terminals=True).kdtree
+    assert [P.closest_port(p) for p in points] == [terminals.query(p) for p in points]
+    # the grid is dropped when the ports change
+    P.add_node((-179.5, 10.5), port='FJDDD', cty='FJ', t=True)
+    assert P.snap_grid is None
+
+
+def test_stored_with_compiled_image(tmp_path):
+    M = get_marnet()
+    grid = M.enable_snap_grid((-180, 9, -178, 12), cell=0.05)
+    cg = grid.to_compiled(compiled_image(M))
+    write_compiled(cg, tmp_path / 'marnet.srg')
+
+    M2 = from_compiled(sr.Marnet(), tmp_path / 'marnet.srg')
+    stored = M2.snap_grid
+    assert isinstance(stored, SnapGrid) and stored.ports is None
+    assert stored.bounds == grid.bounds and stored.shape == grid.shape
+    assert (stored.nodes == grid.nodes).all()
+    assert M2.shortest_path((-179.6, 10.1), (179.1, 10.9)) == M.shortest_path((-179.6, 10.1), (179.1, 10.9))
+
+    # a new node may be nearer than the ones of the grid
+    M2.add_edge((-179.0, 11.0), (-178.5, 11.0))
+    assert M2.snap_grid is None
+    assert M2.snap((-178.6, 11.0)) == (-178.5, 11.0)
+
+
+def test_bounds():
+    with pytest.raises(ValueError):
+        build_snap_grid([(0.0, 0.0)], (10, 0, 5, 1))
+    grid = build_snap_grid([(0.0, 0.0)], (-1, -1, 1, 1), cell=0.5)
+    assert grid.resolved == 1.0
+    assert grid.node((0.9, -0.9)) == (0.0, 0.0)
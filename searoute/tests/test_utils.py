@@ -1,6 +1,32 @@
 import random
 import string
 
+import searoute as sr
+
+
+def get_small_marnet(backend=None):
+    """
+    a ring around a square, the short side through suez and the long one through panama,
+    plus a spur ending at the antimeridian, a bit shorter than its great circle length as weights
+    are rounded, and a 0 weight link across the antimeridian
+    """
+    edges = [((0, 0), (1, 0), {'weight': 1}),
+             ((1, 0), (2, 0), {'weight': 1, 'passage': 'suez'}),
+             ((2, 0), (3, 0), {'weight': 1}),
+             ((0, 0), (0, 1), {'weight': 2}),
+             ((0, 1), (1, 1), {'weight': 2}),
+             ((1, 1), (2, 1), {'weight': 2}),
+             ((2, 1), (3, 0), {'weight': 2, 'passage': 'panama'}),
+             ((3, 0), (4, 0), {'weight': 1}),
+             ((4, 0), (180, 0), {'weight': 19570.3}),
+             ((180, 0), (-180, 0), {'weight': 0})]
+    nodes = {n: {} for u, v, _ in edges for n in (u, v)}
+    edge_set = {}
+    for u, v, attr in edges:
+        edge_set.setdefault(u, {})[v] = attr
+        edge_set.setdefault(v, {})[u] = attr
+    return sr.from_nodes_edges_set(sr.Marnet(backend=backend), nodes, edge_set)
+
 
 def get_eur_like_poly():
     return [[[-13.907489357972509,34.38755339075928],[-1.2506336099152122,36.60670659971004],[9.264292703855944,37.847020608779644],[15.300639291391775,35.18713773290578],[30.68358704672312,32.7653411309703],[30.294145331398255,42.88727161704523],[40.61435078750756,46.61888810184308],[36.330491918934115,53.130918223282805],[33.99384162698493,67.43240734656277],[31.073028762047983,70.8882578372671],[10.627338707493493,71.39178667248467],[-27.34322853668067,66.44089503998975],[-16.633581365246528,58.38065477109325],[-16.828302222909485,48.45897503158841],[-13.907489357972509,34.38755339075928]]]
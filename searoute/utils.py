@@ -1,6 +1,4 @@
 from math import atan2, cos,  pow, radians, sin, sqrt, tan
-import geojson
-import inspect
 import warnings
 
 
@@ -136,14 +134,53 @@ def distance_length(line: list, units: str = "km"):
     if line is None:
         return 0
 
-    length = 0
-    coords = line
-    le = len(coords)-1
-    for i, point in enumerate(coords):
-        if i != le:
-            length += distance(point, coords[i+1], units)
+    return float(distance_length_array(line, units).sum())
 
-    return length
+
+def distance_many(coordinates1, coordinates2, units: str = "km"):
+    """
+    Vectorized `distance` between points
+
+    Parameters
+    ----------
+    coordinates1 : array-like (..., 2) of lon, lat, from locations
+    coordinates2 : array-like (..., 2) of lon, lat, to locations ; broadcast against `coordinates1`,
+        e.g. `distance_many(a[:, None], b[None, :])` is the (len(a), len(b)) matrix of distances
+    units : a unit, default is `km`
+
+    Returns
+    -------
+    numpy array of distances in `units`
+    """
+    import numpy as np
+
+    c1 = np.radians(np.asarray(coordinates1, dtype=np.float64))
+    c2 = np.radians(np.asarray(coordinates2, dtype=np.float64))
+    lon1, lat1 = c1[..., 0], c1[..., 1]
+    lon2, lat2 = c2[..., 0], c2[..., 1]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.sin((lon2 - lon1) / 2) ** 2 * np.cos(lat1) * np.cos(lat2)
+    b = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return b * avg_earth_radius_km * conversions[units]
+
+
+def distance_length_array(line, units: str = "km"):
+    """
+    Lengths of the segments of a line of coordinates
+
+    Parameters
+    ---------
+    line : a list of tuple [(lon, lat), (lon, lat), ...] or an array (n, 2)
+    units: the unit, default is `km`
+
+    Returns
+    -------
+    numpy array (n - 1,) of distances in `units`, its sum is `distance_length(line)`
+    """
+    import numpy as np
+
+    coords = np.asarray(line, dtype=np.float64).reshape(-1, 2)
+    return distance_many(coords[:-1], coords[1:], units)
 
 
 def get_duration(speed_knot, length, units):
@@ -207,6 +244,8 @@ def nearest_node(G, *args, filter=None, fargs=()):
     when filter = True it means validated
 
     """
+    import inspect
+
     dists = {}
     keys = set(range(len(args)))
     found = False
@@ -223,17 +262,19 @@ def nearest_node(G, *args, filter=None, fargs=()):
     if f_params == 2:
         ignoreEdgeCheck = True
 
-    for node, data in G.nodes(data=True):
-        x = data.get('x', None)
-        y = data.get('y', None)
+    nodes = list(G.nodes(data=True))
+    # distances of every node to every point, computed at once
+    all_dists = distance_many([(data.get('x', None), data.get('y', None)) for _, data in nodes],
+                              [[tuple(arg)] for arg in args]).tolist() if nodes and args else []
 
+    for n_ix, (node, data) in enumerate(nodes):
         filtered = False
         if ignoreEdgeCheck:
             filtered = filter(node, fargs)
 
         for ix, arg in enumerate(args):
             arg = tuple(arg)
-            aDist = distance((x, y), arg)
+            aDist = all_dists[ix][n_ix]
             if node not in dists:
                 dists[node] = {}
 
@@ -330,27 +371,38 @@ def from_nodes_edges_list(G, node_list, edge_list):
     #    raise Exception(f"{type(G)} not supported")
 
 def load_from_geojson(G, *geojson_file):
+    import geojson
+
     for gf in geojson_file:
         with open(gf, 'r') as f:
             data = geojson.load(f)
 
+        # edges are added by runs, the graph computes their missing weights at once
+        edges = []
+
+        def add_line(coords, properties):
+            for u, v in zip(coords[:-1], coords[1:]):
+                edges.append((tuple(u), tuple(v), properties))
+                # the other side as well
+                edges.append((tuple(v), tuple(u), properties))
+
+        def add_edges():
+            if edges:
+                G.add_edges_from_list(edges)
+                edges.clear()
+
         def handle_geometry(geometry, properties):
             if geometry.type == 'LineString':
-                coords = geometry.coordinates
-                for u, v in zip(coords[:-1], coords[1:]):
-                    G.add_edge(tuple(u), tuple(v), **properties)
-                    # the other side as well
-                    G.add_edge(tuple(v), tuple(u), **properties)
+                add_line(geometry.coordinates, properties)
             elif geometry.type == 'MultiLineString':
                 for line_string in geometry.coordinates:
-                    for u, v in zip(line_string[:-1], line_string[1:]):
-                        G.add_edge(tuple(u), tuple(v), **properties)
-                        # the other side as well
-                        G.add_edge(tuple(v), tuple(u), **properties)
+                    add_line(line_string, properties)
             elif geometry.type == 'Point':
+                add_edges()
                 coords = tuple(geometry.coordinates)
                 G.add_node(coords, **properties)
             elif geometry.type == 'MultiPoint':
+                add_edges()
                 for point_coords in geometry.coordinates:
                     coords = tuple(point_coords)
                     G.add_node(coords, **properties)
@@ -367,6 +419,7 @@ def load_from_geojson(G, *geojson_file):
                 handle_geometry(feature.geometry, feature.properties)
         else:
             handle_geometry(data.geometry, data.properties)
+        add_edges()
 
     return G
 
@@ -0,0 +1,118 @@
+"""
+Routes through waypoints and mandatory passages.
+
+Passages are resolved to a gateway edge: the edge of the passage closest to its
+middle (`passage_gateways`, built once from the compiled arrays of the network).
+All the legs are routed with one set of shortest path trees, one tree for each
+distinct stop node (`searoute.matrix.shortest_path_trees`). A gateway can be
+crossed in both directions, and the directions giving the shortest whole route
+are chosen. The legs are then read from the trees and stitched together.
+"""
+import numpy as np
+
+from .matrix import shortest_path_trees
+
+
+_inf = float('inf')
+
+
+def passage_gateways(cg):
+    """
+    {passage: (u, v)} gateway edge (node indexes) of every passage of a compiled network:
+    the edge of the passage whose middle is the closest to the middle of all its edges
+    """
+    coords = np.asarray(cg['coords'], dtype=np.float64)
+    codes = np.asarray(cg['passages'])
+    sources = np.repeat(np.arange(cg.node_count), np.diff(cg['indptr']))
+    targets = np.asarray(cg['indices'], dtype=np.intp)
+
+    gateways = {}
+    for code, passage in enumerate(cg.passages):
+        eids = np.flatnonzero((codes == code) & (sources < targets))
+        if not eids.size:
+            continue
+        middles = (coords[sources[eids]] + coords[targets[eids]]) / 2
+        best = eids[np.argmin(((middles - middles.mean(axis=0)) ** 2).sum(axis=1))]
+        gateways[passage] = (int(sources[best]), int(targets[best]))
+    return gateways
+
+
+def _edge_weight(cg, u, v):
+    start, end = int(cg['indptr'][u]), int(cg['indptr'][u + 1])
+    eid = start + int(np.flatnonzero(np.asarray(cg['indices'][start:end]) == v)[0])
+    return float(cg['weights'][eid])
+
+
+def _tree_path(preds, source, target):
+    path = [target]
+    while path[-1] != source:
+        path.append(int(preds[path[-1]]))
+    path.reverse()
+    return path
+
+
+def via_path(cg, stops, restrictions=None, use_scipy=None):
+    """
+    Shortest route through `stops` in order.
+
+    Parameters
+    ----------
+    cg : `searoute.compiled.CompiledGraph` of a Marnet
+    stops : list of node indexes, or (u, v) gateway edges crossed in either direction ; the first and
+        the last ones are the origin and the destination
+    restrictions : list of passages to avoid
+    use_scipy : boolean, default None which means when installed
+
+    Returns
+    -------
+    length, path, ends : length in the weights of the network, node indexes of the route ([] when a leg has no
+        route) and index in `path` of the end of every leg, a leg ending after a gateway edge is crossed
+    """
+    # (entry, exit, weight) ways through every stop
+    ways = []
+    for stop in stops:
+        if isinstance(stop, tuple):
+            u, v = stop
+            w = _edge_weight(cg, u, v)
+            ways.append([(u, v, w), (v, u, w)])
+        else:
+            ways.append([(stop, stop, 0.0)])
+
+    sources = list(dict.fromkeys(end for way in ways[:-1] for _, end, _ in way))
+    row = {s: r for r, s in enumerate(sources)}
+    dist, preds = shortest_path_trees(cg, sources, restrictions, use_scipy)
+
+    # shortest total through each way of each stop, and the way of the previous stop it came from
+    costs = [[w for _, _, w in ways[0]]]
+    back = [[None] * len(ways[0])]
+    for prev, way in zip(ways, ways[1:]):
+        step_costs, step_back = [], []
+        for entry, _, w in way:
+            totals = [c + dist[row[exit_], entry] for c, (_, exit_, _) in zip(costs[-1], prev)]
+            best = int(np.argmin(totals))
+            step_costs.append(totals[best] + w)
+            step_back.append(best)
+        costs.append(step_costs)
+        back.append(step_back)
+
+    last = int(np.argmin(costs[-1]))
+    length = costs[-1][last]
+    if length == _inf:
+        return _inf, [], []
+
+    chosen = [last]
+    for step_back in reversed(back[1:]):
+        chosen.append(step_back[chosen[-1]])
+    chosen.reverse()
+
+    entry, exit_, _ = ways[0][chosen[0]]
+    path = [entry] if entry == exit_ else [entry, exit_]
+    ends = []
+    for way, i in zip(ways[1:], chosen[1:]):
+        entry, next_exit, _ = way[i]
+        path.extend(_tree_path(preds[row[exit_]], exit_, entry)[1:])
+        if next_exit != entry:
+            path.append(next_exit)
+        ends.append(len(path) - 1)
+        exit_ = next_exit
+    return float(length), path, ends
@@ -28,7 +28,7 @@ setup(
     classifiers=classifiers,
     keywords='searoute map sea route ocean ports',
     packages=find_packages(),
-    install_requires=['geojson', 'networkx'],
+    install_requires=['geojson', 'networkx', 'numpy'],
     project_urls={
         "Documentation": "https://github.com/genthalili/searoute-py/blob/main/README.md",
         "Source": "https://github.com/genthalili/searoute-py",
@@ -36,6 +36,7 @@ setup(
     include_package_data=True,
     extras_require={
         "igraph": ["igraph>=0.11.0"],
-        "all": ["igraph>=0.11.0"]
+        "scipy": ["scipy"],
+        "all": ["igraph>=0.11.0", "scipy"]
     }
 )